@@ -1,77 +1,155 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from app.models.feedback import Feedback, FeedbackCreate, FeedbackRead
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from app.models.feedback import FeedbackCreate, FeedbackRecord
 from app.services.metrics import MetricsService
-from app.services.ai import AIService
-from app.core.db import get_table
-from datetime import date
-from typing import List, Dict, Any, Optional
+from app.services.ai import AIService, IncompleteCoverage
+from app.services.rule_insights import AutoInsightService, rule_insights
+from app.services.repository import feedback_repository, to_item, to_records
+from app.services.rollups import ROLLUP_FIELDS, rollup_metrics
+from app.services.search import analyze, search_index
+from app.services.snapshot import analytics_snapshot
+from app.services.topics import topic_engine
+from app.services.timeseries import range_cache, timeseries, bucket_ranges, record_counts
+from app.services.llm_cache import llm_cache, cache_policy
+from app.services.precompute import PrecomputeJob, PrecomputeScheduler, window_range
+from app.services.write_buffer import write_buffer
+from app.core import db
+from app.core.config import settings
+from app.core.logging import logger
+from app.core.singleflight import SingleFlight
+from app.core.telemetry import span
+from dataclasses import dataclass
+from functools import partial
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Awaitable, Callable, Sequence, Tuple, Literal
+from pydantic import ValidationError
+import asyncio
+import json
 import uuid
-from boto3.dynamodb.conditions import Attr
 
 router = APIRouter()
 ai_service = AIService()
+auto_insights = AutoInsightService(ai_service, rule_insights, settings.INSIGHTS_AUTO_TIMEOUT, settings.INSIGHTS_AUTO_FULL_TIMEOUT)
+# Identical concurrent insight requests share one feedback read and one set of LLM calls
+insight_flights = SingleFlight(settings.INSIGHTS_MAX_STORED)
 
 # Tags for grouped documentation
 TAG_FEEDBACK = "Ingesta de Datos"
 TAG_INSIGHTS = "AI Insights & Analytics"
 
-def get_filtered_feedbacks(start_date: Optional[date], end_date: Optional[date]) -> List[Feedback]:
-    table = get_table()
-    
-    # DynamoDB Scan with FilterExpression
-    filter_expression = None
-    if start_date:
-        filter_expression = Attr('date').gte(start_date.isoformat())
-    if end_date:
-        if filter_expression:
-            filter_expression = filter_expression & Attr('date').lte(end_date.isoformat())
+async def llm_cache_control(
+    refresh: bool = Query(False, description="Ignora la caché de IA y regenera los insights")
+):
+    # Async dependencies run in the request's context, so the policy is visible to AIService
+    cache_policy.set("refresh" if refresh else "use")
+
+Coverage = Literal["sample", "full"]
+InsightMode = Literal["fast", "llm", "auto"]
+
+@dataclass
+class InsightOptions:
+    """Per-request knobs that change how the AI sections are produced."""
+    coverage: str = settings.INSIGHTS_COVERAGE
+    mode: str = settings.INSIGHTS_MODE
+
+    @property
+    def engine(self) -> Any:
+        """fast: rule-based insights only; llm: OpenAI only; auto: OpenAI with a rule-based fallback."""
+        return {"fast": rule_insights, "auto": auto_insights}.get(self.mode, ai_service)
+
+async def insight_options(
+    coverage: Optional[Coverage] = Query(None, description="sample: muestra de comentarios (rápido); full: analiza todos los comentarios por lotes (map-reduce)"),
+    mode: Optional[InsightMode] = Query(None, description="fast: insights por reglas, sin IA (milisegundos); llm: OpenAI; auto: OpenAI con respaldo por reglas")
+) -> InsightOptions:
+    return InsightOptions(coverage=coverage or settings.INSIGHTS_COVERAGE, mode=mode or settings.INSIGHTS_MODE)
+
+SearchTerms = Tuple[str, ...]
+
+def query_terms(q: str) -> SearchTerms:
+    """Index terms of a keyword filter; every one of them must appear in a comment for it to match."""
+    if not search_index.enabled:
+        raise HTTPException(status_code=503, detail="La búsqueda por texto no está habilitada (SEARCH_INDEX_PATH)")
+    # Before the backfill the index only holds recent writes, and results would silently cover a subset
+    if not search_index.backfilled:
+        raise HTTPException(
+            status_code=503,
+            detail="El índice de búsqueda aún no cubre el feedback guardado: ejecuta `python -m app.maintenance build-search-index`",
+        )
+    # Sorted, so the same words in any order share cached results
+    terms = tuple(sorted(analyze(q)))
+    if not terms:
+        raise HTTPException(status_code=422, detail="La búsqueda no contiene palabras significativas")
+    return terms
+
+async def comment_query(
+    q: Optional[str] = Query(None, description="Solo feedback cuyo comentario contiene todas estas palabras (sin distinguir mayúsculas, tildes ni plurales)")
+) -> Optional[SearchTerms]:
+    return query_terms(q) if q is not None else None
+
+# Attributes needed by the insight sections; `id` tells items re-written after the snapshot apart.
+# Endpoints that only count scores read ROLLUP_FIELDS instead, leaving comments out of the read.
+ANALYTICS_FIELDS = ("id", "date", "nps", "csat", "ces", "comment", "topic")
+
+async def get_filtered_feedbacks(
+    start_date: Optional[date], end_date: Optional[date], terms: Optional[SearchTerms] = None,
+    fields: Sequence[str] = ANALYTICS_FIELDS,
+) -> List[FeedbackRecord]:
+    """Feedback of the window sorted by date, with the DynamoDB reads projected to `fields`."""
+    with span("feedback_load"):
+        snapshot = analytics_snapshot.current if db.ingest_index_active() else None
+        if terms:
+            # Keyword filters are answered by the comment index, already restricted to the window
+            feedbacks = await asyncio.to_thread(search_index.records, terms, start_date, end_date, "comment" in fields)
+        elif snapshot is None:
+            # Closed windows are served by one Query per month bucket; open windows fall back to a parallel scan.
+            # Concurrent loads of the same window share a single read.
+            items = await insight_flights.do(
+                ("feedbacks", start_date, end_date, tuple(fields)),
+                lambda: feedback_repository.scan_range(start_date, end_date, fields),
+                version=feedback_repository.version,
+            )
+            # DynamoDB scan results are unordered; records come back sorted by date
+            feedbacks = to_records(items)
         else:
-            filter_expression = Attr('date').lte(end_date.isoformat())
-            
-    scan_kwargs = {}
-    if filter_expression:
-        scan_kwargs['FilterExpression'] = filter_expression
-        
-    response = table.scan(**scan_kwargs)
-    items = response.get('Items', [])
+            # History comes from the mapped snapshot; only items written after its watermark are read from DynamoDB
+            delta = await insight_flights.do(
+                ("ingested", snapshot.watermark, tuple(fields)),
+                lambda: feedback_repository.ingested_since(snapshot.watermark, fields),
+                version=feedback_repository.version,
+            )
+            low, high = (start_date or date.min).isoformat(), (end_date or date.max).isoformat()
+            newer = to_records([item for item in delta if low <= item["date"] <= high])
+            # An item re-written after the snapshot (re-ingestion, a resumed ingest) is in both; the delta wins.
+            # Every delta id counts, since a re-write may also have moved the item out of the window.
+            feedbacks = snapshot.window(start_date, end_date, exclude_ids={item["id"] for item in delta}, newer=newer)
     
-    if not items:
-        raise HTTPException(status_code=404, detail="No se encontró feedback para el periodo seleccionado")
-        
-    # Convert back to Feedback objects
-    feedbacks = []
-    for item in items:
-        feedbacks.append(Feedback(
-            id=item['id'],
-            date=date.fromisoformat(item['date']),
-            nps=int(item['nps']),
-            csat=int(item['csat']),
-            ces=int(item['ces']),
-            comment=item.get('comment')
-        ))
-    
-    # DynamoDB scan results are unordered, sort by date for consistency
-    feedbacks.sort(key=lambda x: x.date)
+    if not feedbacks:
+        detail = "No se encontró feedback con esas palabras en el periodo seleccionado" if terms else "No se encontró feedback para el periodo seleccionado"
+        raise HTTPException(status_code=404, detail=detail)
     return feedbacks
 
+AckMode = Literal["buffer", "flush"]
+
+async def store_item(item: Dict[str, Any], ack: AckMode) -> str:
+    """Writes one item directly or through the write-behind buffer. Returns the resulting item status."""
+    if not settings.WRITE_BUFFER_ENABLED:
+        await feedback_repository.put(item)
+        return "stored"
+    await write_buffer.put(item, wait_for_flush=ack == "flush")
+    return "stored" if ack == "flush" else "accepted"
+
 @router.post("/feedback", tags=[TAG_FEEDBACK], summary="Registrar nuevo feedback")
-async def create_feedback(feedback_in: FeedbackCreate):
+async def create_feedback(
+    feedback_in: FeedbackCreate,
+    ack: Optional[AckMode] = Query(None, description="Con el buffer de escritura activo: responder al encolar (buffer) o tras escribir (flush)")
+):
     """
     Almacena un nuevo registro de feedback del cliente en AWS DynamoDB.
     """
-    table = get_table()
     feedback_id = str(uuid.uuid4())
+    item = to_item(feedback_id, feedback_in)
     
-    item = {
-        "id": feedback_id,
-        "date": feedback_in.date.isoformat(),
-        "nps": feedback_in.nps,
-        "csat": feedback_in.csat,
-        "ces": feedback_in.ces,
-        "comment": feedback_in.comment
-    }
-    
-    table.put_item(Item=item)
+    await store_item(item, ack or settings.WRITE_BUFFER_ACK)
     
     return {
         "status": "success",
@@ -82,16 +160,91 @@ async def create_feedback(feedback_in: FeedbackCreate):
         }
     }
 
-@router.get("/insights/overview", tags=[TAG_INSIGHTS], summary="Resumen Ejecutivo General")
-async def get_overview(
-    start_date: Optional[date] = Query(None, description="Fecha de inicio (YYYY-MM-DD)"), 
-    end_date: Optional[date] = Query(None, description="Fecha de fin (YYYY-MM-DD)")
+def parse_batch_body(body: bytes, content_type: str) -> List[Any]:
+    """Raw records of a batch request: a JSON array, or one JSON object per line for NDJSON."""
+    try:
+        if "ndjson" in content_type or "jsonl" in content_type:
+            return [json.loads(line) for line in body.splitlines() if line.strip()]
+        records = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="El cuerpo debe ser un arreglo JSON o NDJSON válido")
+    if not isinstance(records, list):
+        raise HTTPException(status_code=400, detail="El cuerpo debe ser un arreglo JSON o NDJSON válido")
+    return records
+
+@router.post("/feedback/batch", tags=[TAG_FEEDBACK], summary="Registrar feedback en lote")
+async def create_feedback_batch(
+    request: Request,
+    ack: Optional[AckMode] = Query(None, description="Con el buffer de escritura activo: responder al encolar (buffer) o tras escribir (flush)")
 ):
-    feedbacks = get_filtered_feedbacks(start_date, end_date)
-    metrics = MetricsService.get_all_metrics(feedbacks)
-    comments = [f.comment for f in feedbacks if f.comment]
+    """
+    Almacena un lote de feedback (arreglo JSON o NDJSON con `Content-Type: application/x-ndjson`).
+    Cada registro se valida de forma independiente y recibe su propio estado.
+    """
+    records = parse_batch_body(await request.body(), request.headers.get("content-type", ""))
+    if len(records) > settings.FEEDBACK_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"El lote supera el máximo de {settings.FEEDBACK_BATCH_MAX_ITEMS} registros")
+    
+    results: List[Dict[str, Any]] = []
+    items: List[Dict[str, Any]] = []
+    for index, record in enumerate(records):
+        try:
+            feedback_in = FeedbackCreate.model_validate(record)
+        except ValidationError as e:
+            results.append({"index": index, "status": "invalid", "errors": e.errors(include_url=False, include_context=False)})
+            continue
+        item = to_item(str(uuid.uuid4()), feedback_in)
+        items.append(item)
+        results.append({"index": index, "status": "pending", "id": f"fb_{item['id']}"})
     
-    summary = await ai_service.get_executive_summary(metrics, comments)
+    pending = [result for result in results if result["status"] == "pending"]
+    ack = ack or settings.WRITE_BUFFER_ACK
+    if settings.WRITE_BUFFER_ENABLED:
+        statuses = await asyncio.gather(*(store_item(item, ack) for item in items), return_exceptions=True)
+    else:
+        try:
+            await feedback_repository.batch_put(items)
+            statuses = ["stored"] * len(items)
+        except db.BatchWriteError as e:
+            logger.error(f"Batch write failed: {str(e)}")
+            # Chunks stored before the failure are reported as stored, so clients only retry the rest
+            stored = {item["id"] for item in e.written}
+            statuses = ["stored" if item["id"] in stored else e for item in items]
+        except Exception as e:
+            logger.error(f"Batch write of {len(items)} items failed: {str(e)}")
+            statuses = [e] * len(items)
+    
+    for result, status in zip(pending, statuses):
+        result["status"] = "failed" if isinstance(status, Exception) else status
+    
+    rejected = sum(1 for result in results if result["status"] in ("invalid", "failed"))
+    return {
+        "status": "success" if not rejected else "partial",
+        "accepted": len(results) - rejected,
+        "rejected": rejected,
+        "results": results
+    }
+
+@router.get("/feedback/search", tags=[TAG_FEEDBACK], summary="Buscar feedback por palabras del comentario")
+async def search_feedback(
+    q: str = Query(..., description="Palabras que deben aparecer en el comentario (sin distinguir mayúsculas, tildes ni plurales)"),
+    start_date: Optional[date] = Query(None, description="Fecha de inicio (YYYY-MM-DD)"),
+    end_date: Optional[date] = Query(None, description="Fecha de fin (YYYY-MM-DD)"),
+    limit: int = Query(20, ge=1, le=settings.SEARCH_MAX_RESULTS, description="Resultados por página"),
+    offset: int = Query(0, ge=0, description="Resultados a omitir")
+):
+    """
+    Feedback cuyo comentario contiene todas las palabras de `q`, del más reciente al más antiguo,
+    resuelto con el índice invertido de comentarios.
+    """
+    terms = query_terms(q)
+    total, results = await asyncio.to_thread(search_index.search, terms, start_date, end_date, limit, offset)
+    return {"query": q, "terms": list(terms), "total": total, "results": results}
+
+# Section builders: each one shapes one insights response from an already loaded window,
+# so the single endpoints and the combined dashboard share the same logic.
+async def build_overview(feedbacks: List[FeedbackRecord], metrics: Dict, options: InsightOptions) -> Dict[str, Any]:
+    summary = await options.engine.get_executive_summary(metrics, feedbacks)
     
     return {
         "period": f"{feedbacks[0].date.strftime('%Y-%m')} to {feedbacks[-1].date.strftime('%Y-%m')}",
@@ -103,96 +256,74 @@ async def get_overview(
         "executive_summary": summary
     }
 
-@router.get("/insights/nps", tags=[TAG_INSIGHTS], summary="Análisis Detallado de NPS")
-async def get_nps_insight(
-    start_date: Optional[date] = Query(None), 
-    end_date: Optional[date] = Query(None)
-):
-    feedbacks = get_filtered_feedbacks(start_date, end_date)
-    metrics = MetricsService.calculate_nps(feedbacks)
-    comments = [f.comment for f in feedbacks if f.nps <= 6 and f.comment]
+async def build_nps(feedbacks: List[FeedbackRecord], metrics: Dict, options: InsightOptions) -> Dict[str, Any]:
+    nps = metrics["nps"]
+    related = [f for f in feedbacks if f.nps <= 6]
     
-    insight = await ai_service.get_indicator_insight("NPS", metrics, comments)
+    insight = await options.engine.get_indicator_insight("NPS", nps, related)
     
     return {
         "distribution": {
-            "promoters": metrics["promoters"],
-            "neutrals": metrics["neutrals"],
-            "detractors": metrics["detractors"]
+            "promoters": nps["promoters"],
+            "neutrals": nps["neutrals"],
+            "detractors": nps["detractors"]
         },
         "insight": insight
     }
 
-@router.get("/insights/csat", tags=[TAG_INSIGHTS], summary="Análisis Detallado de CSAT")
-async def get_csat_insight(
-    start_date: Optional[date] = Query(None), 
-    end_date: Optional[date] = Query(None)
-):
-    feedbacks = get_filtered_feedbacks(start_date, end_date)
-    metrics = MetricsService.calculate_csat(feedbacks)
-    comments = [f.comment for f in feedbacks if f.csat < 4 and f.comment]
+async def build_csat(feedbacks: List[FeedbackRecord], metrics: Dict, options: InsightOptions) -> Dict[str, Any]:
+    csat = metrics["csat"]
+    related = [f for f in feedbacks if f.csat < 4]
     
-    insight = await ai_service.get_indicator_insight("CSAT", metrics, comments)
+    insight = await options.engine.get_indicator_insight("CSAT", csat, related)
     
     return {
         "distribution": {
-            "satisfied": metrics["satisfied"],
-            "neutral": metrics["neutral"],
-            "unsatisfied": metrics["unsatisfied"]
+            "satisfied": csat["satisfied"],
+            "neutral": csat["neutral"],
+            "unsatisfied": csat["unsatisfied"]
         },
         "insight": insight
     }
 
-@router.get("/insights/ces", tags=[TAG_INSIGHTS], summary="Análisis Detallado de CES")
-async def get_ces_insight(
-    start_date: Optional[date] = Query(None), 
-    end_date: Optional[date] = Query(None)
-):
-    feedbacks = get_filtered_feedbacks(start_date, end_date)
-    metrics = MetricsService.calculate_ces(feedbacks)
-    comments = [f.comment for f in feedbacks if f.ces >= 4 and f.comment]
+async def build_ces(feedbacks: List[FeedbackRecord], metrics: Dict, options: InsightOptions) -> Dict[str, Any]:
+    ces = metrics["ces"]
+    related = [f for f in feedbacks if f.ces >= 4]
     
-    insight = await ai_service.get_indicator_insight("CES", metrics, comments)
+    insight = await options.engine.get_indicator_insight("CES", ces, related)
     
     return {
         "distribution": {
-            "low_effort": metrics["low_effort"],
-            "medium_effort": metrics["medium_effort"],
-            "high_effort": metrics["high_effort"]
+            "low_effort": ces["low_effort"],
+            "medium_effort": ces["medium_effort"],
+            "high_effort": ces["high_effort"]
         },
         "insight": insight
     }
 
-@router.get("/insights/drivers", tags=[TAG_INSIGHTS], summary="Top Drivers Positivos y Negativos")
-async def get_drivers(
-    start_date: Optional[date] = Query(None), 
-    end_date: Optional[date] = Query(None)
-):
-    feedbacks = get_filtered_feedbacks(start_date, end_date)
-    comments = [f.comment for f in feedbacks if f.comment]
-    return await ai_service.get_drivers(comments)
+async def build_drivers(feedbacks: List[FeedbackRecord], metrics: Dict, options: InsightOptions) -> Dict[str, Any]:
+    return await options.engine.get_drivers(feedbacks, options.coverage)
 
-@router.get("/insights/topics", tags=[TAG_INSIGHTS], summary="Análisis de Tópicos Recurrentes")
-async def get_topics(
-    start_date: Optional[date] = Query(None), 
-    end_date: Optional[date] = Query(None)
-):
-    feedbacks = get_filtered_feedbacks(start_date, end_date)
-    comments = [f.comment for f in feedbacks if f.comment]
-    topics = await ai_service.get_topics(comments)
+async def build_topics(feedbacks: List[FeedbackRecord], metrics: Dict, options: InsightOptions) -> Dict[str, Any]:
+    # The local topic model counts every comment; the LLM only names its clusters
+    counted = topic_engine.count(feedbacks) if options.coverage != "full" or options.mode == "fast" else None
+    if counted is None:
+        topics = await options.engine.get_topics(feedbacks, options.coverage)
+        return {"topics": topics}
+    
+    model, counts = counted
+    labels = await options.engine.get_topic_labels(model.clusters)
+    topics = [
+        {"topic": labels[cluster], "mentions": int(counts[cluster])}
+        for cluster in counts.argsort()[::-1] if counts[cluster]
+    ]
     return {"topics": topics}
 
-@router.get("/insights/segments", tags=[TAG_INSIGHTS], summary="Identificación de Segmentos Críticos")
-async def get_segments(
-    start_date: Optional[date] = Query(None), 
-    end_date: Optional[date] = Query(None)
-):
-    feedbacks = get_filtered_feedbacks(start_date, end_date)
+async def build_segments(feedbacks: List[FeedbackRecord], metrics: Dict, options: InsightOptions) -> Dict[str, Any]:
     total = len(feedbacks)
-    metrics = MetricsService.get_all_metrics(feedbacks)
     segments_data = metrics["segments"]
     
-    descriptions = await ai_service.get_segment_descriptions(segments_data)
+    descriptions = await options.engine.get_segment_descriptions(segments_data)
     
     results = []
     for desc in descriptions:
@@ -206,14 +337,340 @@ async def get_segments(
             
     return {"segments": results}
 
-@router.get("/insights/action-plans", tags=[TAG_INSIGHTS], summary="Planes de Mejora Priorizados")
+async def build_action_plans(feedbacks: List[FeedbackRecord], metrics: Dict, options: InsightOptions) -> Dict[str, Any]:
+    plans = await options.engine.get_action_plans(metrics, feedbacks)
+    return {"action_plans": plans}
+
+SECTION_BUILDERS = {
+    "overview": build_overview,
+    "nps": build_nps,
+    "csat": build_csat,
+    "ces": build_ces,
+    "drivers": build_drivers,
+    "topics": build_topics,
+    "segments": build_segments,
+    "action_plans": build_action_plans,
+}
+
+InsightFlight = Tuple[Tuple, Callable[[], Awaitable[Dict[str, Any]]]]
+
+def section_error(name: str, error: BaseException) -> Dict[str, Any]:
+    """Payload of a dashboard section that could not be built."""
+    if isinstance(error, asyncio.TimeoutError):
+        logger.warning(f"Dashboard section '{name}' timed out after {settings.INSIGHTS_SECTION_TIMEOUT}s")
+        return {"error": {"type": "timeout", "message": f"La sección no terminó en {settings.INSIGHTS_SECTION_TIMEOUT:g} segundos"}}
+    if isinstance(error, IncompleteCoverage):
+        logger.warning(f"Dashboard section '{name}': {str(error)}")
+        return {"error": {
+            "type": "incomplete_coverage",
+            "message": "No se pudieron analizar todos los comentarios del periodo; reintenta en unos segundos",
+            "failed_chunks": error.failed,
+            "chunks": error.chunks,
+        }}
+    logger.error(f"Dashboard section '{name}' failed: {str(error)}")
+    return {"error": {"type": "failed", "message": "No se pudo generar la sección"}}
+
+async def run_section(name: str, call: Awaitable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    One dashboard section under INSIGHTS_SECTION_TIMEOUT (0 for none). A section may make several LLM calls and
+    queue for OpenAI slots between them, so it does not get the per-call OPENAI_CALL_TIMEOUT. A section that
+    times out or fails comes back as an `error` payload, so the rest of the dashboard is still returned.
+    """
+    try:
+        return await asyncio.wait_for(call, settings.INSIGHTS_SECTION_TIMEOUT or None)
+    except Exception as e:
+        return section_error(name, e)
+
+def section_flight(
+    name: str, start_date: Optional[date], end_date: Optional[date], options: InsightOptions, terms: Optional[SearchTerms] = None
+) -> InsightFlight:
+    """Shared-result key and computation of one insights section."""
+    async def compute() -> Dict[str, Any]:
+        feedbacks = await get_filtered_feedbacks(start_date, end_date, terms)
+        return await SECTION_BUILDERS[name](feedbacks, MetricsService.get_all_metrics(feedbacks), options)
+    
+    return (name, start_date, end_date, options.coverage, options.mode, terms), compute
+
+def dashboard_flight(
+    names: List[str], start_date: Optional[date], end_date: Optional[date], options: InsightOptions, terms: Optional[SearchTerms] = None
+) -> InsightFlight:
+    """Shared-result key and computation of the (non-streamed) dashboard."""
+    async def compute() -> Dict[str, Any]:
+        feedbacks = await get_filtered_feedbacks(start_date, end_date, terms)
+        metrics = MetricsService.get_all_metrics(feedbacks)
+        results = await asyncio.gather(*(run_section(name, SECTION_BUILDERS[name](feedbacks, metrics, options)) for name in names))
+        return dict(zip(names, results))
+    
+    return ("dashboard", tuple(names), start_date, end_date, options.coverage, options.mode, terms), compute
+
+async def build_section(
+    name: str, start_date: Optional[date], end_date: Optional[date], options: Optional[InsightOptions] = None,
+    terms: Optional[SearchTerms] = None
+) -> Dict[str, Any]:
+    return await shared_insight(*section_flight(name, start_date, end_date, options or InsightOptions(), terms))
+
+def stamped(compute: Callable[[], Awaitable[Dict[str, Any]]]) -> Callable[[], Awaitable[Dict[str, Any]]]:
+    """Adds `generated_at`, the time the response was computed, so clients can tell how fresh it is."""
+    async def run() -> Dict[str, Any]:
+        response = await compute()
+        return {**response, "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+    
+    return run
+
+async def shared_insight(key: Tuple, compute: Callable[[], Awaitable[Dict[str, Any]]], refresh: Optional[bool] = None) -> Any:
+    """
+    Computes an insight response once for all identical concurrent requests. Windows kept warm by the
+    precompute scheduler are answered from its results. Otherwise a recent answer is served as-is; after new
+    feedback is written, or once it is older than INSIGHTS_FRESH_SECONDS, it is still served for up to
+    INSIGHTS_STALE_SECONDS while one background refresh replaces it. `refresh=true` bypasses both.
+    """
+    refresh = cache_policy.get() == "refresh" if refresh is None else refresh
+    if not refresh:
+        precomputed = insight_scheduler.lookup(key)
+        if precomputed is not None:
+            return precomputed
+    return await insight_flights.do(
+        key,
+        stamped(compute),
+        version=feedback_repository.version,
+        fresh_for=settings.INSIGHTS_FRESH_SECONDS,
+        stale_for=settings.INSIGHTS_STALE_SECONDS,
+        refresh=refresh,
+    )
+
+def precompute_jobs(today: date) -> List[PrecomputeJob]:
+    """Every configured section of every configured window, with the default options, in priority order."""
+    options = InsightOptions()
+    names = [name.strip() for name in settings.PRECOMPUTE_SECTIONS.split(",") if name.strip()]
+    jobs = []
+    for window in settings.PRECOMPUTE_WINDOWS.split(","):
+        start_date, end_date = window_range(window.strip(), today)
+        for name in names:
+            if name == "dashboard":
+                key, compute = dashboard_flight(list(SECTION_BUILDERS), start_date, end_date, options)
+            else:
+                key, compute = section_flight(name, start_date, end_date, options)
+            jobs.append(PrecomputeJob(key, partial(precompute_insight, key, compute), uses_llm=options.mode != "fast"))
+    return jobs
+
+async def precompute_insight(key: Tuple, compute: Callable[[], Awaitable[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    # Joins an identical request in flight and replaces the stored answer of the request path as well
+    try:
+        return await shared_insight(key, compute, refresh=True)
+    except HTTPException as e:
+        if e.status_code == 404:
+            # No feedback in the window yet; requests for it get their own 404
+            return None
+        raise
+
+insight_scheduler = PrecomputeScheduler(
+    precompute_jobs,
+    version=lambda: feedback_repository.version,
+    interval=settings.PRECOMPUTE_INTERVAL_SECONDS,
+    debounce=settings.PRECOMPUTE_DEBOUNCE_SECONDS,
+    max_debounce=settings.PRECOMPUTE_DEBOUNCE_MAX_SECONDS,
+    concurrency=settings.PRECOMPUTE_CONCURRENCY,
+    llm_budget=settings.PRECOMPUTE_LLM_BUDGET_PER_HOUR,
+    max_age=settings.PRECOMPUTE_MAX_AGE_SECONDS,
+)
+# Writes from this process (direct or through the write buffer) trigger a debounced refresh
+feedback_repository.add_write_listener(lambda days: insight_scheduler.notify())
+
+@router.get("/insights/overview", tags=[TAG_INSIGHTS], dependencies=[Depends(llm_cache_control)], summary="Resumen Ejecutivo General")
+async def get_overview(
+    start_date: Optional[date] = Query(None, description="Fecha de inicio (YYYY-MM-DD)"), 
+    end_date: Optional[date] = Query(None, description="Fecha de fin (YYYY-MM-DD)"),
+    options: InsightOptions = Depends(insight_options),
+    terms: Optional[SearchTerms] = Depends(comment_query)
+):
+    return await build_section("overview", start_date, end_date, options, terms)
+
+@router.get("/insights/metrics", tags=[TAG_INSIGHTS], summary="Métricas Crudas y Distribuciones")
+async def get_metrics(
+    start_date: Optional[date] = Query(None, description="Fecha de inicio (YYYY-MM-DD)"), 
+    end_date: Optional[date] = Query(None, description="Fecha de fin (YYYY-MM-DD)"),
+    terms: Optional[SearchTerms] = Depends(comment_query)
+):
+    """
+    NPS, CSAT, CES y segmentos críticos calculados a partir de los agregados diarios,
+    sin recorrer los registros individuales. Con `q`, a partir del feedback cuyo comentario coincide.
+    Hasta que `rebuild-rollups` termine una vez, a partir de los registros.
+    """
+    # Before the first rebuild the rollups only count what was written since they existed
+    if terms or not await feedback_repository.rollups_complete():
+        feedbacks = await get_filtered_feedbacks(start_date, end_date, terms, ROLLUP_FIELDS)
+        metrics = MetricsService.get_all_metrics(feedbacks)
+        days = len({f.date for f in feedbacks})
+    else:
+        rows = await feedback_repository.rollup_range(start_date, end_date)
+        metrics = rollup_metrics(rows)
+        days = len(rows)
+    
+    if not metrics["nps"]["total"]:
+        raise HTTPException(status_code=404, detail="No se encontró feedback para el periodo seleccionado")
+    
+    return {
+        "days": days,
+        "nps": metrics["nps"],
+        "csat": metrics["csat"],
+        "ces": metrics["ces"],
+        "segments": {key: segment["count"] for key, segment in metrics["segments"].items()}
+    }
+
+@router.get("/insights/timeseries", tags=[TAG_INSIGHTS], summary="Evolución de NPS, CSAT y CES")
+async def get_timeseries(
+    start_date: Optional[date] = Query(None, description=f"Fecha de inicio (YYYY-MM-DD). Por defecto, {settings.TIMESERIES_DEFAULT_DAYS} días antes del fin"),
+    end_date: Optional[date] = Query(None, description="Fecha de fin (YYYY-MM-DD). Por defecto, hoy"),
+    granularity: Literal["day", "week", "month"] = Query("week", description="Tamaño de cada punto de la serie"),
+    compare: bool = Query(False, description="Agrega la comparación con el periodo anterior de la misma duración"),
+    terms: Optional[SearchTerms] = Depends(comment_query)
+):
+    """
+    NPS, CSAT y CES por día, semana o mes, calculados a partir de los agregados diarios en una sola lectura.
+    Los periodos ya cerrados se reutilizan desde caché. Con `q`, a partir del feedback cuyo comentario coincide.
+    Hasta que `rebuild-rollups` termine una vez, a partir de los registros.
+    """
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days=settings.TIMESERIES_DEFAULT_DAYS - 1)
+    if start_date > end_date:
+        raise HTTPException(status_code=422, detail="start_date debe ser anterior o igual a end_date")
+    if len(bucket_ranges(start_date, end_date, granularity)) > settings.TIMESERIES_MAX_BUCKETS:
+        raise HTTPException(status_code=422, detail=f"La serie supera el máximo de {settings.TIMESERIES_MAX_BUCKETS} puntos; usa una granularidad mayor")
+    
+    if not terms:
+        if await feedback_repository.rollups_complete():
+            return await timeseries(start_date, end_date, granularity, compare)
+        
+        async def stored_counts(buckets: List[Tuple[date, date]]) -> Any:
+            items = await feedback_repository.scan_range(buckets[0][0], buckets[-1][1], ROLLUP_FIELDS)
+            return record_counts(to_records(items), buckets)
+        
+        return await timeseries(start_date, end_date, granularity, compare, counts_of=stored_counts)
+    
+    async def matched_counts(buckets: List[Tuple[date, date]]) -> Any:
+        records = await asyncio.to_thread(search_index.records, terms, buckets[0][0], buckets[-1][1], False)
+        return record_counts(records, buckets)
+    
+    return await timeseries(start_date, end_date, granularity, compare, counts_of=matched_counts)
+
+@router.get("/insights/nps", tags=[TAG_INSIGHTS], dependencies=[Depends(llm_cache_control)], summary="Análisis Detallado de NPS")
+async def get_nps_insight(
+    start_date: Optional[date] = Query(None), 
+    end_date: Optional[date] = Query(None),
+    options: InsightOptions = Depends(insight_options),
+    terms: Optional[SearchTerms] = Depends(comment_query)
+):
+    return await build_section("nps", start_date, end_date, options, terms)
+
+@router.get("/insights/csat", tags=[TAG_INSIGHTS], dependencies=[Depends(llm_cache_control)], summary="Análisis Detallado de CSAT")
+async def get_csat_insight(
+    start_date: Optional[date] = Query(None), 
+    end_date: Optional[date] = Query(None),
+    options: InsightOptions = Depends(insight_options),
+    terms: Optional[SearchTerms] = Depends(comment_query)
+):
+    return await build_section("csat", start_date, end_date, options, terms)
+
+@router.get("/insights/ces", tags=[TAG_INSIGHTS], dependencies=[Depends(llm_cache_control)], summary="Análisis Detallado de CES")
+async def get_ces_insight(
+    start_date: Optional[date] = Query(None), 
+    end_date: Optional[date] = Query(None),
+    options: InsightOptions = Depends(insight_options),
+    terms: Optional[SearchTerms] = Depends(comment_query)
+):
+    return await build_section("ces", start_date, end_date, options, terms)
+
+@router.get("/insights/drivers", tags=[TAG_INSIGHTS], dependencies=[Depends(llm_cache_control)], summary="Top Drivers Positivos y Negativos")
+async def get_drivers(
+    start_date: Optional[date] = Query(None), 
+    end_date: Optional[date] = Query(None),
+    options: InsightOptions = Depends(insight_options),
+    terms: Optional[SearchTerms] = Depends(comment_query)
+):
+    return await build_section("drivers", start_date, end_date, options, terms)
+
+@router.get("/insights/topics", tags=[TAG_INSIGHTS], dependencies=[Depends(llm_cache_control)], summary="Análisis de Tópicos Recurrentes")
+async def get_topics(
+    start_date: Optional[date] = Query(None), 
+    end_date: Optional[date] = Query(None),
+    options: InsightOptions = Depends(insight_options),
+    terms: Optional[SearchTerms] = Depends(comment_query)
+):
+    return await build_section("topics", start_date, end_date, options, terms)
+
+@router.get("/insights/segments", tags=[TAG_INSIGHTS], dependencies=[Depends(llm_cache_control)], summary="Identificación de Segmentos Críticos")
+async def get_segments(
+    start_date: Optional[date] = Query(None), 
+    end_date: Optional[date] = Query(None),
+    options: InsightOptions = Depends(insight_options),
+    terms: Optional[SearchTerms] = Depends(comment_query)
+):
+    return await build_section("segments", start_date, end_date, options, terms)
+
+@router.get("/insights/action-plans", tags=[TAG_INSIGHTS], dependencies=[Depends(llm_cache_control)], summary="Planes de Mejora Priorizados")
 async def get_action_plans(
     start_date: Optional[date] = Query(None), 
-    end_date: Optional[date] = Query(None)
+    end_date: Optional[date] = Query(None),
+    options: InsightOptions = Depends(insight_options),
+    terms: Optional[SearchTerms] = Depends(comment_query)
+):
+    return await build_section("action_plans", start_date, end_date, options, terms)
+
+@router.get("/insights/dashboard", tags=[TAG_INSIGHTS], dependencies=[Depends(llm_cache_control)], summary="Dashboard Completo")
+async def get_dashboard(
+    start_date: Optional[date] = Query(None, description="Fecha de inicio (YYYY-MM-DD)"), 
+    end_date: Optional[date] = Query(None, description="Fecha de fin (YYYY-MM-DD)"),
+    sections: Optional[str] = Query(None, description=f"Secciones separadas por coma: {', '.join(SECTION_BUILDERS)}"),
+    stream: bool = Query(False, description="Envía cada sección como una línea NDJSON en cuanto está lista"),
+    options: InsightOptions = Depends(insight_options),
+    terms: Optional[SearchTerms] = Depends(comment_query)
 ):
-    feedbacks = get_filtered_feedbacks(start_date, end_date)
+    """
+    Todas las secciones de insights en una sola llamada: el feedback se carga una vez,
+    las métricas se calculan una vez y los análisis de IA se ejecutan en paralelo.
+    """
+    names = [name.strip() for name in sections.split(",") if name.strip()] if sections else list(SECTION_BUILDERS)
+    invalid = [name for name in names if name not in SECTION_BUILDERS]
+    if invalid:
+        raise HTTPException(status_code=422, detail=f"Secciones inválidas: {', '.join(invalid)}")
+    
+    if not stream:
+        return await shared_insight(*dashboard_flight(names, start_date, end_date, options, terms))
+    
+    feedbacks = await get_filtered_feedbacks(start_date, end_date, terms)
     metrics = MetricsService.get_all_metrics(feedbacks)
-    comments = [f.comment for f in feedbacks if f.comment]
+    calls = {name: SECTION_BUILDERS[name](feedbacks, metrics, options) for name in names}
     
-    plans = await ai_service.get_action_plans(metrics, comments)
-    return {"action_plans": plans}
+    async def keyed(name: str, call: Awaitable) -> Tuple[str, Any]:
+        return name, await run_section(name, call)
+    
+    async def ndjson():
+        for ready in asyncio.as_completed([keyed(name, call) for name, call in calls.items()]):
+            name, data = await ready
+            yield json.dumps({"section": name, "data": data}, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@router.get("/insights/cache", tags=[TAG_INSIGHTS], summary="Estado de la Caché de IA")
+async def get_cache_stats():
+    return {
+        **llm_cache.stats(),
+        "requests": insight_flights.stats(),
+        "timeseries": range_cache.stats(),
+        "snapshot": analytics_snapshot.stats(),
+        "precompute": insight_scheduler.stats(),
+        "search": await asyncio.to_thread(search_index.stats),
+    }
+
+@router.get("/insights/llm", tags=[TAG_INSIGHTS], summary="Estado del Cliente de IA")
+async def get_llm_status():
+    """Estado del circuit breaker, límite de solicitudes adaptativo y conteo de resultados de las llamadas a OpenAI."""
+    return ai_service.resilience.stats()
+
+@router.delete("/insights/cache", tags=[TAG_INSIGHTS], summary="Invalidar la Caché de IA")
+async def clear_cache():
+    await llm_cache.clear()
+    insight_flights.invalidate()
+    insight_scheduler.invalidate()
+    range_cache.clear()
+    return {"status": "success", "message": "Caché de IA invalidada"}
@@ -9,8 +9,81 @@ class Settings(BaseSettings):
     AWS_SECRET_ACCESS_KEY: Optional[str] = None
     DYNAMODB_ENDPOINT_URL: Optional[str] = None
     DYNAMODB_TABLE_NAME: str = "Feedbacks"
+    DYNAMODB_ROLLUP_TABLE_NAME: str = "FeedbackRollups"
+    DYNAMODB_META_TABLE_NAME: str = "FeedbackMeta"
+    META_RECHECK_SECONDS: float = 60
+    DYNAMODB_MAX_POOL_CONNECTIONS: int = 32
+    DYNAMODB_RETRY_MODE: str = "adaptive"
+    DYNAMODB_MAX_ATTEMPTS: int = 5
+    DYNAMODB_CONNECT_TIMEOUT: float = 2.0
+    DYNAMODB_READ_TIMEOUT: float = 10.0
+    DYNAMODB_DATE_INDEX: str = "date-bucket-index"
+    DYNAMODB_INGEST_INDEX: str = "ingest-day-index"
+    DYNAMODB_SCAN_SEGMENTS: int = 4
+    DYNAMODB_READ_WORKERS: int = 8
+    DYNAMODB_IO_WORKERS: int = 16
+    DYNAMODB_MAX_PENDING: int = 64
+    DYNAMODB_PAGE_SIZE: Optional[int] = None
+    WRITE_BUFFER_ENABLED: bool = False
+    WRITE_BUFFER_MAX_DELAY_MS: int = 50
+    WRITE_BUFFER_ACK: str = "flush"
+    FEEDBACK_BATCH_MAX_ITEMS: int = 1000
+    INGEST_WORKERS: int = 4
+    INGEST_CHUNK_SIZE: int = 500
     OPENAI_API_KEY: str = ""
     OPENAI_MODEL: str = "gpt-4o-mini"
+    OPENAI_MAX_CONCURRENCY: int = 4
+    OPENAI_CALL_TIMEOUT: float = 20.0
+    OPENAI_DEADLINE_SECONDS: float = 15.0
+    OPENAI_MAX_RETRIES: int = 3
+    OPENAI_MAX_REQUESTS_PER_SECOND: float = 5.0
+    OPENAI_BREAKER_FAILURES: int = 5
+    OPENAI_BREAKER_RESET_SECONDS: float = 30.0
+    PROMPT_COMMENT_TOKEN_BUDGET: int = 1500
+    PROMPT_MAX_COMMENT_CHARS: int = 500
+    PROMPT_DATE_STRATA: int = 4
+    INSIGHTS_COVERAGE: str = "sample"
+    INSIGHTS_MODE: str = "llm"
+    INSIGHTS_AUTO_TIMEOUT: float = 8.0
+    INSIGHTS_AUTO_FULL_TIMEOUT: float = 90.0
+    INSIGHTS_SECTION_TIMEOUT: float = 120.0
+    INSIGHTS_FRESH_SECONDS: float = 30
+    INSIGHTS_STALE_SECONDS: float = 300
+    INSIGHTS_MAX_STORED: int = 256
+    PRECOMPUTE_ENABLED: bool = False
+    PRECOMPUTE_WINDOWS: str = "last_7,last_30,last_90,month_to_date,previous_month"
+    PRECOMPUTE_SECTIONS: str = "overview,nps,csat,ces,drivers,topics,segments,action_plans,dashboard"
+    PRECOMPUTE_INTERVAL_SECONDS: float = 900
+    PRECOMPUTE_DEBOUNCE_SECONDS: float = 30
+    PRECOMPUTE_DEBOUNCE_MAX_SECONDS: float = 300
+    PRECOMPUTE_CONCURRENCY: int = 2
+    PRECOMPUTE_LLM_BUDGET_PER_HOUR: int = 200
+    PRECOMPUTE_MAX_AGE_SECONDS: float = 3600
+    TIMESERIES_DEFAULT_DAYS: int = 90
+    TIMESERIES_MAX_BUCKETS: int = 1000
+    TIMESERIES_CLOSE_AFTER_DAYS: int = 2
+    TIMESERIES_CACHE_TTL_SECONDS: int = 24 * 3600
+    TIMESERIES_CACHE_MAX_ENTRIES: int = 4096
+    MAPREDUCE_CHUNK_TOKENS: int = 3000
+    MAPREDUCE_REDUCE_GROUP: int = 150
+    MAPREDUCE_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    LLM_CACHE_MAX_ENTRIES: int = 1024
+    LLM_CACHE_TTL_SECONDS: int = 3600
+    LLM_CACHE_PATH: str = ""
+    LLM_CACHE_MAX_PERSISTENT_ENTRIES: int = 10000
+    TOPIC_MODEL_PATH: str = "topic_model.npz"
+    TOPIC_CLUSTERS: int = 12
+    TOPIC_MODEL_RECHECK_SECONDS: float = 30
+    SEARCH_INDEX_PATH: str = ""
+    SEARCH_INDEX_MERGE_ROWS: int = 32
+    SEARCH_MAX_RESULTS: int = 100
+    SNAPSHOT_PATH: str = ""
+    SNAPSHOT_SKEW_SECONDS: int = 60
+    SNAPSHOT_KEEP: int = 2
     LOG_LEVEL: str = "INFO"
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_SAMPLE_BURST: int = 20
+    LOG_SAMPLE_WINDOW_SECONDS: float = 1.0
+    PROFILING_ENABLED: bool = False
 
 settings = Settings()
@@ -1,15 +1,55 @@
 import boto3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from botocore.config import Config
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from app.core import telemetry
 from app.core.config import settings
 from app.core.logging import logger
 
-def get_dynamodb_resource():
-    """Initializes the DynamoDB resource based on configuration."""
+_read_executor = ThreadPoolExecutor(max_workers=settings.DYNAMODB_READ_WORKERS, thread_name_prefix="dynamodb-read")
+
+@dataclass
+class ReadStats:
+    """Counters accumulated over every page of a paginated read."""
+    pages: int = 0
+    items: int = 0
+    scanned: int = 0
+    consumed_capacity: float = 0.0
+
+    def add_page(self, response: Dict[str, Any]):
+        self.pages += 1
+        self.items += response.get("Count", 0)
+        self.scanned += response.get("ScannedCount", 0)
+        self.consumed_capacity += response.get("ConsumedCapacity", {}).get("CapacityUnits", 0.0)
+
+    def merge(self, other: "ReadStats"):
+        self.pages += other.pages
+        self.items += other.items
+        self.scanned += other.scanned
+        self.consumed_capacity += other.consumed_capacity
+
+# Process-wide resource; its low-level client (and connection pool) is thread-safe and shared by every thread
+_resource = None
+_resource_lock = threading.Lock()
+
+def _connection_params() -> Dict[str, Any]:
     params = {
-        "region_name": settings.AWS_REGION
+        "region_name": settings.AWS_REGION,
+        "config": Config(
+            max_pool_connections=settings.DYNAMODB_MAX_POOL_CONNECTIONS,
+            tcp_keepalive=True,
+            connect_timeout=settings.DYNAMODB_CONNECT_TIMEOUT,
+            read_timeout=settings.DYNAMODB_READ_TIMEOUT,
+            retries={"mode": settings.DYNAMODB_RETRY_MODE, "max_attempts": settings.DYNAMODB_MAX_ATTEMPTS}
+        )
     }
-    
-    # Diagnostic Log
-    logger.info(f"Connecting to DynamoDB - Region: {settings.AWS_REGION} | Endpoint: {settings.DYNAMODB_ENDPOINT_URL or 'AWS Cloud'}")
 
     if settings.AWS_ACCESS_KEY_ID:
         params["aws_access_key_id"] = settings.AWS_ACCESS_KEY_ID
@@ -19,14 +59,260 @@ def get_dynamodb_resource():
     # For Local Development override if set
     if settings.DYNAMODB_ENDPOINT_URL:
         params["endpoint_url"] = settings.DYNAMODB_ENDPOINT_URL
+    return params
 
-    return boto3.resource("dynamodb", **params)
+def _create_dynamodb_resource():
+    """Builds the DynamoDB resource based on configuration."""
+    # Diagnostic Log
+    logger.info(f"Connecting to DynamoDB - Region: {settings.AWS_REGION} | Endpoint: {settings.DYNAMODB_ENDPOINT_URL or 'AWS Cloud'}")
 
-def init_db():
-    """Creates the DynamoDB table if it doesn't exist."""
-    dynamodb = get_dynamodb_resource()
-    table_name = settings.DYNAMODB_TABLE_NAME
-    
+    # A dedicated session: the boto3 default session is not thread-safe
+    return boto3.session.Session().resource("dynamodb", **_connection_params())
+
+def get_dynamodb_resource():
+    """Returns the process-wide DynamoDB resource, creating it on first use."""
+    global _resource
+    if _resource is None:
+        with _resource_lock:
+            if _resource is None:
+                _resource = _create_dynamodb_resource()
+    return _resource
+
+# Plain low-level client: responses keep the wire format ({"N": "9"}), skipping the resource's
+# per-attribute Decimal conversion. Bulk reads decode it themselves with parse_item.
+_raw_client = None
+
+def get_raw_client():
+    """Returns the process-wide low-level client used by bulk reads, creating it on first use."""
+    global _raw_client
+    if _raw_client is None:
+        with _resource_lock:
+            if _raw_client is None:
+                _raw_client = boto3.session.Session().client("dynamodb", **_connection_params())
+    return _raw_client
+
+def close_dynamodb():
+    """Closes the pooled connections. The next call to get_dynamodb_resource() reconnects."""
+    global _resource, _raw_client
+    with _resource_lock:
+        if _resource is not None:
+            _resource.meta.client.close()
+            _resource = None
+        if _raw_client is not None:
+            _raw_client.close()
+            _raw_client = None
+
+_deserializer = TypeDeserializer()
+
+def _parse_number(value: str) -> Any:
+    try:
+        return int(value)
+    except ValueError:
+        return Decimal(value)
+
+_SCALAR_PARSERS = {
+    "S": str,
+    "N": _parse_number,
+    "B": bytes,
+    "BOOL": bool,
+}
+
+def parse_item(raw: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Decodes a wire-format item. Scalars take one dict lookup each and integers come back as int
+    (the resource client returns Decimal); lists, maps and sets go through boto3's deserializer.
+    """
+    item = {}
+    for name, value in raw.items():
+        for kind, data in value.items():
+            parser = _SCALAR_PARSERS.get(kind)
+            item[name] = parser(data) if parser else _deserializer.deserialize(value)
+    return item
+
+def wire_values(values: Dict[str, str]) -> Dict[str, Dict[str, str]]:
+    """ExpressionAttributeValues for the low-level client; every bound used by the bulk reads is a string."""
+    return {placeholder: {"S": value} for placeholder, value in values.items()}
+
+def date_bucket(iso_date: str) -> str:
+    """Partition key of the date index: the `YYYY-MM` month of an ISO date."""
+    return iso_date[:7]
+
+def month_buckets(start: str, end: str) -> List[str]:
+    """Every `YYYY-MM` bucket overlapping the inclusive ISO date window."""
+    year, month = int(start[:4]), int(start[5:7])
+    last = date_bucket(end)
+    buckets = []
+    while True:
+        bucket = f"{year:04d}-{month:02d}"
+        if bucket > last:
+            return buckets
+        buckets.append(bucket)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+DATE_INDEX_ATTRIBUTES = [
+    {'AttributeName': 'date_bucket', 'AttributeType': 'S'},
+    {'AttributeName': 'date', 'AttributeType': 'S'}
+]
+
+def _date_index_definition() -> Dict[str, Any]:
+    return {
+        'IndexName': settings.DYNAMODB_DATE_INDEX,
+        'KeySchema': [
+            {'AttributeName': 'date_bucket', 'KeyType': 'HASH'},  # YYYY-MM bucket
+            {'AttributeName': 'date', 'KeyType': 'RANGE'}  # ISO date, sortable as a string
+        ],
+        'Projection': {'ProjectionType': 'ALL'},
+        'ProvisionedThroughput': {
+            'ReadCapacityUnits': 5,
+            'WriteCapacityUnits': 5
+        }
+    }
+
+INGEST_INDEX_ATTRIBUTES = [
+    {'AttributeName': 'ingest_day', 'AttributeType': 'S'},
+    {'AttributeName': 'created_at', 'AttributeType': 'S'}
+]
+
+def _ingest_index_definition() -> Dict[str, Any]:
+    return {
+        'IndexName': settings.DYNAMODB_INGEST_INDEX,
+        'KeySchema': [
+            {'AttributeName': 'ingest_day', 'KeyType': 'HASH'},  # UTC day the item was written
+            {'AttributeName': 'created_at', 'KeyType': 'RANGE'}  # ISO UTC timestamp, sortable as a string
+        ],
+        'Projection': {'ProjectionType': 'ALL'},
+        'ProvisionedThroughput': {
+            'ReadCapacityUnits': 5,
+            'WriteCapacityUnits': 5
+        }
+    }
+
+def _read_meta(name: str) -> Optional[Dict[str, Any]]:
+    response = get_dynamodb_resource().meta.client.get_item(TableName=settings.DYNAMODB_META_TABLE_NAME, Key={"name": name})
+    return response.get("Item")
+
+def _write_meta(name: str):
+    get_dynamodb_resource().meta.client.put_item(
+        TableName=settings.DYNAMODB_META_TABLE_NAME,
+        Item={"name": name, "completed_at": datetime.now(timezone.utc).isoformat(timespec="microseconds")},
+    )
+
+class Marker:
+    """
+    A flag in the meta table, set once a one-off job completed (e.g. a backfill) so every process can rely on
+    its result. Once seen set it stays cached; while unset it is re-read at most every META_RECHECK_SECONDS,
+    so running workers pick it up without a restart.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._set = False
+        self._checked: Optional[float] = None
+
+    def is_set(self) -> bool:
+        if self._set:
+            return True
+        now = time.monotonic()
+        if self._checked is not None and now - self._checked < settings.META_RECHECK_SECONDS:
+            return False
+        self._checked = now
+        try:
+            self._set = _read_meta(self.name) is not None
+        except Exception as e:
+            logger.warning(f"Could not read marker '{self.name}': {str(e)}")
+        return self._set
+
+    def set(self):
+        _write_meta(self.name)
+        self._set = True
+
+class Stamp:
+    """
+    When something other processes cache was last changed (e.g. a backdated write), kept in the meta table.
+    Readers drop what they built under an older value; it is re-read at most every META_RECHECK_SECONDS.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._value: Optional[str] = None
+        self._checked: Optional[float] = None
+
+    def current(self) -> Optional[str]:
+        now = time.monotonic()
+        if self._checked is None or now - self._checked >= settings.META_RECHECK_SECONDS:
+            self._checked = now
+            try:
+                item = _read_meta(self.name)
+                self._value = item["completed_at"] if item else None
+            except Exception as e:
+                logger.warning(f"Could not read stamp '{self.name}': {str(e)}")
+        return self._value
+
+    def touch(self):
+        _write_meta(self.name)
+
+# Every item carries its `date_bucket`: set for new tables, and by backfill_date_buckets for older ones
+date_buckets_backfilled = Marker("date_buckets_backfilled")
+# The daily rollups count every stored item: set for tables created together, and by rebuild_rollups
+rollups_backfilled = Marker("rollups_backfilled")
+# Rollups of days that closed ranges cover were changed: by backdated writes, ingestion or a rebuild
+rollups_changed = Stamp("rollups_changed")
+
+# Whether the date index exists and is ACTIVE (set by init_db); reads also need date_buckets_backfilled
+_date_index_active = False
+# Whether items written since a point in time can be read through the ingest index (set by init_db)
+_ingest_index_active = False
+
+def _ensure_date_index(dynamodb, table_name: str):
+    """Adds the date index to a table created before it existed."""
+    global _date_index_active
+    description = dynamodb.meta.client.describe_table(TableName=table_name)["Table"]
+    for index in description.get("GlobalSecondaryIndexes", []):
+        if index["IndexName"] == settings.DYNAMODB_DATE_INDEX:
+            _date_index_active = index["IndexStatus"] == "ACTIVE"
+            if not _date_index_active:
+                logger.warning(f"Date index '{settings.DYNAMODB_DATE_INDEX}' is {index['IndexStatus']}, date filters will use Scan.")
+            return
+
+    dynamodb.meta.client.update_table(
+        TableName=table_name,
+        AttributeDefinitions=DATE_INDEX_ATTRIBUTES,
+        GlobalSecondaryIndexUpdates=[{'Create': _date_index_definition()}]
+    )
+    logger.warning(
+        f"Date index '{settings.DYNAMODB_DATE_INDEX}' is being created. "
+        "Run `python -m app.maintenance backfill-buckets` to index existing feedback."
+    )
+
+def _ensure_ingest_index(dynamodb, table_name: str):
+    """Adds the ingest index to a table created before it existed. Items written earlier are never in it."""
+    global _ingest_index_active
+    description = dynamodb.meta.client.describe_table(TableName=table_name)["Table"]
+    for index in description.get("GlobalSecondaryIndexes", []):
+        if index["IndexName"] == settings.DYNAMODB_INGEST_INDEX:
+            _ingest_index_active = index["IndexStatus"] == "ACTIVE"
+            if not _ingest_index_active:
+                logger.warning(f"Ingest index '{settings.DYNAMODB_INGEST_INDEX}' is {index['IndexStatus']}, the analytics snapshot is disabled.")
+            return
+
+    try:
+        dynamodb.meta.client.update_table(
+            TableName=table_name,
+            AttributeDefinitions=INGEST_INDEX_ATTRIBUTES,
+            GlobalSecondaryIndexUpdates=[{'Create': _ingest_index_definition()}]
+        )
+    except ClientError as e:
+        # Only one index can be created at a time; the next start retries
+        logger.warning(f"Could not create ingest index '{settings.DYNAMODB_INGEST_INDEX}': {str(e)}")
+        return
+    logger.warning(
+        f"Ingest index '{settings.DYNAMODB_INGEST_INDEX}' is being created. "
+        "Run `python -m app.maintenance build-snapshot` once it is active."
+    )
+
+def _create_feedback_table(dynamodb, table_name: str) -> bool:
+    """Creates the feedback table with its indexes, or adds the missing indexes. Returns whether it was created."""
+    global _date_index_active, _ingest_index_active
     try:
         table = dynamodb.create_table(
             TableName=table_name,
@@ -34,17 +320,95 @@ def init_db():
                 {'AttributeName': 'id', 'KeyType': 'HASH'}  # Partition key
             ],
             AttributeDefinitions=[
-                {'AttributeName': 'id', 'AttributeType': 'S'}
+                {'AttributeName': 'id', 'AttributeType': 'S'},
+                *DATE_INDEX_ATTRIBUTES,
+                *INGEST_INDEX_ATTRIBUTES
             ],
+            GlobalSecondaryIndexes=[_date_index_definition(), _ingest_index_definition()],
             ProvisionedThroughput={
                 'ReadCapacityUnits': 5,
                 'WriteCapacityUnits': 5
             }
         )
         table.wait_until_exists()
+        _date_index_active = True
+        _ingest_index_active = True
         logger.info(f"DynamoDB Table '{table_name}' created successfully.")
+        return True
     except dynamodb.meta.client.exceptions.ResourceInUseException:
         logger.info(f"DynamoDB Table '{table_name}' already exists.")
+        _ensure_date_index(dynamodb, table_name)
+        _ensure_ingest_index(dynamodb, table_name)
+        return False
+
+def _create_rollup_table(dynamodb, table_name: str) -> bool:
+    """Creates the daily rollup table. Returns whether it was created."""
+    try:
+        table = dynamodb.create_table(
+            TableName=table_name,
+            KeySchema=[
+                {'AttributeName': 'month', 'KeyType': 'HASH'},  # YYYY-MM, same buckets as the date index
+                {'AttributeName': 'day', 'KeyType': 'RANGE'}  # ISO date
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'month', 'AttributeType': 'S'},
+                {'AttributeName': 'day', 'AttributeType': 'S'}
+            ],
+            ProvisionedThroughput={
+                'ReadCapacityUnits': 5,
+                'WriteCapacityUnits': 5
+            }
+        )
+        table.wait_until_exists()
+        logger.info(f"DynamoDB Table '{table_name}' created successfully.")
+        return True
+    except dynamodb.meta.client.exceptions.ResourceInUseException:
+        logger.info(f"DynamoDB Table '{table_name}' already exists.")
+        return False
+
+def _create_meta_table(dynamodb, table_name: str):
+    try:
+        table = dynamodb.create_table(
+            TableName=table_name,
+            KeySchema=[
+                {'AttributeName': 'name', 'KeyType': 'HASH'}  # Marker name
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'name', 'AttributeType': 'S'}
+            ],
+            ProvisionedThroughput={
+                'ReadCapacityUnits': 1,
+                'WriteCapacityUnits': 1
+            }
+        )
+        table.wait_until_exists()
+        logger.info(f"DynamoDB Table '{table_name}' created successfully.")
+    except dynamodb.meta.client.exceptions.ResourceInUseException:
+        logger.info(f"DynamoDB Table '{table_name}' already exists.")
+
+def init_db():
+    """
+    Creates the feedback table (with its date index), the daily rollup table and the meta table of
+    completion markers if they don't exist.
+    """
+    dynamodb = get_dynamodb_resource()
+    
+    try:
+        _create_meta_table(dynamodb, settings.DYNAMODB_META_TABLE_NAME)
+        feedback_created = _create_feedback_table(dynamodb, settings.DYNAMODB_TABLE_NAME)
+        if feedback_created:
+            # Nothing was written without a bucket
+            date_buckets_backfilled.set()
+        elif _date_index_active and not date_buckets_backfilled.is_set():
+            logger.warning(
+                f"Date index '{settings.DYNAMODB_DATE_INDEX}' is not backfilled, date filters will use Scan. "
+                "Run `python -m app.maintenance backfill-buckets`."
+            )
+        if _create_rollup_table(dynamodb, settings.DYNAMODB_ROLLUP_TABLE_NAME) and feedback_created:
+            # Both empty: every item will be counted as it is written
+            rollups_backfilled.set()
+        elif not rollups_backfilled.is_set():
+            logger.warning("Daily rollups are not rebuilt, metrics are read from the feedback. Run `python -m app.maintenance rebuild-rollups`.")
     except Exception as e:
         logger.error(f"Error initializing DynamoDB: {str(e)}")
         # Don't raise if it's just a fallback for local dev when service isn't up yet
@@ -54,6 +418,338 @@ def init_db():
             raise
 
 def get_table():
-    """Helper to get the DynamoDB table resource."""
-    dynamodb = get_dynamodb_resource()
-    return dynamodb.Table(settings.DYNAMODB_TABLE_NAME)
+    """Helper to get the DynamoDB table resource (backed by the shared client)."""
+    return get_dynamodb_resource().Table(settings.DYNAMODB_TABLE_NAME)
+
+def build_projection(fields: Sequence[str]) -> Tuple[str, Dict[str, str]]:
+    """Builds a ProjectionExpression using placeholders, since `date` and `comment` are reserved words."""
+    names = {f"#{field}": field for field in fields}
+    return ", ".join(names), names
+
+def date_range_filter(start: Optional[str], end: Optional[str]) -> Tuple[Optional[str], Dict[str, str], Dict[str, Any]]:
+    """Returns (FilterExpression, ExpressionAttributeNames, ExpressionAttributeValues) for an ISO date window."""
+    if start and end:
+        return "#date BETWEEN :start AND :end", {"#date": "date"}, {":start": start, ":end": end}
+    if start:
+        return "#date >= :start", {"#date": "date"}, {":start": start}
+    if end:
+        return "#date <= :end", {"#date": "date"}, {":end": end}
+    return None, {}, {}
+
+def _read_pages(operation, params: Dict[str, Any], parse: Optional[Callable] = None) -> Tuple[List[Dict[str, Any]], ReadStats]:
+    """Runs a Scan or Query, following LastEvaluatedKey until every page has been read."""
+    stats = ReadStats()
+    items = []
+    kwargs = dict(params)
+    while True:
+        response = operation(**kwargs)
+        stats.add_page(response)
+        page = response.get("Items", [])
+        items.extend(map(parse, page) if parse else page)
+        last_key = response.get("LastEvaluatedKey")
+        if not last_key:
+            return items, stats
+        kwargs["ExclusiveStartKey"] = last_key
+
+def fan_out_reads(operation, requests: List[Dict[str, Any]], parse: Optional[Callable] = None) -> Tuple[List[Dict[str, Any]], ReadStats]:
+    """
+    Runs independent paginated reads concurrently on the shared read pool and merges them.
+    `parse` decodes each item on the read threads (e.g. parse_item for the low-level client).
+    """
+    futures = [_read_executor.submit(_read_pages, operation, params, parse) for params in requests]
+
+    items: List[Dict[str, Any]] = []
+    stats = ReadStats()
+    for future in futures:
+        request_items, request_stats = future.result()
+        items.extend(request_items)
+        stats.merge(request_stats)
+    return items, stats
+
+def _base_read_params(fields: Sequence[str]) -> Dict[str, Any]:
+    projection, names = build_projection(fields)
+    params: Dict[str, Any] = {
+        "TableName": settings.DYNAMODB_TABLE_NAME,
+        "ProjectionExpression": projection,
+        "ExpressionAttributeNames": names,
+        "ReturnConsumedCapacity": "TOTAL",
+    }
+    if settings.DYNAMODB_PAGE_SIZE:
+        params["Limit"] = settings.DYNAMODB_PAGE_SIZE
+    return params
+
+def scan_table(
+    fields: Sequence[str],
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    segments: Optional[int] = None,
+) -> Tuple[List[Dict[str, Any]], ReadStats]:
+    """
+    Reads every item of the feedback table matching the date window.
+    The table is split into `segments` parallel scan segments, each paginated on the shared read pool.
+    """
+    client = get_raw_client()
+    total_segments = segments or settings.DYNAMODB_SCAN_SEGMENTS
+
+    params = _base_read_params(fields)
+    filter_expression, filter_names, values = date_range_filter(start, end)
+    if filter_expression:
+        params["FilterExpression"] = filter_expression
+        params["ExpressionAttributeNames"].update(filter_names)
+        params["ExpressionAttributeValues"] = wire_values(values)
+
+    items, stats = fan_out_reads(client.scan, [
+        dict(params, Segment=segment, TotalSegments=total_segments)
+        for segment in range(total_segments)
+    ], parse=parse_item)
+
+    # Per-request hot path: %-style args are only rendered by the log writer thread
+    logger.info(
+        "Scan completed - Segments: %d | Pages: %d | Items: %d | Scanned: %d | Consumed RCU: %s",
+        total_segments, stats.pages, stats.items, stats.scanned, stats.consumed_capacity
+    )
+    return items, stats
+
+def query_date_range(fields: Sequence[str], start: str, end: str) -> Tuple[List[Dict[str, Any]], ReadStats]:
+    """
+    Reads a closed date window through the date index.
+    One paginated Query is issued per `YYYY-MM` bucket and the buckets are read concurrently.
+    """
+    client = get_raw_client()
+    buckets = month_buckets(start, end)
+
+    params = _base_read_params(fields)
+    params["IndexName"] = settings.DYNAMODB_DATE_INDEX
+    params["KeyConditionExpression"] = "#date_bucket = :bucket AND #date BETWEEN :start AND :end"
+    params["ExpressionAttributeNames"].update({"#date_bucket": "date_bucket", "#date": "date"})
+
+    items, stats = fan_out_reads(client.query, [
+        dict(params, ExpressionAttributeValues=wire_values({":bucket": bucket, ":start": start, ":end": end}))
+        for bucket in buckets
+    ], parse=parse_item)
+
+    logger.info(
+        "Query completed - Buckets: %d | Pages: %d | Items: %d | Consumed RCU: %s",
+        len(buckets), stats.pages, stats.items, stats.consumed_capacity
+    )
+    return items, stats
+
+def read_date_range(
+    fields: Sequence[str],
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], ReadStats]:
+    """
+    Reads a date window, using the date index when both bounds are known and a parallel Scan otherwise.
+    Until the bucket backfill completed, items written before the index existed are only found by a Scan.
+    """
+    if start and end and _date_index_active and date_buckets_backfilled.is_set():
+        return query_date_range(fields, start, end)
+    return scan_table(fields, start=start, end=end)
+
+def ingest_index_active() -> bool:
+    return _ingest_index_active
+
+def ingest_day(created_at: str) -> str:
+    """Partition key of the ingest index: the UTC day of a `created_at` timestamp."""
+    return created_at[:10]
+
+def query_ingested_since(fields: Sequence[str], since: str) -> Tuple[List[Dict[str, Any]], ReadStats]:
+    """
+    Reads every item written at or after the ISO UTC timestamp `since` through the ingest index,
+    one paginated Query per UTC day up to today, run concurrently.
+    """
+    client = get_raw_client()
+    first = datetime.fromisoformat(since).date()
+    today = datetime.now(timezone.utc).date()
+    days = [(first + timedelta(days=offset)).isoformat() for offset in range((today - first).days + 1)]
+
+    params = _base_read_params(fields)
+    params["IndexName"] = settings.DYNAMODB_INGEST_INDEX
+    params["KeyConditionExpression"] = "#ingest_day = :day AND #created_at >= :since"
+    params["ExpressionAttributeNames"].update({"#ingest_day": "ingest_day", "#created_at": "created_at"})
+
+    return fan_out_reads(client.query, [
+        dict(params, ExpressionAttributeValues=wire_values({":day": day, ":since": since}))
+        for day in days
+    ], parse=parse_item)
+
+def backfill_date_buckets() -> int:
+    """
+    Writes `date_bucket` on every item created before the date index existed, then marks the index as
+    complete so closed windows are read through it. Returns the updated count.
+    """
+    client = get_dynamodb_resource().meta.client
+    total_segments = settings.DYNAMODB_SCAN_SEGMENTS
+
+    params = _base_read_params(("id", "date"))
+    params["FilterExpression"] = "attribute_not_exists(#date_bucket)"
+    params["ExpressionAttributeNames"]["#date_bucket"] = "date_bucket"
+    items, _ = fan_out_reads(client.scan, [
+        dict(params, Segment=segment, TotalSegments=total_segments)
+        for segment in range(total_segments)
+    ])
+
+    for updated, item in enumerate(items, start=1):
+        client.update_item(
+            TableName=settings.DYNAMODB_TABLE_NAME,
+            Key={"id": item["id"]},
+            UpdateExpression="SET #date_bucket = :bucket",
+            ExpressionAttributeNames={"#date_bucket": "date_bucket"},
+            ExpressionAttributeValues={":bucket": date_bucket(item["date"])}
+        )
+        if updated % 1000 == 0:
+            logger.info(f"Backfilled {updated}/{len(items)} date buckets...")
+
+    date_buckets_backfilled.set()
+    return len(items)
+
+def put_item(item: Dict[str, Any], updates: Optional[List[Dict[str, Any]]] = None):
+    """
+    Writes a single feedback item.
+    `updates` are TransactWriteItems `Update` requests (e.g. rollup counters) committed atomically with the item;
+    the item must then be new, so an id written twice cannot apply its updates twice.
+    """
+    client = get_dynamodb_resource().meta.client
+    if not updates:
+        response = client.put_item(TableName=settings.DYNAMODB_TABLE_NAME, Item=item, ReturnConsumedCapacity="TOTAL")
+    else:
+        response = client.transact_write_items(TransactItems=[
+            {"Put": {
+                "TableName": settings.DYNAMODB_TABLE_NAME,
+                "Item": item,
+                "ConditionExpression": "attribute_not_exists(#id)",
+                "ExpressionAttributeNames": {"#id": "id"},
+            }},
+            *({"Update": update} for update in updates)
+        ], ReturnConsumedCapacity="TOTAL")
+    telemetry.record_write_capacity(response)
+
+def batch_get(
+    keys: List[Dict[str, Any]], fields: Sequence[str], table_name: Optional[str] = None, max_retries: int = 8
+) -> List[Dict[str, Any]]:
+    """
+    Reads items by key with BatchGetItem in chunks of 100, retrying UnprocessedKeys with exponential backoff.
+    Keys must be distinct; keys without an item are skipped.
+    """
+    client = get_dynamodb_resource().meta.client
+    table_name = table_name or settings.DYNAMODB_TABLE_NAME
+    projection, names = build_projection(fields)
+    items: List[Dict[str, Any]] = []
+
+    for offset in range(0, len(keys), 100):
+        pending = {table_name: {"Keys": keys[offset:offset + 100], "ProjectionExpression": projection, "ExpressionAttributeNames": names}}
+        for attempt in range(max_retries + 1):
+            response = client.batch_get_item(RequestItems=pending)
+            items.extend(response.get("Responses", {}).get(table_name, []))
+            pending = response.get("UnprocessedKeys") or {}
+            if not pending:
+                break
+            if attempt == max_retries:
+                raise RuntimeError(f"{len(pending[table_name]['Keys'])} keys still unprocessed after {max_retries} retries")
+            time.sleep(min(0.05 * 2 ** attempt, 5.0))
+    return items
+
+def update_attributes(items: List[Dict[str, Any]], fields: Sequence[str], unchanged: Sequence[str] = ()) -> int:
+    """
+    Sets `fields` of each item with one UpdateItem per key, leaving every other attribute as stored.
+    Items whose `unchanged` attributes no longer hold the given values (rewritten or deleted since they
+    were read) are skipped. Returns the number of items updated.
+    """
+    client = get_dynamodb_resource().meta.client
+    names = {f"#{field}": field for field in (*fields, *unchanged)}
+    assignments = ", ".join(f"#{field} = :{field}" for field in fields)
+    condition = " AND ".join(f"#{field} = :{field}_read" for field in unchanged) or None
+
+    def update(item: Dict[str, Any]) -> bool:
+        params = {
+            "TableName": settings.DYNAMODB_TABLE_NAME,
+            "Key": {"id": item["id"]},
+            "UpdateExpression": f"SET {assignments}",
+            "ExpressionAttributeNames": names,
+            "ExpressionAttributeValues": {
+                **{f":{field}": item[field] for field in fields},
+                **{f":{field}_read": item[field] for field in unchanged},
+            },
+            "ReturnConsumedCapacity": "TOTAL",
+        }
+        if condition:
+            params["ConditionExpression"] = condition
+        try:
+            telemetry.record_write_capacity(client.update_item(**params))
+        except client.exceptions.ConditionalCheckFailedException:
+            return False
+        return True
+
+    with ThreadPoolExecutor(max_workers=settings.DYNAMODB_IO_WORKERS, thread_name_prefix="dynamodb-update") as executor:
+        return sum(executor.map(update, items))
+
+def _batch_write_requests(
+    table_name: str, requests: List[Dict[str, Any]], max_retries: int,
+    on_written: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+):
+    """
+    Sends BatchWriteItem requests in chunks of 25, retrying UnprocessedItems with exponential backoff.
+    `on_written` gets the requests of each chunk once they are stored, before the next chunk is sent,
+    and the stored part of a chunk that fails, so side effects follow exactly what reached the table.
+    """
+    client = get_dynamodb_resource().meta.client
+
+    for offset in range(0, len(requests), 25):
+        chunk = requests[offset:offset + 25]
+        pending = {table_name: chunk}
+        try:
+            for attempt in range(max_retries + 1):
+                response = client.batch_write_item(RequestItems=pending, ReturnConsumedCapacity="TOTAL")
+                telemetry.record_write_capacity(response)
+                pending = response.get("UnprocessedItems") or {}
+                if not pending:
+                    break
+                if attempt == max_retries:
+                    raise RuntimeError(f"{len(pending[table_name])} items still unprocessed after {max_retries} retries")
+                time.sleep(min(0.05 * 2 ** attempt, 5.0))
+        except Exception:
+            # Earlier attempts may have stored part of the chunk; UnprocessedItems lists what is still missing
+            unprocessed = pending.get(table_name, [])
+            stored = [request for request in chunk if request not in unprocessed]
+            if stored and on_written is not None:
+                on_written(stored)
+            raise
+        if on_written is not None:
+            on_written(chunk)
+
+class BatchWriteError(Exception):
+    """A batch write that stopped partway: `written` holds the items stored before it failed."""
+
+    def __init__(self, message: str, written: List[Dict[str, Any]]):
+        super().__init__(message)
+        self.written = written
+
+def batch_write(
+    items: List[Dict[str, Any]], table_name: Optional[str] = None, max_retries: int = 8,
+    on_written: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+) -> int:
+    """
+    Writes items with BatchWriteItem. Returns the number of items written. `on_written` gets each stored
+    chunk of items. On failure raises BatchWriteError with the items that were stored anyway.
+    """
+    requests = [{"PutRequest": {"Item": item}} for item in items]
+    written: List[Dict[str, Any]] = []
+
+    def stored(chunk: List[Dict[str, Any]]):
+        chunk_items = [request["PutRequest"]["Item"] for request in chunk]
+        written.extend(chunk_items)
+        if on_written is not None:
+            on_written(chunk_items)
+
+    try:
+        _batch_write_requests(table_name or settings.DYNAMODB_TABLE_NAME, requests, max_retries, stored)
+    except Exception as e:
+        raise BatchWriteError(f"{len(items) - len(written)} of {len(items)} items not written: {str(e)}", written) from e
+    return len(items)
+
+def batch_delete(keys: List[Dict[str, Any]], table_name: str, max_retries: int = 8) -> int:
+    """Deletes items by key with BatchWriteItem. Returns the number of keys deleted."""
+    requests = [{"DeleteRequest": {"Key": key}} for key in keys]
+    _batch_write_requests(table_name, requests, max_retries)
+    return len(keys)
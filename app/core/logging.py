@@ -1,30 +1,175 @@
+import atexit
 import logging
 import json
+import os
+import queue
 import sys
+import threading
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Optional, Tuple
 from app.core.config import settings
 
+try:
+    import orjson
+except ImportError:  # Optional: the standard library encoder is used instead
+    orjson = None
+
+# Attributes every LogRecord has; anything else on a record came from `extra=` and is logged as a field
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+def _dumps(payload: Dict[str, Any]) -> str:
+    if orjson is not None:
+        return orjson.dumps(payload, default=str).decode()
+    return json.dumps(payload, default=str)
+
 class JSONFormatter(logging.Formatter):
+    """
+    One JSON object per record. Runs on the writer thread, so the message (`%`-style args) and `extra`
+    fields are only rendered there; extra values may be zero-argument callables, evaluated at that point.
+    """
+
     def format(self, record):
         log_record = {
-            "timestamp": datetime.now().isoformat(),
+            # When the call happened, not when the writer got to it
+            "timestamp": datetime.fromtimestamp(record.created).isoformat(),
             "level": record.levelname,
             "message": record.getMessage(),
             "module": record.module,
             "funcName": record.funcName,
         }
+        for name, value in record.__dict__.items():
+            if name not in _RESERVED:
+                log_record[name] = value() if callable(value) else value
         if record.exc_info:
             log_record["exception"] = self.formatException(record.exc_info)
-        return json.dumps(log_record)
+        return _dumps(log_record)
+
+class CallSiteSampler(logging.Filter):
+    """
+    Rate-limits records below ERROR per call site: at most `burst` records every `window` seconds.
+    The first record let through after a suppressed stretch carries a `suppressed` count.
+    Call sites (file and line) are used as keys because messages are usually f-strings.
+    """
+
+    def __init__(self, burst: int, window: float):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.suppressed = 0
+        # (pathname, lineno) -> [window start, records let through, records suppressed]
+        self._sites: Dict[Tuple[str, int], List] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR or self.burst <= 0:
+            return True
+        site = (record.pathname, record.lineno)
+        with self._lock:
+            state = self._sites.get(site)
+            if state is None or record.created - state[0] >= self.window:
+                self._sites[site] = [record.created, 1, 0]
+                if state is not None and state[2]:
+                    record.suppressed = state[2]
+                return True
+            if state[1] < self.burst:
+                state[1] += 1
+                return True
+            state[2] += 1
+            self.suppressed += 1
+            return False
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the writer thread; when the bounded queue is full the record is dropped and counted."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The default merges args and formats here, on the caller's thread; the listener lives in this process
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class LogWriter(QueueListener):
+    """Background writer; reports records dropped by the queue handler as a warning of its own."""
+
+    def __init__(self, log_queue: queue.Queue, handler: logging.Handler, source: NonBlockingQueueHandler):
+        super().__init__(log_queue, handler, respect_handler_level=True)
+        self._source = source
+        self._reported = 0
+
+    def handle(self, record: logging.LogRecord):
+        super().handle(record)
+        dropped = self._source.dropped
+        if dropped > self._reported:
+            super().handle(logging.makeLogRecord({
+                "name": "app.core.logging",
+                "levelno": logging.WARNING,
+                "levelname": "WARNING",
+                "msg": f"Log queue full: {dropped - self._reported} records dropped",
+                "module": "logging",
+                "funcName": "handle",
+            }))
+            self._reported = dropped
+
+    def enqueue_sentinel(self):
+        # Blocking put: at shutdown the queue may be full, and the writer is draining it
+        self.queue.put(self._sentinel)
+
+_writer: Optional[LogWriter] = None
+_sampler: Optional[CallSiteSampler] = None
 
 def setup_logging():
+    global _writer, _sampler
     logger = logging.getLogger()
     logger.setLevel(settings.LOG_LEVEL)
-    
+
     handler = logging.StreamHandler(sys.stdout)
     handler.setFormatter(JSONFormatter())
-    
-    logger.handlers = [handler]
+
+    if settings.LOG_QUEUE_SIZE <= 0:
+        # Synchronous writes, e.g. when debugging the logging itself
+        logger.handlers = [handler]
+        return logger
+
+    log_queue: queue.Queue = queue.Queue(settings.LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    _sampler = CallSiteSampler(settings.LOG_SAMPLE_BURST, settings.LOG_SAMPLE_WINDOW_SECONDS)
+    queue_handler.addFilter(_sampler)
+    _writer = LogWriter(log_queue, handler, queue_handler)
+    _writer.start()
+
+    logger.handlers = [queue_handler]
     return logger
 
+def stop_logging():
+    """
+    Writes out every queued record and stops the writer thread; later records are written synchronously.
+    Safe to call more than once.
+    """
+    global _writer
+    if _writer is not None:
+        _writer.stop()
+        logging.getLogger().handlers = list(_writer.handlers)
+        _writer = None
+
+def log_stats() -> Dict[str, int]:
+    queue_handler = next((h for h in logging.getLogger().handlers if isinstance(h, NonBlockingQueueHandler)), None)
+    return {
+        "queued": queue_handler.queue.qsize() if queue_handler else 0,
+        "dropped": queue_handler.dropped if queue_handler else 0,
+        "suppressed": _sampler.suppressed if _sampler else 0,
+    }
+
 logger = setup_logging()
+# Flush before the interpreter exits (runs before logging's own shutdown, which was registered earlier)
+atexit.register(stop_logging)
+# A forked child inherits the queue but not the writer thread
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=lambda: setup_logging() if _writer is not None else None)
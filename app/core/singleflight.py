@@ -0,0 +1,98 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Set
+from app.core.logging import logger
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical computations: while a key is in flight, later callers await the same task
+    instead of starting their own.
+
+    Results can optionally be kept for stale-while-revalidate. A result is fresh while its data version
+    matches the caller's and it is younger than `fresh_for` seconds; up to `stale_for` seconds past that it
+    is still returned immediately, while a single background task recomputes it. Errors are never stored.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._results: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._max_entries = max_entries
+        self._background: Set[asyncio.Task] = set()
+        self.coalesced = 0
+        self.stale_served = 0
+
+    def _start(self, key: Hashable, version: Any, factory: Callable[[], Awaitable[Any]], store: bool) -> asyncio.Task:
+        flight = (key, version)
+        task = self._inflight.get(flight)
+        if task is not None:
+            self.coalesced += 1
+            return task
+
+        async def run():
+            try:
+                value = await factory()
+                if store:
+                    self._results[key] = (value, version, time.monotonic())
+                    self._results.move_to_end(key)
+                    while len(self._results) > self._max_entries:
+                        self._results.popitem(last=False)
+                return value
+            finally:
+                self._inflight.pop(flight, None)
+
+        # The task is shared, so it must not be cancelled when the caller that started it goes away
+        task = asyncio.create_task(run())
+        self._inflight[flight] = task
+        return task
+
+    async def do(
+        self,
+        key: Hashable,
+        factory: Callable[[], Awaitable[Any]],
+        version: Any = None,
+        fresh_for: float = 0,
+        stale_for: float = 0,
+        refresh: bool = False,
+    ) -> Any:
+        """
+        Returns the result for `key`, computing it with `factory()` at most once at a time per (key, version).
+        `refresh` skips stored results but still joins an in-flight computation.
+        """
+        store = fresh_for > 0 or stale_for > 0
+        entry = self._results.get(key) if store and not refresh else None
+        if entry is not None:
+            value, stored_version, stored_at = entry
+            age = time.monotonic() - stored_at
+            if stored_version == version and age < fresh_for:
+                return value
+            if age < fresh_for + stale_for:
+                self.stale_served += 1
+                self._revalidate(key, version, factory)
+                return value
+
+        return await asyncio.shield(self._start(key, version, factory, store))
+
+    def _revalidate(self, key: Hashable, version: Any, factory: Callable[[], Awaitable[Any]]):
+        task = self._start(key, version, factory, store=True)
+        if task in self._background:
+            return
+        self._background.add(task)
+
+        def done(finished: asyncio.Task):
+            self._background.discard(finished)
+            if not finished.cancelled() and finished.exception() is not None:
+                logger.warning(f"Background refresh of {key} failed: {str(finished.exception())}")
+
+        task.add_done_callback(done)
+
+    def invalidate(self):
+        self._results.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._inflight),
+            "stored": len(self._results),
+            "coalesced": self.coalesced,
+            "stale_served": self.stale_served,
+        }
@@ -0,0 +1,116 @@
+import asyncio
+import contextvars
+import cProfile
+import functools
+import io
+import pstats
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+except ImportError:  # Optional: without prometheus-client, spans still feed the per-request timings
+    Counter = Histogram = generate_latest = None
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+if Histogram is not None:
+    REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"], buckets=LATENCY_BUCKETS)
+    STAGE_LATENCY = Histogram("stage_duration_seconds", "Latency of instrumented stages within a request", ["stage"], buckets=LATENCY_BUCKETS)
+    DYNAMODB_CAPACITY = Counter("dynamodb_consumed_capacity_units_total", "DynamoDB consumed capacity units", ["operation"])
+    DYNAMODB_ITEMS = Counter("dynamodb_items_total", "DynamoDB items returned or scanned by reads", ["kind"])
+    OPENAI_TOKENS = Counter("openai_tokens_total", "OpenAI tokens", ["kind"])
+    OPENAI_CALLS = Counter("openai_calls_total", "Chat completions by origin", ["source"])
+
+# Stage timings of the current request, in milliseconds (set by the timing middleware)
+request_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("request_timings", default=None)
+
+def enabled() -> bool:
+    return Histogram is not None
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Times a block: observed in the stage histogram and added to the current request's timings."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if Histogram is not None:
+            STAGE_LATENCY.labels(stage).observe(elapsed)
+        timings = request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed * 1000
+
+def traced(stage: str) -> Callable:
+    """Decorator form of `span` for sync and async functions."""
+    def decorate(func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def observe_request(method: str, route: str, status: int, elapsed: float):
+    if Histogram is not None:
+        REQUEST_LATENCY.labels(method, route, str(status)).observe(elapsed)
+
+def record_read(operation: str, items: int, scanned: int, capacity: float):
+    if Histogram is not None:
+        DYNAMODB_CAPACITY.labels(operation).inc(capacity)
+        DYNAMODB_ITEMS.labels("returned").inc(items)
+        DYNAMODB_ITEMS.labels("scanned").inc(scanned)
+
+def record_write_capacity(response: Dict[str, Any]):
+    if Histogram is not None:
+        consumed = response.get("ConsumedCapacity") or []
+        # PutItem returns a single entry, batch and transactional writes one per table
+        entries = [consumed] if isinstance(consumed, dict) else consumed
+        capacity = sum(entry.get("CapacityUnits", 0.0) for entry in entries)
+        DYNAMODB_CAPACITY.labels("write").inc(capacity)
+
+def record_llm_call(cached: bool, usage: Any = None):
+    if Histogram is None:
+        return
+    OPENAI_CALLS.labels("cache" if cached else "api").inc()
+    if usage is not None:
+        OPENAI_TOKENS.labels("prompt").inc(getattr(usage, "prompt_tokens", 0) or 0)
+        OPENAI_TOKENS.labels("completion").inc(getattr(usage, "completion_tokens", 0) or 0)
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """`Server-Timing` header value, readable in the browser's network panel."""
+    return ", ".join(f"{stage.replace(' ', '_')};dur={duration:.1f}" for stage, duration in timings.items())
+
+def exposition() -> bytes:
+    return generate_latest() if generate_latest is not None else b""
+
+class RequestProfiler:
+    """
+    cProfile over one request. The event loop is shared, so concurrent requests running meanwhile
+    also show up in the report; use it on an otherwise idle instance.
+    """
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+
+    def __enter__(self) -> "RequestProfiler":
+        self._profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self._profile.disable()
+
+    def report(self, limit: int = 50) -> str:
+        out = io.StringIO()
+        pstats.Stats(self._profile, stream=out).strip_dirs().sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
@@ -1,35 +1,217 @@
+import argparse
 import json
-from app.core.db import get_table, init_db
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, TextIO
+from pydantic import ValidationError
+from app.core.db import init_db
 from app.core.config import settings
 from app.core.logging import logger
+from app.models.feedback import FeedbackCreate
+from app.services.repository import to_item, write_batch
 
-def ingest_data():
-    """Ingests initial data from JSON to DynamoDB."""
+DEFAULT_DATASET = "scoopsxi-dataset-20250123.json"
+
+def _iter_json_array(f: TextIO, read_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """Yields the elements of a top-level JSON array, reading the file in `read_size` chunks."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    # Leading whitespace may span more than one read
+    while not buffer:
+        chunk = f.read(read_size)
+        if not chunk:
+            break
+        buffer = chunk.lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array")
+    pos = 1
+    eof = False
+
+    while True:
+        # Skip whitespace and separators between elements
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            if pos >= len(buffer):
+                raise json.JSONDecodeError("Buffer exhausted", buffer, pos)
+            record, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # The element continues in the next chunk: drop what was consumed and read more
+            chunk = f.read(read_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield record
+
+def _iter_json_lines(f: TextIO) -> Iterator[Dict[str, Any]]:
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+def iter_records(f: TextIO) -> Iterator[Dict[str, Any]]:
+    """Streams records from a JSON array or a JSON Lines file without loading it whole."""
+    first = ""
+    while not first:
+        char = f.read(1)
+        if not char:
+            return iter(())
+        first = char.strip()
+    f.seek(0)
+    return _iter_json_array(f) if first == "[" else _iter_json_lines(f)
+
+def parse_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Validates a raw dataset record with FeedbackCreate and returns its DynamoDB item."""
+    return to_item(str(record["id"]), FeedbackCreate(**record))
+
+class Checkpoint:
+    """
+    Persists how many leading records of a file are durably written, so an interrupted run can resume.
+    Chunks complete out of order; `records` only advances over a contiguous prefix of finished chunks,
+    and chunks finished past a gap (a failed chunk) are saved as well so the next run skips them.
+    """
+
+    def __init__(self, path: str, resume: bool):
+        self.path = path
+        self.records = 0
+        self._finished: Dict[int, int] = {}
+        if resume and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.records = state["records"]
+            self._finished = {start: count for start, count in state.get("finished", [])}
+
+    def finish(self, start: int, count: int):
+        self._finished[start] = count
+        while self.records in self._finished:
+            self.records += self._finished.pop(self.records)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"records": self.records, "finished": sorted(self._finished.items())}, f)
+
+    def finished_at(self, position: int) -> int:
+        """Records in the finished chunk starting at `position`, 0 if there is none."""
+        return self._finished.get(position, 0)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def ingest_data(
+    path: str = DEFAULT_DATASET,
+    workers: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    resume: bool = True,
+) -> int:
+    """
+    Streams a JSON array or JSONL export into DynamoDB.
+    Records are validated, grouped in chunks and written by parallel BatchWriteItem workers;
+    progress is checkpointed next to the file so a failed run resumes where it stopped.
+    Each chunk also updates the daily rollups, net of the stored versions it overwrites, so re-ingesting a
+    file (or a chunk written just before a crash) does not count it twice.
+    Returns the number of records written.
+    """
     # Ensure table exists
     init_db()
-    
-    table = get_table()
-    
+
+    workers = workers or settings.INGEST_WORKERS
+    chunk_size = chunk_size or settings.INGEST_CHUNK_SIZE
+    checkpoint = Checkpoint(f"{path}.checkpoint", resume)
+    if checkpoint.records:
+        logger.info(f"Resuming ingestion of '{path}' after {checkpoint.records} records.")
+
+    written = invalid = 0
+    started = time.perf_counter()
+    pending = {}
+
+    def settle(done) -> Optional[Exception]:
+        """Records the finished chunks; returns the first failure instead of stopping at it."""
+        nonlocal written
+        failure = None
+        for future in done:
+            start, span = pending.pop(future)
+            try:
+                written += future.result()
+            except Exception as e:
+                failure = failure or e
+                continue
+            checkpoint.finish(start, span)
+        return failure
+
+    def collect(done):
+        failure = settle(done)
+        if failure is not None:
+            # A chunk that still fails after retries stops the run: queued chunks are dropped, those already
+            # being written finish and are checkpointed, so resuming does not repeat them
+            for future in list(pending):
+                if future.cancel():
+                    pending.pop(future)
+            settle(wait(pending).done)
+            logger.error(f"Ingestion stopped after {written} records; resume continues from record {checkpoint.records}")
+            raise failure
+        elapsed = time.perf_counter() - started
+        logger.info(f"Ingested {written} records ({written / elapsed:.0f} rows/sec)")
+
+    with open(path, "r", encoding="utf-8") as f, ThreadPoolExecutor(max_workers=workers) as executor:
+        def submit(chunk: List[Dict[str, Any]], start: int, span: int):
+            pending[executor.submit(write_batch, chunk, may_exist=True)] = (start, span)
+            # Bound the records held in memory to the chunks being written
+            if len(pending) >= workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+
+        chunk: List[Dict[str, Any]] = []
+        chunk_start = skip_until = checkpoint.records
+        for position, record in enumerate(iter_records(f)):
+            if position < skip_until:
+                continue
+            finished = checkpoint.finished_at(position)
+            if finished:
+                # Written by an earlier run after the chunk that failed: close the current chunk here and skip it
+                if position > chunk_start:
+                    submit(chunk, chunk_start, position - chunk_start)
+                chunk, chunk_start = [], position + finished
+                skip_until = chunk_start
+                continue
+            try:
+                chunk.append(parse_record(record))
+            except (ValidationError, KeyError, TypeError, ValueError) as e:
+                invalid += 1
+                logger.warning(f"Skipping invalid record #{position}: {str(e)}")
+
+            if len(chunk) == chunk_size:
+                submit(chunk, chunk_start, position + 1 - chunk_start)
+                chunk, chunk_start = [], position + 1
+
+        if chunk:
+            pending[executor.submit(write_batch, chunk, may_exist=True)] = (chunk_start, position + 1 - chunk_start)
+        if pending:
+            collect(wait(pending).done)
+
+    checkpoint.clear()
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"Ingestion complete - Written: {written} | Invalid: {invalid} | "
+        f"Elapsed: {elapsed:.1f}s | Throughput: {written / elapsed if elapsed else 0:.0f} rows/sec"
+    )
+    return written
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streams a JSON array or JSONL feedback export into DynamoDB.")
+    parser.add_argument("path", nargs="?", default=DEFAULT_DATASET)
+    parser.add_argument("--workers", type=int, default=None, help="Parallel BatchWriteItem workers")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Records per worker task")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore an existing checkpoint")
+    args = parser.parse_args()
+
     try:
-        with open("scoopsxi-dataset-20250123.json", "r", encoding="utf-8") as f:
-            data = json.load(f)
-            
-        logger.info(f"Ingesting {len(data)} records into DynamoDB...")
-        
-        with table.batch_writer() as batch:
-            for item in data:
-                batch.put_item(Item={
-                    "id": str(item["id"]),
-                    "date": item["date"],
-                    "nps": int(item["nps"]),
-                    "csat": int(item["csat"]),
-                    "ces": int(item["ces"]),
-                    "comment": item["comment"]
-                })
-        
-        logger.info("Ingestion complete.")
+        ingest_data(args.path, args.workers, args.chunk_size, resume=not args.no_resume)
     except Exception as e:
         logger.error(f"Error during ingestion: {str(e)}")
-
-if __name__ == "__main__":
-    ingest_data()
+        sys.exit(1)
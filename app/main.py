@@ -1,6 +1,13 @@
-from fastapi import FastAPI
-from app.api.endpoints import router as api_router
-from app.core.db import init_db
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, Response
+from app.api.endpoints import router as api_router, insight_scheduler
+from app.core import telemetry
+from app.core.config import settings
+from app.core.db import init_db, get_dynamodb_resource, close_dynamodb
+from app.services.repository import feedback_repository
+from app.services.search import search_index
+from app.services.write_buffer import write_buffer
 
 app = FastAPI(
     title="Scoops XI - Experience Intelligence AI Backend",
@@ -23,7 +30,9 @@ app = FastAPI(
 
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
-from app.core.logging import logger
+from app.core.logging import logger, stop_logging
+from app.services.ai import IncompleteCoverage
+from app.services.prompting import preload_tokenizer
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request, exc):
@@ -33,6 +42,18 @@ async def validation_exception_handler(request, exc):
         content={"status": "error", "message": "Datos de entrada inválidos", "details": exc.errors()},
     )
 
+@app.exception_handler(IncompleteCoverage)
+async def incomplete_coverage_handler(request, exc):
+    logger.warning(f"Incomplete coverage: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={
+            "status": "error",
+            "message": "No se pudieron analizar todos los comentarios del periodo; reintenta en unos segundos",
+            "details": {"failed_chunks": exc.failed, "chunks": exc.chunks},
+        },
+    )
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     logger.error(f"Unexpected error: {str(exc)}")
@@ -41,14 +62,70 @@ async def global_exception_handler(request, exc):
         content={"status": "error", "message": "Ocurrió un error interno en el servidor"},
     )
 
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    """Request latency histogram, per-stage timings (`Server-Timing` header and log) and the opt-in profiler."""
+    timings = {}
+    token = telemetry.request_timings.set(timings)
+    started = time.perf_counter()
+    # Stays 500 when call_next raises, so failed requests still reach the latency histogram
+    status = 500
+    try:
+        if request.query_params.get("profile") == "1" and settings.PROFILING_ENABLED:
+            with telemetry.RequestProfiler() as profiler:
+                await call_next(request)
+            response = PlainTextResponse(profiler.report())
+        else:
+            response = await call_next(request)
+        status = response.status_code
+    finally:
+        telemetry.request_timings.reset(token)
+        elapsed = time.perf_counter() - started
+        route = request.scope.get("route")
+        telemetry.observe_request(request.method, route.path if route else "unmatched", status, elapsed)
+    
+    timings["total"] = elapsed * 1000
+    response.headers["Server-Timing"] = telemetry.server_timing(timings)
+    if len(timings) > 1:
+        logger.info(
+            "%s %s %d", request.method, request.url.path, status,
+            extra={"stages_ms": lambda: {stage: round(duration, 1) for stage, duration in timings.items()}}
+        )
+    return response
+
 @app.on_event("startup")
 def on_startup():
     logger.info("Initializing database...")
+    # Create the pooled DynamoDB client once, before the first request needs it
+    get_dynamodb_resource()
     init_db()
+    if not preload_tokenizer(settings.OPENAI_MODEL):
+        logger.warning("tiktoken not available; prompt token budgets use a character-based estimate")
+    if settings.PRECOMPUTE_ENABLED:
+        # Sync startup handlers run on the event loop, so the scheduler task can be created here
+        insight_scheduler.start()
     logger.info("Application started successfully.")
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    await insight_scheduler.stop()
+    # Flush buffered writes before the pools they run on are closed
+    await write_buffer.close()
+    feedback_repository.close()
+    search_index.close()
+    close_dynamodb()
+    logger.info("Application stopped.")
+    stop_logging()
+
 app.include_router(api_router, prefix="/api/v1")
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus exposition of the request, stage, DynamoDB and OpenAI metrics."""
+    if not telemetry.enabled():
+        return PlainTextResponse("prometheus-client no está instalado", status_code=503)
+    return Response(telemetry.exposition(), media_type=telemetry.CONTENT_TYPE_LATEST)
+
 @app.get("/")
 def root():
     return {"message": "Welcome to Scoops XI AI Backend API"}
@@ -0,0 +1,55 @@
+import argparse
+from app.core.db import init_db, backfill_date_buckets
+from app.core.logging import logger
+from app.services.rollups import rebuild_rollups
+from app.services.search import build_search_index, search_index
+from app.services.snapshot import build_snapshot
+from app.services.topics import rebuild_topics
+
+def backfill_buckets():
+    """Indexes feedback stored before the date index existed."""
+    init_db()
+    updated = backfill_date_buckets()
+    logger.info(f"Backfill complete. {updated} records updated.")
+
+def rebuild_metric_rollups():
+    """Recomputes the daily metric rollups from the raw feedback."""
+    init_db()
+    days = rebuild_rollups()
+    logger.info(f"Rollup rebuild complete. {days} days written.")
+
+def rebuild_topic_model():
+    """Retrains the local topic model and reassigns every comment to its topic."""
+    init_db()
+    clusters = rebuild_topics()
+    logger.info(f"Topic rebuild complete. {clusters} topics.")
+    # The new topics were written straight to the table; the search index serves them too
+    if clusters and search_index.enabled:
+        updated = build_search_index()
+        logger.info(f"Search index refreshed. {updated} records updated.")
+
+def build_analytics_snapshot():
+    """Compacts the feedback table into a new memory-mapped analytics snapshot under SNAPSHOT_PATH."""
+    init_db()
+    snapshot = build_snapshot()
+    logger.info(f"Snapshot build complete. {snapshot['rows']} records in {snapshot['name']}.")
+
+def build_comment_search_index():
+    """Indexes stored comments missing from or outdated in the search index (SEARCH_INDEX_PATH) and compacts it."""
+    init_db()
+    changed = build_search_index()
+    logger.info(f"Search index build complete. {changed} records added or updated.")
+
+COMMANDS = {
+    "backfill-buckets": backfill_buckets,
+    "rebuild-rollups": rebuild_metric_rollups,
+    "rebuild-topics": rebuild_topic_model,
+    "build-snapshot": build_analytics_snapshot,
+    "build-search-index": build_comment_search_index,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintenance commands for the feedback tables.")
+    parser.add_argument("command", choices=COMMANDS.keys())
+    args = parser.parse_args()
+    COMMANDS[args.command]()
@@ -11,9 +11,26 @@ class FeedbackBase(BaseModel):
 
 class Feedback(FeedbackBase):
     id: str
+    topic: Optional[str] = None
 
 class FeedbackCreate(FeedbackBase):
     pass
 
 class FeedbackRead(FeedbackBase):
     id: str
+
+class FeedbackRecord:
+    """
+    Read-side feedback used by the analytics endpoints. Plain slotted attributes without validation:
+    items were validated on ingest, and building pydantic models dominates the cost of large windows.
+    """
+    __slots__ = ("id", "date", "nps", "csat", "ces", "comment", "topic")
+
+    def __init__(self, date: date, nps: int, csat: int, ces: int, comment: Optional[str] = None, topic: Optional[str] = None, id: str = ""):
+        self.id = id
+        self.date = date
+        self.nps = nps
+        self.csat = csat
+        self.ces = ces
+        self.comment = comment
+        self.topic = topic
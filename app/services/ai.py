@@ -1,40 +1,120 @@
 from openai import AsyncOpenAI
+import asyncio
 import json
 import re
-from typing import Dict, List, Any
+from typing import Awaitable, Dict, List, Any, Optional
 from app.core.config import settings
 from app.core.logging import logger
+from app.core.telemetry import record_llm_call, span, traced
+from app.services.llm_cache import llm_cache, cache_key
+from app.services.llm_client import create_resilient_client
+from app.services.prompting import SCORE_BANDS, select_comments, chunk_comments, render_comments, prompt_tokens
+
+class LLMUnavailable(Exception):
+    """Raised by `strict=True` calls instead of returning a placeholder text or an empty result."""
+
+class IncompleteCoverage(LLMUnavailable):
+    """Raised by coverage=full analyses when some chunks of comments could not be analyzed."""
+
+    def __init__(self, failed: int, chunks: int):
+        super().__init__(f"{failed}/{chunks} chunks of comments could not be analyzed")
+        self.failed = failed
+        self.chunks = chunks
 
 class AIService:
     def __init__(self):
         if settings.OPENAI_API_KEY:
-            self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+            # Retries and timeouts are handled by the resilient layer, not by the SDK
+            self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, timeout=settings.OPENAI_DEADLINE_SECONDS, max_retries=0)
             self.model = settings.OPENAI_MODEL
         else:
             self.client = None
             self.model = None
+        # Caps in-flight OpenAI requests across every concurrent request served by this process
+        self._slots = asyncio.Semaphore(settings.OPENAI_MAX_CONCURRENCY)
+        self.resilience = create_resilient_client()
+
+    @staticmethod
+    def _unavailable(strict: bool, fallback: Any, what: str) -> Any:
+        """The placeholder shown to clients, or, for callers with a fallback of their own, an exception."""
+        if strict:
+            raise LLMUnavailable(what)
+        return fallback
+
+    async def run_concurrently(self, calls: Dict[str, Awaitable], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Awaits independent LLM calls in parallel and returns their results by key.
+        Each call gets its own deadline (OPENAI_CALL_TIMEOUT unless given; 0 for none, for calls that may
+        queue for an OpenAI slot and rely on the per-request deadline applied once they hold one); a call
+        that times out or fails yields None instead of failing the batch.
+        """
+        timeout = settings.OPENAI_CALL_TIMEOUT if timeout is None else timeout
+
+        async def guarded(key: str, call: Awaitable) -> Any:
+            try:
+                return await asyncio.wait_for(call, timeout or None)
+            except asyncio.TimeoutError:
+                logger.warning(f"LLM call '{key}' timed out after {timeout}s")
+            except Exception as e:
+                logger.error(f"LLM call '{key}' failed: {str(e)}")
+            return None
+
+        results = await asyncio.gather(*(guarded(key, call) for key, call in calls.items()))
+        return dict(zip(calls.keys(), results))
+
+    async def _complete(self, messages: List[Dict[str, str]], cache_ttl: Optional[float] = None, **options) -> str:
+        """Runs a chat completion, serving identical (model, prompt version, prompt) calls from the cache."""
+        key = cache_key(self.model, messages, options)
+        cached = await llm_cache.get(key)
+        # Token counting is deferred to the log writer, and skipped for records that are sampled out
+        logger.info("LLM call - Cached: %s", cached is not None, extra={"prompt_tokens": lambda: prompt_tokens(messages, self.model)})
+        if cached is not None:
+            record_llm_call(cached=True)
+            return cached
+
+        try:
+            async with self._slots:
+                # The resilient client's deadline starts here, so time spent queued for a slot does not count
+                with span("llm_call"):
+                    response = await self.resilience.complete(self.client, model=self.model, messages=messages, **options)
+        except Exception as e:
+            # An expired answer for the same prompt beats an error while the upstream is failing
+            stale = await llm_cache.get_stale(key)
+            if stale is None:
+                raise
+            logger.warning(f"LLM call failed ({type(e).__name__}); serving an expired cached response")
+            return stale
+        record_llm_call(cached=False, usage=getattr(response, "usage", None))
+        content = response.choices[0].message.content
+        await llm_cache.set(key, content, cache_ttl)
+        return content
 
-    async def _generate_json(self, prompt: str) -> Any:
+    async def _generate_json(self, prompt: str, cache_ttl: Optional[float] = None) -> Any:
         if not self.client:
             logger.warning("OpenAI client not configured.")
             return None
         
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
+            content = await self._complete(
+                [
                     {"role": "system", "content": "Eres un analista de datos experto. Responde ÚNICAMENTE en formato JSON válido."},
                     {"role": "user", "content": prompt}
                 ],
+                cache_ttl=cache_ttl,
                 response_format={"type": "json_object"}
             )
-            return json.loads(response.choices[0].message.content)
+            return json.loads(content)
         except Exception as e:
             logger.error(f"Error generating JSON from OpenAI: {str(e)}")
             return None
 
-    async def get_executive_summary(self, metrics: Dict, comments: List[str]) -> str:
-        if not self.client: return "IA no configurada (falta OPENAI_API_KEY)."
+    def _comments(self, feedbacks: List[Any], band: str = "NPS") -> str:
+        """Token-budgeted, deduplicated and stratified comment sample rendered for a prompt."""
+        return render_comments(select_comments(feedbacks, SCORE_BANDS[band], model=self.model))
+
+    @traced("ai.executive_summary")
+    async def get_executive_summary(self, metrics: Dict, feedbacks: List[Any], strict: bool = False) -> str:
+        if not self.client: return self._unavailable(strict, "IA no configurada (falta OPENAI_API_KEY).", "summary")
         
         # Prepare a clear summary of metrics for the LLM
         context = f"""
@@ -44,19 +124,17 @@ class AIService:
         - CES promedio: {metrics['ces']['score']} / 5 (donde 1 es fácil y 5 es muy difícil)
         """
         
-        prompt = f"{context}\nBasado en estos datos y los siguientes comentarios: {comments[:15]}, genera un resumen ejecutivo profesional y crítico de la situación actual. Debe ser un único párrafo corto (máximo 3 oraciones), directo y con enfoque de negocio."
+        prompt = f"{context}\nBasado en estos datos y los siguientes comentarios: {self._comments(feedbacks)}, genera un resumen ejecutivo profesional y crítico de la situación actual. Debe ser un único párrafo corto (máximo 3 oraciones), directo y con enfoque de negocio."
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            return response.choices[0].message.content.strip()
+            content = await self._complete([{"role": "user", "content": prompt}])
+            return content.strip()
         except Exception as e:
             logger.error(f"Error generating summary: {str(e)}")
-            return "Error al generar resumen ejecutivo."
+            return self._unavailable(strict, "Error al generar resumen ejecutivo.", "summary")
 
-    async def get_indicator_insight(self, name: str, data: Any, comments: List[str]) -> str:
-        if not self.client: return "IA no configurada."
+    @traced("ai.indicator_insight")
+    async def get_indicator_insight(self, name: str, data: Any, feedbacks: List[Any], strict: bool = False) -> str:
+        if not self.client: return self._unavailable(strict, "IA no configurada.", name)
         
         desc = ""
         if name == "NPS":
@@ -66,46 +144,164 @@ class AIService:
         elif name == "CES":
             desc = f"Esfuerzo promedio: {data['score']} / 5. (Bajo esfuerzo: {data['low_effort']}, Medio: {data['medium_effort']}, Alto: {data['high_effort']})"
 
-        prompt = f"Analiza este indicador de {name}: {desc}. Comentarios relacionados: {comments[:15]}. Genera un único insight estratégico muy conciso que explique la raíz del número."
+        prompt = f"Analiza este indicador de {name}: {desc}. Comentarios relacionados: {self._comments(feedbacks, name)}. Genera un único insight estratégico muy conciso que explique la raíz del número."
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            return response.choices[0].message.content.strip()
-        except: return "Error al generar insight."
+            content = await self._complete([{"role": "user", "content": prompt}])
+            return content.strip()
+        except Exception as e:
+            logger.error(f"Error generating {name} insight: {str(e)}")
+            return self._unavailable(strict, "Error al generar insight.", name)
 
-    async def get_drivers(self, comments: List[str]) -> Dict:
-        prompt = f"""Analiza estos comentarios: {comments[:30]}. 
+    @traced("ai.drivers")
+    async def get_drivers(self, feedbacks: List[Any], coverage: str = "sample", strict: bool = False) -> Dict:
+        if coverage == "full":
+            return await self._map_reduce_drivers(feedbacks, strict)
+        prompt = f"""Analiza estos comentarios: {self._comments(feedbacks)}. 
         Extrae el Top 3 de positive_drivers y el Top 3 de negative_drivers. 
         Formato JSON: {{"positive_drivers": [str], "negative_drivers": [str]}}"""
         result = await self._generate_json(prompt)
-        return result or {"positive_drivers": [], "negative_drivers": []}
+        return result or self._unavailable(strict, {"positive_drivers": [], "negative_drivers": []}, "drivers")
 
-    async def get_topics(self, comments: List[str]) -> List[Dict]:
-        prompt = f"""Analiza los siguientes comentarios: {comments[:40]}. 
+    @traced("ai.topics")
+    async def get_topics(self, feedbacks: List[Any], coverage: str = "sample", strict: bool = False) -> List[Dict]:
+        if coverage == "full":
+            return await self._map_reduce_topics(feedbacks, strict)
+        prompt = f"""Analiza los siguientes comentarios: {self._comments(feedbacks)}. 
         Identifica temas recurrentes y cuenta menciones aproximadas. 
         Formato JSON: {{"topics": [{{"topic": str, "mentions": int}}]}}"""
         result = await self._generate_json(prompt)
-        return result.get("topics", []) if result else []
+        return result.get("topics", []) if result else self._unavailable(strict, [], "topics")
+
+    @traced("ai.topic_labels")
+    async def get_topic_labels(self, clusters: List[Dict]) -> List[str]:
+        """Short names for the clusters of a topic model. Falls back to each cluster's top terms without the LLM."""
+        fallback = [", ".join(cluster["terms"][:3]) or f"Tema {index + 1}" for index, cluster in enumerate(clusters)]
+        described = [
+            {"id": index, "terms": cluster["terms"], "examples": cluster["examples"]}
+            for index, cluster in enumerate(clusters) if cluster["size"]
+        ]
+        prompt = f"""Estos son grupos de comentarios de clientes, con sus términos más distintivos y ejemplos: {json.dumps(described, ensure_ascii=False)}. 
+        Asigna a cada grupo un nombre de tema corto (2 a 4 palabras) en español. 
+        Formato JSON: {{"labels": [{{"id": int, "label": str}}]}}"""
+        # The prompt only depends on the model, so the labels stay in the LLM cache until the next rebuild
+        result = await self._generate_json(prompt, settings.MAPREDUCE_CACHE_TTL_SECONDS) if described else None
+        labels = list(fallback)
+        for entry in (result or {}).get("labels", []):
+            if isinstance(entry, dict) and isinstance(entry.get("id"), int) and 0 <= entry["id"] < len(labels) and entry.get("label"):
+                labels[entry["id"]] = str(entry["label"])
+        return labels
+
+    # Map-reduce mode: every comment of the window is read. Each chunk is analyzed by its own (cached)
+    # LLM call, then labels from all chunks are merged by the LLM while mention counts are summed here.
+    # Counts from a subset of the chunks would look complete, so a failed chunk fails the whole analysis;
+    # the chunks that succeeded stay cached, which makes a retry cheap.
+    async def _map_chunks(self, feedbacks: List[Any], template: str, what: str, strict: bool) -> List[Any]:
+        if not self.client:
+            logger.warning("OpenAI client not configured.")
+            return self._unavailable(strict, [], what)
+        chunks = chunk_comments(feedbacks, settings.MAPREDUCE_CHUNK_TOKENS, self.model)
+        calls = {
+            f"chunk-{index}": self._generate_json(template.format(comments=render_comments(chunk)), settings.MAPREDUCE_CACHE_TTL_SECONDS)
+            for index, chunk in enumerate(chunks)
+        }
+        # More chunks than OpenAI slots queue up, so only the calls themselves have a deadline
+        results = await self.run_concurrently(calls, timeout=0)
+        missing = sum(1 for result in results.values() if result is None)
+        if missing:
+            logger.warning(f"Map-reduce: {missing}/{len(chunks)} chunks failed")
+            raise IncompleteCoverage(missing, len(chunks))
+        return [result for result in results.values() if result]
+
+    async def _reduce_labels(self, counts: Dict[str, int]) -> Dict[str, int]:
+        """Merges labels that name the same theme, summing their mention counts. Large label sets are reduced in groups, level by level."""
+        if len(counts) <= 1:
+            return counts
+        names = sorted(counts, key=counts.get, reverse=True)
+        groups = [names[i:i + settings.MAPREDUCE_REDUCE_GROUP] for i in range(0, len(names), settings.MAPREDUCE_REDUCE_GROUP)]
+        prompts = {
+            f"reduce-{index}": self._generate_json(f"""Estos son temas extraídos de distintos lotes de comentarios: {render_comments(group)}. 
+        Agrupa los que se refieren al mismo tema bajo un nombre canónico corto. Cada tema debe aparecer en exactamente un grupo. 
+        Formato JSON: {{"groups": [{{"name": str, "members": [str]}}]}}""", settings.MAPREDUCE_CACHE_TTL_SECONDS)
+            for index, group in enumerate(groups)
+        }
+        # A failed group only stays unmerged, its counts are kept
+        results = await self.run_concurrently(prompts, timeout=0)
+
+        merged: Dict[str, int] = {}
+        for group, result in zip(groups, results.values()):
+            assigned = set()
+            for entry in (result or {}).get("groups", []):
+                members = [member for member in entry.get("members", []) if member in counts and member not in assigned]
+                if members and entry.get("name"):
+                    assigned.update(members)
+                    merged[entry["name"]] = merged.get(entry["name"], 0) + sum(counts[member] for member in members)
+            # Labels the model dropped keep their own count
+            for name in group:
+                if name not in assigned:
+                    merged[name] = merged.get(name, 0) + counts[name]
 
-    async def get_action_plans(self, metrics: Dict, comments: List[str]) -> List[Dict]:
-        prompt = f"""Basado en estas métricas ({metrics}) y estos comentarios ({comments[:20]}), 
+        if len(groups) > 1 and len(merged) < len(counts):
+            return await self._reduce_labels(merged)
+        return merged
+
+    @staticmethod
+    def _sum_mentions(entries: List[Dict], label: str) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for entry in entries:
+            # A bare label (the model ignored the requested shape) counts as one mention
+            entry = entry if isinstance(entry, dict) else {label: entry, "mentions": 1}
+            name = str(entry.get(label, "")).strip()
+            if name:
+                counts[name] = counts.get(name, 0) + int(entry.get("mentions", 0) or 0)
+        return counts
+
+    async def _map_reduce_topics(self, feedbacks: List[Any], strict: bool = False) -> List[Dict]:
+        partials = await self._map_chunks(feedbacks, """Analiza estos comentarios: {comments}. 
+        Identifica los temas recurrentes y cuenta en cuántos de estos comentarios aparece cada tema. 
+        Formato JSON: {{"topics": [{{"topic": str, "mentions": int}}]}}""", "topics", strict)
+        counts = self._sum_mentions([topic for partial in partials for topic in partial.get("topics", [])], "topic")
+        merged = await self._reduce_labels(counts)
+        return [{"topic": name, "mentions": mentions} for name, mentions in sorted(merged.items(), key=lambda item: item[1], reverse=True)]
+
+    async def _map_reduce_drivers(self, feedbacks: List[Any], strict: bool = False) -> Dict:
+        partials = await self._map_chunks(feedbacks, """Analiza estos comentarios: {comments}. 
+        Extrae los drivers positivos y negativos y cuenta en cuántos de estos comentarios aparece cada uno. 
+        Formato JSON: {{"positive_drivers": [{{"driver": str, "mentions": int}}], "negative_drivers": [{{"driver": str, "mentions": int}}]}}""", "drivers", strict)
+        drivers = {}
+        for polarity in ("positive_drivers", "negative_drivers"):
+            counts = self._sum_mentions([driver for partial in partials for driver in partial.get(polarity, [])], "driver")
+            merged = await self._reduce_labels(counts)
+            drivers[polarity] = sorted(merged, key=merged.get, reverse=True)[:3]
+        return drivers
+
+    @traced("ai.action_plans")
+    async def get_action_plans(self, metrics: Dict, feedbacks: List[Any], strict: bool = False) -> List[Dict]:
+        prompt = f"""Basado en estas métricas ({metrics}) y estos comentarios ({self._comments(feedbacks)}), 
         propón planes de acción priorizados. 
         Formato JSON: {{"action_plans": [{{"priority": "Alta/Media/Baja", "issue": "descripción", "recommendation": "descripción", "expected_impact": "descripción"}}]}}"""
         result = await self._generate_json(prompt)
-        return result.get("action_plans", []) if result else []
+        return result.get("action_plans", []) if result else self._unavailable(strict, [], "action plans")
 
-    async def get_segment_descriptions(self, segments: Dict) -> List[Dict]:
-        segments_list = []
+    @traced("ai.segment_descriptions")
+    async def get_segment_descriptions(self, segments: Dict, strict: bool = False) -> List[Dict]:
+        """One description per segment; with `strict`, segments whose call failed get None instead of a placeholder."""
+        prompts = {}
         for key, data in segments.items():
             name = key.replace("_", " ").title()
-            prompt = f"""Describe el perfil de cliente del segmento '{name}' basados en este contexto de feedback: {data['comments']}. Retorna un JSON con {{"description": "texto"}}"""
-            desc_json = await self._generate_json(prompt)
-            desc = desc_json.get("description", "Sin descripción disponible.") if desc_json else "Error al generar descripción."
+            prompts[key] = f"""Describe el perfil de cliente del segmento '{name}' basados en este contexto de feedback: {render_comments(data['comments'])}. Retorna un JSON con {{"description": "texto"}}"""
+
+        # One LLM call per segment, all in flight at once
+        results = await self.run_concurrently({key: self._generate_json(prompt) for key, prompt in prompts.items()})
+
+        segments_list = []
+        for key, desc_json in results.items():
+            if desc_json and desc_json.get("description"):
+                desc = desc_json["description"]
+            else:
+                desc = None if strict else "Sin descripción disponible." if desc_json else "Error al generar descripción."
             segments_list.append({
                 "key": key, # Mantenemos la llave original para mapeo seguro
-                "segment": name,
+                "segment": key.replace("_", " ").title(),
                 "description": desc
             })
         return segments_list
@@ -0,0 +1,153 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.core.logging import logger
+
+# Bump whenever a prompt template in AIService changes, so stale answers are never served for a new prompt
+PROMPT_VERSION = "2"
+
+# Per-request cache policy: "use" reads and writes the cache, "refresh" skips the read and overwrites the entry
+cache_policy: contextvars.ContextVar[str] = contextvars.ContextVar("llm_cache_policy", default="use")
+
+def cache_key(model: str, messages: List[Dict[str, str]], options: Dict[str, Any]) -> str:
+    """Content address of an LLM call: hash of (model, prompt template version, rendered prompt, options)."""
+    payload = json.dumps([model, PROMPT_VERSION, messages, options], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class SQLiteStore:
+    """Persistent cache tier backed by a local SQLite file, bounded to `max_entries` rows."""
+
+    def __init__(self, path: str, max_entries: int):
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_expires ON llm_cache (expires_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        return row
+
+    def set(self, key: str, value: str, expires_at: float):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?)", (key, value, expires_at))
+            # Drop expired rows, then the entries closest to expiry beyond the size bound
+            self._conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self._max_entries,),
+            )
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+class LLMCache:
+    """
+    Two-tier cache of LLM responses: an in-process LRU in front of an optional persistent store.
+    Entries expire after `ttl` seconds; the LRU holds at most `max_entries` responses.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, store: Optional[SQLiteStore] = None):
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._store = store
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _remember(self, key: str, value: str, expires_at: float):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, key: str) -> Optional[str]:
+        if cache_policy.get() == "refresh":
+            return None
+
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry and entry[1] > now:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        if self._store:
+            row = await asyncio.to_thread(self._store.get, key)
+            if row and row[1] > now:
+                self._remember(key, row[0], row[1])
+                self.hits += 1
+                return row[0]
+
+        self.misses += 1
+        return None
+
+    async def get_stale(self, key: str) -> Optional[str]:
+        """The stored response even if it has expired, as a fallback when the LLM is unavailable."""
+        entry = self._entries.get(key)
+        if entry:
+            return entry[0]
+        if self._store:
+            row = await asyncio.to_thread(self._store.get, key)
+            if row:
+                return row[0]
+        return None
+
+    async def set(self, key: str, value: str, ttl: Optional[float] = None):
+        expires_at = time.time() + (ttl or self._ttl)
+        self._remember(key, value, expires_at)
+        if self._store:
+            await asyncio.to_thread(self._store.set, key, value, expires_at)
+
+    async def invalidate(self, key: str):
+        self._entries.pop(key, None)
+        if self._store:
+            await asyncio.to_thread(self._store.delete, key)
+
+    async def clear(self):
+        self._entries.clear()
+        if self._store:
+            await asyncio.to_thread(self._store.clear)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "persistent": self._store is not None,
+        }
+
+def _create_cache() -> LLMCache:
+    store = None
+    if settings.LLM_CACHE_PATH:
+        try:
+            store = SQLiteStore(settings.LLM_CACHE_PATH, settings.LLM_CACHE_MAX_PERSISTENT_ENTRIES)
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache store unavailable, using memory only: {str(e)}")
+    return LLMCache(settings.LLM_CACHE_MAX_ENTRIES, settings.LLM_CACHE_TTL_SECONDS, store)
+
+llm_cache = _create_cache()
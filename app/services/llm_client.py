@@ -0,0 +1,224 @@
+import asyncio
+import random
+import re
+import time
+from collections import Counter
+from typing import Any, Dict, Mapping, Optional, Tuple
+import openai
+from app.core.config import settings
+from app.core.logging import logger
+
+class CircuitOpenError(Exception):
+    """Raised without calling OpenAI while the circuit breaker is open."""
+
+class DeadlineExceededError(Exception):
+    """Raised when a call (including its retries and rate-limit waits) runs past its deadline."""
+
+# Transient failures worth retrying; any other API error (bad request, auth...) is returned to the caller at once
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    asyncio.TimeoutError,
+)
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds in an OpenAI reset header such as '20ms', '1s' or '6m0s'."""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+class TokenBucket:
+    """
+    Request-rate limiter whose rate adapts to the upstream: halved on every 429 and raised by a fixed step
+    on success (AIMD), but never above what the `x-ratelimit-*` headers say the quota allows right now.
+    """
+
+    def __init__(self, max_rate: float, burst: float, min_rate: float = 0.2):
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.rate = max_rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, deadline: float):
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                wait = (1 - self._tokens) / self.rate
+                if time.monotonic() + wait > deadline:
+                    raise DeadlineExceededError("Rate limit wait exceeds the call deadline")
+                await asyncio.sleep(wait)
+                self._refill()
+            self._tokens -= 1
+
+    def on_success(self, headers: Optional[Mapping[str, str]] = None):
+        self.rate = min(self.max_rate, self.rate + self.max_rate * 0.1)
+        if headers:
+            remaining = headers.get("x-ratelimit-remaining-requests")
+            reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+            if remaining is not None and reset:
+                # Spread what is left of the window over the time until it resets
+                self.rate = max(self.min_rate, min(self.rate, float(remaining) / reset))
+
+    def on_throttled(self):
+        self.rate = max(self.min_rate, self.rate / 2)
+        self._tokens = min(self._tokens, 0)
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for `reset_timeout` seconds;
+    then lets one probe through per `reset_timeout` (half-open) and closes again when a call succeeds.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_started: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        now = time.monotonic()
+        # A probe that never reported back (e.g. cancelled by its caller) stops blocking the next one
+        if state == "half_open" and (self._probe_started is None or now - self._probe_started >= self.reset_timeout):
+            self._probe_started = now
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probe_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_started = None
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"OpenAI circuit opened after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+
+class ResilientClient:
+    """
+    Chat completions with a per-call deadline, jittered exponential backoff on transient errors,
+    adaptive rate limiting and a circuit breaker. Every outcome is counted for `stats()`.
+    """
+
+    def __init__(
+        self,
+        deadline: float,
+        max_retries: int,
+        max_rate: float,
+        breaker_failures: int,
+        breaker_reset: float,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 8.0,
+    ):
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.limiter = TokenBucket(max_rate, burst=max(1.0, max_rate))
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset)
+        self.outcomes: Counter = Counter()
+
+    async def _create(self, client: Any, timeout: float, **kwargs) -> Tuple[Any, Optional[Mapping[str, str]]]:
+        completions = client.chat.completions
+        raw_api = getattr(completions, "with_raw_response", None)
+        if raw_api is None:
+            return await asyncio.wait_for(completions.create(**kwargs), timeout), None
+        raw = await asyncio.wait_for(raw_api.create(**kwargs), timeout)
+        return raw.parse(), raw.headers
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        response = getattr(error, "response", None)
+        retry_after = parse_duration(response.headers.get("retry-after")) if response is not None else None
+        if retry_after is not None:
+            return retry_after
+        # Full jitter keeps retries from many requests from arriving in lockstep
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    async def complete(self, client: Any, **kwargs) -> Any:
+        if not self.breaker.allow():
+            self.outcomes["circuit_open"] += 1
+            raise CircuitOpenError("OpenAI circuit breaker is open")
+
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            try:
+                await self.limiter.acquire(deadline)
+                response, headers = await self._create(client, deadline - time.monotonic(), **kwargs)
+            except DeadlineExceededError:
+                # Only our own limiter made the call late; upstream health is unknown
+                self.outcomes["deadline_exceeded"] += 1
+                raise
+            except RETRYABLE_ERRORS as e:
+                kind = "rate_limited" if isinstance(e, openai.RateLimitError) else "timeout" if isinstance(e, (asyncio.TimeoutError, openai.APITimeoutError)) else "transient_error"
+                self.outcomes[kind] += 1
+                if isinstance(e, openai.RateLimitError):
+                    self.limiter.on_throttled()
+                delay = self._backoff(attempt, e)
+                if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                    self.outcomes["failed"] += 1
+                    self.breaker.record_failure()
+                    raise
+                attempt += 1
+                self.outcomes["retried"] += 1
+                logger.warning(f"OpenAI {kind} ({type(e).__name__}); retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            except openai.APIStatusError:
+                # Request errors (4xx other than 429) mean the upstream is reachable and answering
+                self.outcomes["rejected"] += 1
+                self.breaker.record_success()
+                raise
+
+            self.outcomes["success"] += 1
+            self.breaker.record_success()
+            self.limiter.on_success(headers)
+            return response
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "rate_limit_per_second": round(self.limiter.rate, 3),
+            "outcomes": dict(self.outcomes),
+        }
+
+def create_resilient_client() -> ResilientClient:
+    return ResilientClient(
+        deadline=settings.OPENAI_DEADLINE_SECONDS,
+        max_retries=settings.OPENAI_MAX_RETRIES,
+        max_rate=settings.OPENAI_MAX_REQUESTS_PER_SECOND,
+        breaker_failures=settings.OPENAI_BREAKER_FAILURES,
+        breaker_reset=settings.OPENAI_BREAKER_RESET_SECONDS,
+    )
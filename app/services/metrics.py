@@ -1,16 +1,68 @@
-from typing import List, Dict
+import numpy as np
+from typing import List, Dict, Optional, Sequence
+from app.core.telemetry import traced
 from app.models.feedback import Feedback
 
+# Value ranges of each score; histograms are indexed by the score itself
+NPS_BINS = 11  # 0..10
+CSAT_BINS = 6  # 1..5 (index 0 unused)
+CES_BINS = 6  # 1..5 (index 0 unused)
+
+class FeedbackColumns:
+    """Struct-of-arrays view of a feedback list: scores are loaded once into compact int8 arrays."""
+    __slots__ = ("nps", "csat", "ces", "comments")
+
+    def __init__(self, nps: np.ndarray, csat: np.ndarray, ces: np.ndarray, comments: Sequence[Optional[str]]):
+        self.nps = nps
+        self.csat = csat
+        self.ces = ces
+        self.comments = comments
+
+    @classmethod
+    def from_feedbacks(cls, feedbacks: List[Feedback]) -> "FeedbackColumns":
+        count = len(feedbacks)
+        return cls(
+            nps=np.fromiter((f.nps for f in feedbacks), dtype=np.int8, count=count),
+            csat=np.fromiter((f.csat for f in feedbacks), dtype=np.int8, count=count),
+            ces=np.fromiter((f.ces for f in feedbacks), dtype=np.int8, count=count),
+            comments=[f.comment for f in feedbacks],
+        )
+
+    def __len__(self) -> int:
+        return len(self.nps)
+
+    def histogram(self) -> np.ndarray:
+        """
+        Joint nps x ces x csat histogram computed with a single bincount.
+        Every distribution, average and segment count is derived from it without touching the rows again.
+        """
+        codes = (self.nps.astype(np.intp) * CES_BINS + self.ces) * CSAT_BINS + self.csat
+        return np.bincount(codes, minlength=NPS_BINS * CES_BINS * CSAT_BINS).reshape(NPS_BINS, CES_BINS, CSAT_BINS)
+
+    def first_comments(self, mask: np.ndarray, limit: int) -> List[str]:
+        """Returns up to `limit` non-empty comments of the rows selected by `mask`, in row order."""
+        comments = []
+        for index in np.flatnonzero(mask):
+            comment = self.comments[index]
+            if comment:
+                comments.append(comment)
+                if len(comments) == limit:
+                    break
+        return comments
+
+def _weighted_average(histogram: np.ndarray, total: int) -> float:
+    return int(np.dot(histogram, np.arange(len(histogram)))) / total
+
 class MetricsService:
     @staticmethod
-    def calculate_nps(feedbacks: List[Feedback]) -> Dict:
-        if not feedbacks:
+    def nps_from_histogram(histogram: np.ndarray) -> Dict:
+        total = int(histogram.sum())
+        if not total:
             return {"score": 0, "promoters": 0, "neutrals": 0, "detractors": 0, "total": 0}
         
-        total = len(feedbacks)
-        promoters = len([f for f in feedbacks if f.nps >= 9])
-        neutral = len([f for f in feedbacks if 7 <= f.nps <= 8])
-        detractors = len([f for f in feedbacks if f.nps <= 6])
+        promoters = int(histogram[9:].sum())
+        neutral = int(histogram[7:9].sum())
+        detractors = int(histogram[:7].sum())
         
         # NPS Formula: % Promoters - % Detractors (Typically returned as an integer)
         score = int(((promoters - detractors) / total) * 100)
@@ -23,17 +75,17 @@ class MetricsService:
         }
 
     @staticmethod
-    def calculate_csat(feedbacks: List[Feedback]) -> Dict:
-        if not feedbacks:
+    def csat_from_histogram(histogram: np.ndarray) -> Dict:
+        total = int(histogram.sum())
+        if not total:
             return {"score": 0, "satisfied": 0, "neutral": 0, "unsatisfied": 0, "total": 0}
         
-        total = len(feedbacks)
-        satisfied = len([f for f in feedbacks if f.csat >= 4])
-        neutral = len([f for f in feedbacks if f.csat == 3])
-        unsatisfied = len([f for f in feedbacks if f.csat <= 2])
+        satisfied = int(histogram[4:].sum())
+        neutral = int(histogram[3])
+        unsatisfied = int(histogram[:3].sum())
         
         # CSAT score as average (as seen in some requirements)
-        avg_score = sum([f.csat for f in feedbacks]) / total
+        avg_score = _weighted_average(histogram, total)
         # CSAT % as defined in image formula
         csat_pct = (satisfied / total) * 100
         
@@ -47,16 +99,16 @@ class MetricsService:
         }
 
     @staticmethod
-    def calculate_ces(feedbacks: List[Feedback]) -> Dict:
-        if not feedbacks:
+    def ces_from_histogram(histogram: np.ndarray) -> Dict:
+        total = int(histogram.sum())
+        if not total:
             return {"score": 0, "low": 0, "medium": 0, "high": 0, "total": 0}
         
-        total = len(feedbacks)
-        low = len([f for f in feedbacks if f.ces <= 2])
-        medium = len([f for f in feedbacks if f.ces == 3])
-        high = len([f for f in feedbacks if f.ces >= 4])
+        low = int(histogram[:3].sum())
+        medium = int(histogram[3])
+        high = int(histogram[4:].sum())
         
-        avg_score = sum([f.ces for f in feedbacks]) / total
+        avg_score = _weighted_average(histogram, total)
         
         return {
             "score": round(avg_score, 2),
@@ -67,33 +119,75 @@ class MetricsService:
         }
 
     @staticmethod
-    def get_critical_segments(feedbacks: List[Feedback]) -> Dict:
+    def segment_counts(histogram: np.ndarray) -> Dict[str, int]:
+        """Critical segment sizes from the joint nps x ces x csat histogram."""
+        return {
+            # Detractores con alto esfuerzo (CES >= 4 and NPS <= 6)
+            "high_effort_detractors": int(histogram[:7, 4:].sum()),
+            # Promotores con bajo esfuerzo (CES <= 2 and NPS >= 9)
+            "low_effort_promoters": int(histogram[9:, :3].sum()),
+        }
+
+    @staticmethod
+    def calculate_nps(feedbacks: List[Feedback]) -> Dict:
+        nps = np.fromiter((f.nps for f in feedbacks), dtype=np.int8, count=len(feedbacks))
+        return MetricsService.nps_from_histogram(np.bincount(nps, minlength=NPS_BINS))
+
+    @staticmethod
+    def calculate_csat(feedbacks: List[Feedback]) -> Dict:
+        csat = np.fromiter((f.csat for f in feedbacks), dtype=np.int8, count=len(feedbacks))
+        return MetricsService.csat_from_histogram(np.bincount(csat, minlength=CSAT_BINS))
+
+    @staticmethod
+    def calculate_ces(feedbacks: List[Feedback]) -> Dict:
+        ces = np.fromiter((f.ces for f in feedbacks), dtype=np.int8, count=len(feedbacks))
+        return MetricsService.ces_from_histogram(np.bincount(ces, minlength=CES_BINS))
+
+    @classmethod
+    def get_critical_segments(cls, feedbacks: List[Feedback]) -> Dict:
         if not feedbacks: return {}
-        
-        # Segment 1: Detractores con alto esfuerzo (CES >= 4 and NPS <= 6)
-        high_effort_detractors = [f for f in feedbacks if f.ces >= 4 and f.nps <= 6]
-        
-        # Segment 2: Promotores con bajo esfuerzo (CES <= 2 and NPS >= 9)
-        low_effort_promoters = [f for f in feedbacks if f.ces <= 2 and f.nps >= 9]
-        
+        columns = FeedbackColumns.from_feedbacks(feedbacks)
+        return cls._segments(columns, cls.segment_counts(columns.histogram()))
+
+    @staticmethod
+    def _segments(columns: Optional[FeedbackColumns], counts: Dict[str, int]) -> Dict:
         return {
             "high_effort_detractors": {
-                "count": len(high_effort_detractors),
+                "count": counts["high_effort_detractors"],
                 "label": "Detractores con alto esfuerzo",
-                "comments": [f.comment for f in high_effort_detractors if f.comment][:5]
+                "comments": columns.first_comments((columns.ces >= 4) & (columns.nps <= 6), 5) if columns else []
             },
             "low_effort_promoters": {
-                "count": len(low_effort_promoters),
+                "count": counts["low_effort_promoters"],
                 "label": "Promotores con bajo esfuerzo",
-                "comments": [f.comment for f in low_effort_promoters if f.comment][:5]
+                "comments": columns.first_comments((columns.ces <= 2) & (columns.nps >= 9), 5) if columns else []
             }
         }
 
     @classmethod
+    @traced("metrics")
     def get_all_metrics(cls, feedbacks: List[Feedback]) -> Dict:
+        # Columnar sources (e.g. snapshot windows) hand over their score arrays instead of per-row records
+        to_columns = getattr(feedbacks, "to_columns", None)
+        columns = to_columns() if to_columns is not None else FeedbackColumns.from_feedbacks(feedbacks)
+        return cls.metrics_from_columns(columns)
+
+    @classmethod
+    def metrics_from_columns(cls, columns: FeedbackColumns) -> Dict:
+        histogram = columns.histogram()
+        return {
+            "nps": cls.nps_from_histogram(histogram.sum(axis=(1, 2))),
+            "csat": cls.csat_from_histogram(histogram.sum(axis=(0, 1))),
+            "ces": cls.ces_from_histogram(histogram.sum(axis=(0, 2))),
+            "segments": cls._segments(columns, cls.segment_counts(histogram)) if len(columns) else {}
+        }
+
+    @classmethod
+    def metrics_from_histograms(cls, nps: np.ndarray, csat: np.ndarray, ces: np.ndarray, segment_counts: Dict[str, int]) -> Dict:
+        """Metrics of pre-aggregated histograms (e.g. merged daily rollups). Segments carry no comments."""
         return {
-            "nps": cls.calculate_nps(feedbacks),
-            "csat": cls.calculate_csat(feedbacks),
-            "ces": cls.calculate_ces(feedbacks),
-            "segments": cls.get_critical_segments(feedbacks)
+            "nps": cls.nps_from_histogram(nps),
+            "csat": cls.csat_from_histogram(csat),
+            "ces": cls.ces_from_histogram(ces),
+            "segments": cls._segments(None, segment_counts) if nps.sum() else {}
         }
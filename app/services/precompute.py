@@ -0,0 +1,212 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+from app.core.logging import logger
+
+def window_range(name: str, today: date) -> Tuple[date, date]:
+    """Inclusive dates of a named window: last_<N> (N days up to today), month_to_date or previous_month."""
+    if name == "month_to_date":
+        return today.replace(day=1), today
+    if name == "previous_month":
+        end = today.replace(day=1) - timedelta(days=1)
+        return end.replace(day=1), end
+    if name.startswith("last_") and name[5:].isdigit() and int(name[5:]) > 0:
+        return today - timedelta(days=int(name[5:]) - 1), today
+    raise ValueError(f"Unknown precompute window: '{name}'")
+
+@dataclass
+class PrecomputeJob:
+    key: Hashable
+    # Returns None when there is nothing to precompute (e.g. a window without feedback)
+    compute: Callable[[], Awaitable[Optional[Any]]]
+    # Jobs that may call OpenAI count against the hourly budget
+    uses_llm: bool
+
+class PrecomputeScheduler:
+    """
+    Keeps the responses of popular insight windows computed ahead of requests.
+
+    A cycle runs at start, every `interval` seconds, and once writes pause for `debounce` seconds (at most
+    `max_debounce` after the first write of a burst). It recomputes each job whose result is missing, was
+    computed before a write, or is older than `interval`, at most `concurrency` at a time and in the order
+    given, so the first windows and sections get the budget when it is short. Jobs that use the LLM stop
+    once `llm_budget` of them ran in the last hour. Results are served until the data changes, and for up to
+    `max_age` seconds.
+    """
+
+    def __init__(
+        self,
+        jobs: Callable[[date], List[PrecomputeJob]],
+        version: Callable[[], Any],
+        interval: float,
+        debounce: float,
+        max_debounce: float,
+        concurrency: int,
+        llm_budget: int,
+        max_age: float,
+    ):
+        self._jobs = jobs
+        self._version = version
+        self.interval = interval
+        self.debounce = debounce
+        self.max_debounce = max_debounce
+        self.concurrency = max(1, concurrency)
+        self.llm_budget = llm_budget
+        self.max_age = max_age
+        # key -> (value, data version it was computed from, monotonic time)
+        self._results: Dict[Hashable, Tuple[Any, Any, float]] = {}
+        self._llm_runs: Deque[float] = deque()
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._dirty_since: Optional[float] = None
+        self.cycles = 0
+        self.computed = 0
+        self.empty = 0
+        self.failed = 0
+        self.over_budget = 0
+        self.served = 0
+
+    def start(self):
+        """Starts the background loop on the running event loop."""
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self):
+        """Called after every feedback write; the debounce timer restarts on each call."""
+        if self._task is None:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self._dirty_since is None:
+            self._dirty_since = now
+        if self._timer is not None:
+            self._timer.cancel()
+        # A steady stream of writes must not postpone the refresh forever
+        delay = max(0.0, min(self.debounce, self._dirty_since + self.max_debounce - now))
+        self._timer = loop.call_later(delay, self._wake.set)
+
+    def lookup(self, key: Hashable) -> Optional[Any]:
+        """The precomputed result of `key`, or None when there is none recent enough or it predates a write."""
+        entry = self._results.get(key)
+        # A result from older data falls through to the caller's version-aware path, even when the
+        # job that would replace it is skipped (over budget, failed)
+        if entry is None or entry[1] != self._version() or time.monotonic() - entry[2] > self.max_age:
+            return None
+        self.served += 1
+        return entry[0]
+
+    def invalidate(self):
+        """Drops every result and schedules a cycle to rebuild them."""
+        self._results.clear()
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _loop(self):
+        while True:
+            self._wake.clear()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._dirty_since = None
+            try:
+                await self.run_cycle()
+            except Exception as e:
+                logger.error(f"Precompute cycle failed: {str(e)}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _due(self, key: Hashable, version: Any) -> bool:
+        entry = self._results.get(key)
+        return entry is None or entry[1] != version or time.monotonic() - entry[2] >= self.interval
+
+    def _budget_left(self) -> int:
+        now = time.monotonic()
+        while self._llm_runs and now - self._llm_runs[0] >= 3600:
+            self._llm_runs.popleft()
+        return max(0, self.llm_budget - len(self._llm_runs))
+
+    def _take_budget(self) -> bool:
+        if not self._budget_left():
+            return False
+        self._llm_runs.append(time.monotonic())
+        return True
+
+    async def run_cycle(self):
+        """Recomputes every due job once."""
+        started = time.perf_counter()
+        version = self._version()
+        jobs = self._jobs(date.today())
+        current = {job.key for job in jobs}
+        # Windows are relative to today, so yesterday's keys are never requested again
+        for key in [key for key in self._results if key not in current]:
+            del self._results[key]
+
+        due = [job for job in jobs if self._due(job.key, version)]
+        slots = asyncio.Semaphore(self.concurrency)
+        counts = {"computed": 0, "empty": 0, "failed": 0, "over_budget": 0}
+
+        async def run(job: PrecomputeJob):
+            async with slots:
+                if job.uses_llm and not self._take_budget():
+                    counts["over_budget"] += 1
+                    return
+                try:
+                    value = await job.compute()
+                except Exception as e:
+                    value = None
+                    counts["failed"] += 1
+                    logger.warning(f"Precompute of {job.key} failed: {str(e)}")
+                else:
+                    counts["computed" if value is not None else "empty"] += 1
+                if value is None:
+                    self._results.pop(job.key, None)
+                    # Nothing useful came out of it, so it does not count against the budget
+                    if job.uses_llm:
+                        self._llm_runs.pop()
+                    return
+                self._results[job.key] = (value, version, time.monotonic())
+
+        # Semaphore waiters are served in order, which is the priority order of the jobs
+        await asyncio.gather(*(run(job) for job in due))
+        self.cycles += 1
+        self.computed += counts["computed"]
+        self.empty += counts["empty"]
+        self.failed += counts["failed"]
+        self.over_budget += counts["over_budget"]
+        if due:
+            logger.info(
+                "Precompute cycle - Due: %d | Computed: %d | Empty: %d | Failed: %d | Over budget: %d | Duration: %.1fs",
+                len(due), counts["computed"], counts["empty"], counts["failed"], counts["over_budget"], time.perf_counter() - started
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "stored": len(self._results),
+            "cycles": self.cycles,
+            "computed": self.computed,
+            "empty": self.empty,
+            "failed": self.failed,
+            "over_budget": self.over_budget,
+            "served": self.served,
+            "llm_budget_left": self._budget_left(),
+        }
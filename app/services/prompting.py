@@ -0,0 +1,190 @@
+import hashlib
+import json
+import random
+import re
+import unicodedata
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from app.core.config import settings
+
+try:
+    import tiktoken
+except ImportError:  # Optional: token counts fall back to a character-based estimate
+    tiktoken = None
+
+# Score bands used to stratify comments, keyed by indicator
+SCORE_BANDS: Dict[str, Callable[[Any], int]] = {
+    "NPS": lambda f: 0 if f.nps <= 6 else 1 if f.nps <= 8 else 2,
+    "CSAT": lambda f: 0 if f.csat <= 2 else 1 if f.csat == 3 else 2,
+    "CES": lambda f: 0 if f.ces <= 2 else 1 if f.ces == 3 else 2,
+}
+
+# Consecutive comments that do not fit the remaining budget before the sample is considered full
+MAX_CONSECUTIVE_MISSES = 20
+
+MINHASH_PERMUTATIONS = 16
+MINHASH_BANDS = 8  # 2 rows per band: pairs above ~0.7 Jaccard almost always share a band
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1729)
+_MINHASH_PARAMS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(MINHASH_PERMUTATIONS)]
+
+@lru_cache(maxsize=8)
+def _encoding(model: Optional[str]):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model or "")
+    except Exception:
+        try:
+            return tiktoken.get_encoding("o200k_base")
+        except Exception:
+            return None
+
+def preload_tokenizer(model: Optional[str] = None) -> bool:
+    """
+    Loads the model's tokenizer ahead of the first prompt: tiktoken downloads its BPE file on first use
+    (cached under TIKTOKEN_CACHE_DIR). Returns False when counts use the character-based estimate.
+    """
+    return _encoding(model) is not None
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Tokens of `text` with the model's local tokenizer, or ~4 characters per token without tiktoken."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+def normalize(text: str) -> str:
+    """Case-, accent-, punctuation- and whitespace-insensitive form of a comment."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(re.findall(r"\w+", text))
+
+def _shingle_hashes(normalized: str) -> List[int]:
+    words = normalized.split()
+    shingles = [" ".join(words[i:i + 2]) for i in range(max(len(words) - 1, 1))]
+    return [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in shingles]
+
+def minhash(normalized: str) -> Tuple[int, ...]:
+    hashes = _shingle_hashes(normalized)
+    return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _MINHASH_PARAMS)
+
+def _similarity(left: Tuple[int, ...], right: Tuple[int, ...]) -> float:
+    return sum(1 for a, b in zip(left, right) if a == b) / MINHASH_PERMUTATIONS
+
+class DuplicateFilter:
+    """
+    Detects exact duplicates (after normalization) and near-duplicates: comments whose word-bigram
+    Jaccard similarity, estimated with MinHash and looked up through LSH bands, reaches `threshold`.
+    """
+
+    def __init__(self, threshold: float = 0.8):
+        self._threshold = threshold
+        self._exact = set()
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[Tuple[int, ...]]] = defaultdict(list)
+
+    def is_new(self, comment: str) -> bool:
+        """Registers the comment and returns False if it duplicates one seen before."""
+        normalized = normalize(comment)
+        if not normalized or normalized in self._exact:
+            return False
+        self._exact.add(normalized)
+
+        signature = minhash(normalized)
+        rows = MINHASH_PERMUTATIONS // MINHASH_BANDS
+        bands = [(band, signature[band * rows:(band + 1) * rows]) for band in range(MINHASH_BANDS)]
+        if any(_similarity(signature, other) >= self._threshold for key in bands for other in self._buckets.get(key, ())):
+            return False
+        for key in bands:
+            self._buckets[key].append(signature)
+        return True
+
+def stratified_sample(feedbacks: Sequence[Any], band: Callable[[Any], int], date_strata: int) -> List[Any]:
+    """
+    Orders feedback so that any prefix is spread across the window's dates and score bands:
+    rows are grouped by (date slice, score band) and taken round-robin, in a seeded random order per group.
+    """
+    if not feedbacks:
+        return []
+    ordinals = [f.date.toordinal() for f in feedbacks]
+    first, span = min(ordinals), max(ordinals) - min(ordinals) + 1
+
+    strata: Dict[Tuple[int, int], List[Any]] = defaultdict(list)
+    for feedback, ordinal in zip(feedbacks, ordinals):
+        strata[((ordinal - first) * date_strata // span, band(feedback))].append(feedback)
+
+    # A fixed seed keeps the sample (and therefore the prompt and its cache key) stable for the same data
+    rng = random.Random(len(feedbacks))
+    groups = [strata[key] for key in sorted(strata)]
+    for group in groups:
+        rng.shuffle(group)
+
+    ordered = []
+    for index in range(max(len(group) for group in groups)):
+        ordered.extend(group[index] for group in groups if index < len(group))
+    return ordered
+
+def select_comments(
+    feedbacks: Sequence[Any],
+    band: Callable[[Any], int] = SCORE_BANDS["NPS"],
+    budget: Optional[int] = None,
+    model: Optional[str] = None,
+) -> List[str]:
+    """
+    Picks the comments to show the LLM: a stratified sample across dates and score bands, without
+    near-duplicates, filling at most `budget` tokens. A comment that does not fit is skipped, so shorter
+    ones can still fill the rest; the sample ends after MAX_CONSECUTIVE_MISSES of them in a row.
+    """
+    budget = budget or settings.PROMPT_COMMENT_TOKEN_BUDGET
+    ordered = stratified_sample([f for f in feedbacks if f.comment], band, settings.PROMPT_DATE_STRATA)
+
+    # Comments are only hashed until the budget is full, so the cost does not grow with the window
+    duplicates = DuplicateFilter()
+    selected, used, misses = [], 2, 0  # the surrounding brackets
+    for feedback in ordered:
+        comment = feedback.comment[:settings.PROMPT_MAX_COMMENT_CHARS]
+        tokens = count_tokens(json.dumps(comment, ensure_ascii=False), model) + 1
+        if used + tokens > budget:
+            misses += 1
+            if misses >= MAX_CONSECUTIVE_MISSES:
+                break
+            continue
+        misses = 0
+        # Checked after the budget, so a skipped long comment does not hide a shorter near-duplicate that fits
+        if not duplicates.is_new(feedback.comment):
+            continue
+        selected.append(comment)
+        used += tokens
+    return selected
+
+def chunk_comments(feedbacks: Sequence[Any], chunk_tokens: int, model: Optional[str] = None) -> List[List[str]]:
+    """
+    Splits every comment of the window into chunks of at most `chunk_tokens` tokens.
+    Chunks never cross an ISO week and are filled in (date, text) order, so adding feedback to one week
+    leaves the chunks (and their cached map results) of every other week unchanged.
+    """
+    weeks: Dict[Tuple[int, int], List[Tuple[Any, str]]] = defaultdict(list)
+    for feedback in feedbacks:
+        if feedback.comment:
+            weeks[feedback.date.isocalendar()[:2]].append((feedback.date, feedback.comment[:settings.PROMPT_MAX_COMMENT_CHARS]))
+
+    chunks = []
+    for week in sorted(weeks):
+        chunk, used = [], 2
+        for _, comment in sorted(weeks[week]):
+            tokens = count_tokens(json.dumps(comment, ensure_ascii=False), model) + 1
+            if chunk and used + tokens > chunk_tokens:
+                chunks.append(chunk)
+                chunk, used = [], 2
+            chunk.append(comment)
+            used += tokens
+        chunks.append(chunk)
+    return chunks
+
+def render_comments(comments: List[str]) -> str:
+    """Comments as a JSON list, which the model parses more reliably than a Python list repr."""
+    return json.dumps(comments, ensure_ascii=False)
+
+def prompt_tokens(messages: List[Dict[str, str]], model: Optional[str] = None) -> int:
+    return sum(count_tokens(message["content"], model) for message in messages)
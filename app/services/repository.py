@@ -0,0 +1,188 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from functools import partial
+from operator import itemgetter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set
+from app.core import db
+from app.core import telemetry
+from app.core.config import settings
+from app.core.logging import logger
+from app.models.feedback import FeedbackBase, FeedbackRecord
+from app.services import rollups
+from app.services.search import search_index
+from app.services.topics import topic_engine
+
+def to_item(feedback_id: str, feedback: FeedbackBase) -> Dict[str, Any]:
+    """
+    DynamoDB item of a validated feedback, including its topic vector and (once a model exists) its topic.
+    `created_at` keys the ingest index, which the analytics snapshot reads to catch up on newer items.
+    """
+    created_at = datetime.now(timezone.utc).isoformat(timespec="microseconds")
+    return {
+        "id": feedback_id,
+        "date": feedback.date.isoformat(),
+        "date_bucket": db.date_bucket(feedback.date.isoformat()),
+        "created_at": created_at,
+        "ingest_day": db.ingest_day(created_at),
+        "nps": feedback.nps,
+        "csat": feedback.csat,
+        "ces": feedback.ces,
+        "comment": feedback.comment,
+        **topic_engine.annotate(feedback.comment)
+    }
+
+def to_records(items: List[Dict[str, Any]]) -> List[FeedbackRecord]:
+    """
+    Analytics records of stored items (projected to at least date, scores and comment), sorted by date.
+    ISO dates sort as strings, and each distinct day is parsed once instead of once per item.
+    """
+    days: Dict[str, date] = {}
+    records = []
+    for item in sorted(items, key=itemgetter("date")):
+        day = item["date"]
+        parsed = days.get(day)
+        if parsed is None:
+            parsed = days[day] = date.fromisoformat(day)
+        records.append(FeedbackRecord(
+            id=item.get("id", ""),
+            date=parsed,
+            nps=int(item["nps"]),
+            csat=int(item["csat"]),
+            ces=int(item["ces"]),
+            comment=item.get("comment"),
+            topic=item.get("topic"),
+        ))
+    return records
+
+def _backdated(items: List[Dict[str, Any]]) -> bool:
+    """Whether some item is dated inside the ranges the time series treat as closed (and cache)."""
+    closed = (date.today() - timedelta(days=settings.TIMESERIES_CLOSE_AFTER_DAYS)).isoformat()
+    return any(item["date"] < closed for item in items)
+
+def write_item(item: Dict[str, Any], updates: List[Dict[str, Any]]):
+    """Writes one feedback item with its rollup updates, then adds its comment to the search index."""
+    db.put_item(item, updates)
+    search_index.add([item])
+    if _backdated([item]):
+        db.rollups_changed.touch()
+
+def _batch_stored(items: List[Dict[str, Any]], replaced: Optional[Dict[str, Dict[str, Any]]] = None):
+    try:
+        rollups.apply_deltas(rollups.daily_deltas(items, replaced))
+    except Exception as e:
+        # The items are stored, so the write itself must not be reported as failed
+        logger.error(f"Rollup update of {len(items)} stored items failed, run `python -m app.maintenance rebuild-rollups`: {str(e)}")
+    search_index.add(items)
+
+def write_batch(items: List[Dict[str, Any]], may_exist: bool = False) -> int:
+    """
+    Writes a batch of feedback. Every stored chunk of 25 is added to the daily rollups (one UpdateItem
+    per day touched) and indexed right away, so a batch that fails partway leaves the rollups in step
+    with what reached the table. With `may_exist` (ids from an export, which a re-run writes again) the
+    stored versions are read first and their counters taken back, so an overwritten item is not counted
+    twice; concurrent writers of the same ids are not accounted for.
+    """
+    replaced: Dict[str, Dict[str, Any]] = {}
+    if may_exist:
+        ids = list(dict.fromkeys(item["id"] for item in items))
+        replaced = {item["id"]: item for item in db.batch_get([{"id": feedback_id} for feedback_id in ids], rollups.ROLLUP_FIELDS)}
+
+    def stored(chunk: List[Dict[str, Any]]):
+        _batch_stored(chunk, replaced)
+        # A later chunk with the same id replaces this version
+        replaced.update((item["id"], item) for item in chunk if may_exist)
+
+    try:
+        return db.batch_write(items, on_written=stored)
+    finally:
+        # Once per call rather than per chunk; a failed batch may still have stored some chunks
+        if _backdated(items + list(replaced.values())):
+            db.rollups_changed.touch()
+
+class FeedbackRepository:
+    """
+    Awaitable access to feedback storage.
+    boto3 is synchronous, so every call runs on a bounded thread pool instead of the event loop.
+    At most `max_pending` calls may be queued or running; further callers wait, which keeps a
+    burst of requests from piling unbounded work onto the pool.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots = asyncio.Semaphore(max_pending)
+        # Bumped on every write through this repository; derived results carry it to detect new data
+        self.version = 0
+        self._write_listeners: List[Callable[[], None]] = []
+
+    async def _run(self, func, *args, **kwargs) -> Any:
+        async with self._slots:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="feedback-io")
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def scan_range(self, start: Optional[date], end: Optional[date], fields: Sequence[str]) -> List[Dict[str, Any]]:
+        """Returns every item in the date window, projected to `fields`."""
+        items, stats = await self._run(
+            db.read_date_range,
+            fields,
+            start=start.isoformat() if start else None,
+            end=end.isoformat() if end else None,
+        )
+        telemetry.record_read("read", stats.items, stats.scanned, stats.consumed_capacity)
+        return items
+
+    async def ingested_since(self, since: str, fields: Sequence[str]) -> List[Dict[str, Any]]:
+        """Returns every item written at or after the ISO UTC timestamp `since`, projected to `fields`."""
+        items, stats = await self._run(db.query_ingested_since, fields, since)
+        telemetry.record_read("read", stats.items, stats.scanned, stats.consumed_capacity)
+        return items
+
+    async def rollup_range(self, start: Optional[date], end: Optional[date]) -> List[Dict[str, Any]]:
+        """Returns the daily metric rollups of the date window."""
+        return await self._run(
+            rollups.read_rollups,
+            start.isoformat() if start else None,
+            end.isoformat() if end else None,
+        )
+
+    async def rollups_complete(self) -> bool:
+        """Whether the daily rollups count every stored item (see db.rollups_backfilled)."""
+        return await self._run(db.rollups_backfilled.is_set)
+
+    async def rollups_changed_at(self) -> Optional[str]:
+        """When rollups of closed date ranges last changed in any process (see db.rollups_changed)."""
+        return await self._run(db.rollups_changed.current)
+
+    def add_write_listener(self, listener: Callable[[Set[str]], None]):
+        """Registers a callback run on the event loop after every write, with the ISO dates of the written feedback."""
+        self._write_listeners.append(listener)
+
+    def _written(self, items: List[Dict[str, Any]]):
+        self.version += 1
+        days = {item["date"] for item in items}
+        for listener in self._write_listeners:
+            listener(days)
+
+    async def put(self, item: Dict[str, Any]):
+        """Writes the item and increments its daily rollup in the same transaction."""
+        updates = [rollups.update_request(day, counters) for day, counters in rollups.daily_deltas([item]).items()]
+        await self._run(write_item, item, updates)
+        self._written([item])
+
+    async def batch_put(self, items: List[Dict[str, Any]]) -> int:
+        """Writes the items in chunks; raises db.BatchWriteError, with the items stored anyway, when one fails."""
+        try:
+            return await self._run(write_batch, items)
+        finally:
+            # A failed batch may still have stored some chunks
+            self._written(items)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+feedback_repository = FeedbackRepository(settings.DYNAMODB_IO_WORKERS, settings.DYNAMODB_MAX_PENDING)
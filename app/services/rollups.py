@@ -0,0 +1,160 @@
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from app.core import db
+from app.core.config import settings
+from app.core.logging import logger
+from app.services.metrics import MetricsService, NPS_BINS, CSAT_BINS, CES_BINS
+
+# Daily rollup items hold one counter per score value plus the critical segment counters:
+# {"month": "2025-11", "day": "2025-11-20", "nps_0": 3, ..., "csat_5": 7, "ces_1": 2, "high_effort_detractors": 1, ...}
+SEGMENT_COUNTERS = ("high_effort_detractors", "low_effort_promoters")
+# Attributes a feedback item contributes to its rollup
+ROLLUP_FIELDS = ("id", "date", "nps", "csat", "ces")
+
+def item_counters(item: Dict[str, Any]) -> Dict[str, int]:
+    """Counters a single feedback item adds to its day."""
+    nps, csat, ces = int(item["nps"]), int(item["csat"]), int(item["ces"])
+    counters = {f"nps_{nps}": 1, f"csat_{csat}": 1, f"ces_{ces}": 1}
+    if ces >= 4 and nps <= 6:
+        counters["high_effort_detractors"] = 1
+    if ces <= 2 and nps >= 9:
+        counters["low_effort_promoters"] = 1
+    return counters
+
+def daily_deltas(items: Iterable[Dict[str, Any]], replaced: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Counter]:
+    """
+    Aggregates feedback items into per-day counter increments. `replaced` maps ids to the stored versions the
+    items overwrite, whose counters are taken back. Days and counters that net out to zero are left out.
+    """
+    deltas: Dict[str, Counter] = defaultdict(Counter)
+    for item in items:
+        deltas[item["date"]].update(item_counters(item))
+        previous = replaced.get(item["id"]) if replaced else None
+        if previous is not None:
+            deltas[previous["date"]].subtract(item_counters(previous))
+    if replaced:
+        deltas = {day: Counter({name: count for name, count in counters.items() if count}) for day, counters in deltas.items()}
+        deltas = {day: counters for day, counters in deltas.items() if counters}
+    return deltas
+
+def update_request(day: str, counters: Dict[str, int]) -> Dict[str, Any]:
+    """UpdateItem parameters that atomically ADD `counters` to the rollup of `day`."""
+    names = {f"#c{index}": name for index, name in enumerate(counters)}
+    values = {f":c{index}": count for index, count in enumerate(counters.values())}
+    return {
+        "TableName": settings.DYNAMODB_ROLLUP_TABLE_NAME,
+        "Key": {"month": db.date_bucket(day), "day": day},
+        "UpdateExpression": "ADD " + ", ".join(f"#c{index} :c{index}" for index in range(len(counters))),
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": values,
+    }
+
+def apply_deltas(deltas: Dict[str, Counter]):
+    """Adds aggregated increments to the daily rollups, one UpdateItem per day."""
+    client = db.get_dynamodb_resource().meta.client
+    for day, counters in deltas.items():
+        client.update_item(**update_request(day, counters))
+
+def read_rollups(start: Optional[str], end: Optional[str]) -> List[Dict[str, Any]]:
+    """Returns the daily rollup items of a date window (one Query per month when the window is closed)."""
+    client = db.get_dynamodb_resource().meta.client
+    params: Dict[str, Any] = {"TableName": settings.DYNAMODB_ROLLUP_TABLE_NAME}
+
+    if start and end:
+        params["KeyConditionExpression"] = "#month = :month AND #day BETWEEN :start AND :end"
+        params["ExpressionAttributeNames"] = {"#month": "month", "#day": "day"}
+        items, _ = db.fan_out_reads(client.query, [
+            dict(params, ExpressionAttributeValues={":month": month, ":start": start, ":end": end})
+            for month in db.month_buckets(start, end)
+        ])
+        return items
+
+    # Open windows: the rollup table holds one item per day, so a filtered scan stays small
+    conditions, values = [], {}
+    if start:
+        conditions.append("#day >= :start")
+        values[":start"] = start
+    if end:
+        conditions.append("#day <= :end")
+        values[":end"] = end
+    if conditions:
+        params["FilterExpression"] = " AND ".join(conditions)
+        params["ExpressionAttributeNames"] = {"#day": "day"}
+        params["ExpressionAttributeValues"] = values
+    items, _ = db.fan_out_reads(client.scan, [params])
+    return items
+
+def merge_rollups(rows: Iterable[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict[str, int]]:
+    """Sums daily rollups into nps/csat/ces histograms and segment counts."""
+    nps = np.zeros(NPS_BINS, dtype=np.int64)
+    csat = np.zeros(CSAT_BINS, dtype=np.int64)
+    ces = np.zeros(CES_BINS, dtype=np.int64)
+    segments = dict.fromkeys(SEGMENT_COUNTERS, 0)
+    for row in rows:
+        for value in range(NPS_BINS):
+            nps[value] += int(row.get(f"nps_{value}", 0))
+        for value in range(1, CSAT_BINS):
+            csat[value] += int(row.get(f"csat_{value}", 0))
+        for value in range(1, CES_BINS):
+            ces[value] += int(row.get(f"ces_{value}", 0))
+        for name in SEGMENT_COUNTERS:
+            segments[name] += int(row.get(name, 0))
+    return nps, csat, ces, segments
+
+def rollup_metrics(rows: Iterable[Dict[str, Any]]) -> Dict:
+    """Same shape as MetricsService.get_all_metrics, computed from daily rollups (segments carry no comments)."""
+    return MetricsService.metrics_from_histograms(*merge_rollups(rows))
+
+def _rollup_rows(deltas: Dict[str, Counter]) -> List[Dict[str, Any]]:
+    return [{"month": db.date_bucket(day), "day": day, **counters} for day, counters in deltas.items()]
+
+def _pass_start() -> str:
+    # Writers stamp `created_at` with their own clock, so a pass looks back a little further
+    return (datetime.now(timezone.utc) - timedelta(seconds=settings.SNAPSHOT_SKEW_SECONDS)).isoformat(timespec="microseconds")
+
+def _recount_days(days: Set[str]):
+    """Overwrites the rollups of `days` with a fresh count of their feedback; days left without any are deleted."""
+    items, _ = db.read_date_range(ROLLUP_FIELDS, min(days), max(days))
+    deltas = daily_deltas(item for item in items if item["date"] in days)
+    table_name = settings.DYNAMODB_ROLLUP_TABLE_NAME
+    db.batch_write(_rollup_rows(deltas), table_name=table_name)
+    db.batch_delete([{"month": db.date_bucket(day), "day": day} for day in days - deltas.keys()], table_name)
+
+def rebuild_rollups(max_passes: int = 3) -> int:
+    """
+    Recomputes every daily rollup from the raw feedback while writes go on. Each day's row is overwritten with
+    its count instead of being deleted first. A write whose increment landed between the scan and that
+    overwrite is lost from it, so the days of feedback written since each pass started (read through the
+    ingest index) are counted again, until a pass finds none or after `max_passes`. Finally marks the rollups
+    as complete, which lets the metrics endpoints answer from them. Returns the number of days written.
+    """
+    table_name = settings.DYNAMODB_ROLLUP_TABLE_NAME
+    since = _pass_start()
+    stale = read_rollups(None, None)
+    items, _ = db.scan_table(ROLLUP_FIELDS)
+    deltas = daily_deltas(items)
+    db.batch_write(_rollup_rows(deltas), table_name=table_name)
+    removed = [{"month": row["month"], "day": row["day"]} for row in stale if row["day"] not in deltas]
+    db.batch_delete(removed, table_name)
+
+    recounted = 0
+    for _ in range(max_passes):
+        if not db.ingest_index_active():
+            logger.warning("Ingest index not active: rollups of days written during the rebuild may be off, rerun it when writes are paused.")
+            break
+        recent, _ = db.query_ingested_since(("date",), since)
+        if not recent:
+            break
+        since = _pass_start()
+        days = {item["date"] for item in recent}
+        _recount_days(days)
+        recounted += len(days)
+    else:
+        logger.warning(f"Feedback kept arriving during the rollup rebuild; days written in the last {settings.SNAPSHOT_SKEW_SECONDS}s may be off.")
+
+    db.rollups_backfilled.set()
+    db.rollups_changed.touch()
+    logger.info(f"Rollups rebuilt - Feedback: {len(items)} | Days: {len(deltas)} | Removed: {len(removed)} | Recounted: {recounted}")
+    return len(deltas)
@@ -0,0 +1,305 @@
+import asyncio
+import math
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
+import numpy as np
+from app.core.logging import logger
+from app.services.metrics import MetricsService
+from app.services.topics import content_words, topic_engine
+
+def nps_band(score: float) -> str:
+    if score >= 50:
+        return "excelente"
+    if score >= 30:
+        return "muy bueno"
+    if score >= 0:
+        return "mejorable"
+    return "crítico"
+
+def csat_band(percentage: float) -> str:
+    if percentage >= 85:
+        return "alta"
+    if percentage >= 70:
+        return "aceptable"
+    return "baja"
+
+def ces_band(score: float) -> str:
+    if score <= 2:
+        return "bajo"
+    if score <= 3:
+        return "moderado"
+    return "alto"
+
+@lru_cache(maxsize=65536)
+def comment_terms(comment: str) -> frozenset:
+    """Distinct content words of a comment; memoized because the same comments are analyzed on every dashboard load."""
+    return frozenset(content_words(comment))
+
+def cluster_label(cluster: Dict, index: int) -> str:
+    return ", ".join(cluster["terms"][:3]) or f"Tema {index + 1}"
+
+def share(part: int, total: int) -> float:
+    return round(part / total * 100, 1) if total else 0.0
+
+def _delta(value: float, unit: str = "") -> str:
+    return f"{'+' if value >= 0 else ''}{round(value, 1)}{unit}"
+
+class RuleInsightService:
+    """
+    Deterministic insights built from the metrics and keyword statistics of the window, with the same
+    interface as AIService. No network calls. Once a topic model exists, drivers and topics come from the
+    topic stored on each record at write time, so comments are only read when a record lacks one.
+    Trends compare the first and second half of the window, so no extra data has to be read.
+    """
+
+    @staticmethod
+    def _halves(feedbacks: List[Any]) -> Optional[Tuple[Dict, Dict]]:
+        """Metrics of the earlier and later half of the window (feedback is sorted by date)."""
+        if len(feedbacks) < 20 or feedbacks[0].date == feedbacks[-1].date:
+            return None
+        middle = feedbacks[0].date + (feedbacks[-1].date - feedbacks[0].date) / 2
+        earlier = [f for f in feedbacks if f.date <= middle]
+        later = [f for f in feedbacks if f.date > middle]
+        if not earlier or not later:
+            return None
+        return MetricsService.get_all_metrics(earlier), MetricsService.get_all_metrics(later)
+
+    @staticmethod
+    def _rank_drivers(promoters: Counter, detractors: Counter, limit: int, min_count: int) -> Dict[str, List[str]]:
+        """Labels over-represented among promoters versus detractors and vice versa, ranked by smoothed log-odds ratio."""
+        vocabulary = set(promoters) | set(detractors)
+        if not vocabulary:
+            return {"positive_drivers": [], "negative_drivers": []}
+        p_total, d_total, prior = sum(promoters.values()), sum(detractors.values()), 0.5
+        smoothing = prior * len(vocabulary)
+
+        def log_odds(word: str) -> float:
+            return (math.log((promoters[word] + prior) / (p_total + smoothing))
+                    - math.log((detractors[word] + prior) / (d_total + smoothing)))
+
+        ranked = sorted(vocabulary, key=log_odds)
+        return {
+            "positive_drivers": [w for w in reversed(ranked) if promoters[w] >= min_count and log_odds(w) > 0][:limit],
+            "negative_drivers": [w for w in ranked if detractors[w] >= min_count and log_odds(w) < 0][:limit],
+        }
+
+    @classmethod
+    def keyword_drivers(cls, feedbacks: List[Any], limit: int = 3, min_count: int = 2) -> Dict[str, List[str]]:
+        """Drivers as single words of promoter and detractor comments."""
+        promoters, detractors = Counter(), Counter()
+        for feedback in feedbacks:
+            if not feedback.comment or 7 <= feedback.nps <= 8:
+                continue
+            (promoters if feedback.nps >= 9 else detractors).update(comment_terms(feedback.comment))
+        return cls._rank_drivers(promoters, detractors, limit, min_count)
+
+    @classmethod
+    def topic_drivers(cls, feedbacks: List[Any], limit: int = 3, min_count: int = 2) -> Optional[Dict[str, List[str]]]:
+        """Drivers as topic clusters of promoter and detractor comments, or None without a topic model."""
+        assigned = topic_engine.clusters(feedbacks)
+        if assigned is None:
+            return None
+        model, labels = assigned
+        names = [" y ".join(cluster["terms"][:2]) or f"Tema {index + 1}" for index, cluster in enumerate(model.clusters)]
+        nps = np.fromiter((feedback.nps for feedback in feedbacks), dtype=np.int64, count=len(labels))
+        commented = labels >= 0
+
+        def tally(group: np.ndarray) -> Counter:
+            counts = np.bincount(labels[commented & group], minlength=len(names))
+            tallied = Counter()
+            for cluster in np.flatnonzero(counts):
+                tallied[names[cluster]] += int(counts[cluster])
+            return tallied
+
+        return cls._rank_drivers(tally(nps >= 9), tally(nps <= 6), limit, min_count)
+
+    def drivers(self, feedbacks: List[Any]) -> Dict[str, List[str]]:
+        topics = self.topic_drivers(feedbacks)
+        return topics if topics is not None else self.keyword_drivers(feedbacks)
+
+    async def get_executive_summary(self, metrics: Dict, feedbacks: List[Any]) -> str:
+        nps, csat, ces = metrics["nps"], metrics["csat"], metrics["ces"]
+        sentences = [
+            f"El NPS es {nps['score']} ({nps_band(nps['score'])}), con {share(nps['detractors'], nps['total'])}% de detractores "
+            f"sobre {nps['total']} respuestas; la satisfacción (CSAT) es {csat_band(csat['percentage'])} con {csat['percentage']}% "
+            f"y el esfuerzo (CES) es {ces_band(ces['score'])} con un promedio de {ces['score']}/5."
+        ]
+
+        halves = self._halves(feedbacks)
+        if halves:
+            earlier, later = halves
+            change = later["nps"]["score"] - earlier["nps"]["score"]
+            direction = "mejora" if change > 0 else "empeora" if change < 0 else "se mantiene"
+            sentences.append(
+                f"En la segunda mitad del periodo el NPS {direction} ({_delta(change)} puntos) y el CSAT varía "
+                f"{_delta(later['csat']['percentage'] - earlier['csat']['percentage'], ' pp')}."
+            )
+
+        negatives = self.drivers(feedbacks)["negative_drivers"]
+        high_effort = share(ces["high_effort"], ces["total"])
+        if negatives:
+            sentences.append(f"Los detractores mencionan sobre todo: {', '.join(negatives)}; {high_effort}% de los clientes reporta alto esfuerzo.")
+        else:
+            sentences.append(f"{high_effort}% de los clientes reporta alto esfuerzo.")
+        return " ".join(sentences)
+
+    async def get_indicator_insight(self, name: str, data: Any, feedbacks: List[Any]) -> str:
+        negatives = self.drivers(feedbacks)["negative_drivers"]
+        cause = f" Los comentarios asociados mencionan principalmente: {', '.join(negatives)}." if negatives else ""
+        if name == "NPS":
+            return (f"NPS de {data['score']} ({nps_band(data['score'])}): {share(data['promoters'], data['total'])}% promotores frente a "
+                    f"{share(data['detractors'], data['total'])}% detractores.{cause}")
+        if name == "CSAT":
+            return (f"Satisfacción {csat_band(data['percentage'])}: {data['percentage']}% de clientes satisfechos y "
+                    f"{share(data['unsatisfied'], data['total'])}% insatisfechos.{cause}")
+        if name == "CES":
+            return (f"Esfuerzo {ces_band(data['score'])} (promedio {data['score']}/5): {share(data['high_effort'], data['total'])}% "
+                    f"de los clientes reporta alto esfuerzo.{cause}")
+        return f"{name}: {data}"
+
+    async def get_drivers(self, feedbacks: List[Any], coverage: str = "sample") -> Dict:
+        return self.drivers(feedbacks)
+
+    async def get_topics(self, feedbacks: List[Any], coverage: str = "sample", limit: int = 10) -> List[Dict]:
+        """Mentions per topic cluster; without a topic model, the most frequent content words, counted once per comment."""
+        counted = topic_engine.count(feedbacks)
+        if counted is not None:
+            model, counts = counted
+            return [
+                {"topic": cluster_label(model.clusters[cluster], int(cluster)), "mentions": int(counts[cluster])}
+                for cluster in counts.argsort()[::-1][:limit] if counts[cluster]
+            ]
+        counts = Counter()
+        for feedback in feedbacks:
+            if feedback.comment:
+                counts.update(comment_terms(feedback.comment))
+        return [{"topic": word, "mentions": mentions} for word, mentions in counts.most_common(limit)]
+
+    async def get_topic_labels(self, clusters: List[Dict]) -> List[str]:
+        return [cluster_label(cluster, index) for index, cluster in enumerate(clusters)]
+
+    async def get_action_plans(self, metrics: Dict, feedbacks: List[Any]) -> List[Dict]:
+        nps, csat, ces = metrics["nps"], metrics["csat"], metrics["ces"]
+        negatives = self.drivers(feedbacks)["negative_drivers"]
+        about = f" (temas: {', '.join(negatives)})" if negatives else ""
+        detractor_share = share(nps["detractors"], nps["total"])
+        high_effort_share = share(ces["high_effort"], ces["total"])
+        segments = metrics.get("segments", {})
+        plans = []
+
+        if nps["score"] < 0 or detractor_share >= 30:
+            plans.append({
+                "priority": "Alta",
+                "issue": f"{detractor_share}% de detractores y NPS {nps_band(nps['score'])} ({nps['score']}){about}.",
+                "recommendation": "Contactar a los detractores recientes para cerrar el ciclo y atacar la causa más mencionada.",
+                "expected_impact": "Reducir la proporción de detractores y recuperar puntos de NPS.",
+            })
+        if high_effort_share >= 25 or ces["score"] > 3:
+            plans.append({
+                "priority": "Alta" if high_effort_share >= 40 else "Media",
+                "issue": f"{high_effort_share}% de los clientes reporta alto esfuerzo (CES {ces['score']}/5).",
+                "recommendation": "Simplificar los pasos del proceso de compra y atención con más fricción.",
+                "expected_impact": "Menor esfuerzo percibido y menos detractores por fricción.",
+            })
+        if segments.get("high_effort_detractors", {}).get("count"):
+            plans.append({
+                "priority": "Media",
+                "issue": f"{segments['high_effort_detractors']['count']} detractores con alto esfuerzo.",
+                "recommendation": "Priorizar a este segmento en el seguimiento: combina insatisfacción y fricción.",
+                "expected_impact": "Evitar la pérdida de los clientes con mayor riesgo de abandono.",
+            })
+        if csat["percentage"] < 70:
+            plans.append({
+                "priority": "Media",
+                "issue": f"Satisfacción {csat_band(csat['percentage'])}: {csat['percentage']}% de clientes satisfechos.",
+                "recommendation": "Revisar calidad de producto y servicio en los puntos con más insatisfechos.",
+                "expected_impact": "Subir el CSAT por encima del 70%.",
+            })
+        if not plans:
+            plans.append({
+                "priority": "Baja",
+                "issue": f"Indicadores saludables (NPS {nps['score']}, CSAT {csat['percentage']}%, CES {ces['score']}/5).",
+                "recommendation": "Mantener las prácticas actuales y convertir a los promotores en referidos.",
+                "expected_impact": "Sostener el NPS y aumentar la recomendación.",
+            })
+        return plans
+
+    async def get_segment_descriptions(self, segments: Dict) -> List[Dict]:
+        results = []
+        for key, data in segments.items():
+            words = Counter(word for comment in data.get("comments", []) for word in comment_terms(comment))
+            themes = ", ".join(word for word, _ in words.most_common(3))
+            description = f"{data['count']} clientes. " + (f"Temas frecuentes en sus comentarios: {themes}." if themes else "Sin comentarios representativos.")
+            results.append({"key": key, "segment": key.replace("_", " ").title(), "description": description})
+        return results
+
+class AutoInsightService:
+    """
+    Uses the LLM when it is configured and its circuit is closed, within `timeout` seconds (`full_timeout`
+    for coverage=full, which reads every comment in map-reduce chunks; 0 for none); otherwise, or when
+    the LLM answer is unusable, the rule-based result is returned.
+    LLM calls are made with `strict=True`, so failures raise instead of returning placeholder texts.
+    """
+
+    def __init__(self, llm: Any, rules: RuleInsightService, timeout: float, full_timeout: float):
+        self._llm = llm
+        self._rules = rules
+        self._timeout = timeout
+        self._full_timeout = full_timeout
+
+    def _deadline(self, coverage: str = "sample") -> Optional[float]:
+        return (self._full_timeout if coverage == "full" else self._timeout) or None
+
+    def _llm_available(self) -> bool:
+        return self._llm.client is not None and self._llm.resilience.breaker.state != "open"
+
+    async def _first_usable(self, name: str, llm_call: Awaitable, rules_call: Awaitable, coverage: str = "sample") -> Any:
+        if self._llm_available():
+            try:
+                result = await asyncio.wait_for(llm_call, self._deadline(coverage))
+                # An empty answer (no drivers, no topics) is no better than the rule-based one
+                if result and not (isinstance(result, dict) and not any(result.values())):
+                    rules_call.close()
+                    return result
+            except Exception as e:
+                logger.warning(f"LLM {name} unavailable, using rule-based insight: {type(e).__name__}")
+        else:
+            llm_call.close()
+        return await rules_call
+
+    async def get_executive_summary(self, metrics: Dict, feedbacks: List[Any]) -> str:
+        return await self._first_usable("summary", self._llm.get_executive_summary(metrics, feedbacks, strict=True), self._rules.get_executive_summary(metrics, feedbacks))
+
+    async def get_indicator_insight(self, name: str, data: Any, feedbacks: List[Any]) -> str:
+        return await self._first_usable(name, self._llm.get_indicator_insight(name, data, feedbacks, strict=True), self._rules.get_indicator_insight(name, data, feedbacks))
+
+    async def get_drivers(self, feedbacks: List[Any], coverage: str = "sample") -> Dict:
+        return await self._first_usable("drivers", self._llm.get_drivers(feedbacks, coverage, strict=True), self._rules.get_drivers(feedbacks), coverage)
+
+    async def get_topics(self, feedbacks: List[Any], coverage: str = "sample") -> List[Dict]:
+        return await self._first_usable("topics", self._llm.get_topics(feedbacks, coverage, strict=True), self._rules.get_topics(feedbacks), coverage)
+
+    async def get_topic_labels(self, clusters: List[Dict]) -> List[str]:
+        # AIService already falls back to the clusters' top terms
+        if not self._llm_available():
+            return await self._rules.get_topic_labels(clusters)
+        return await self._llm.get_topic_labels(clusters)
+
+    async def get_action_plans(self, metrics: Dict, feedbacks: List[Any]) -> List[Dict]:
+        return await self._first_usable("action plans", self._llm.get_action_plans(metrics, feedbacks, strict=True), self._rules.get_action_plans(metrics, feedbacks))
+
+    async def get_segment_descriptions(self, segments: Dict) -> List[Dict]:
+        rules = await self._rules.get_segment_descriptions(segments)
+        if not self._llm_available():
+            return rules
+        try:
+            llm = await asyncio.wait_for(self._llm.get_segment_descriptions(segments, strict=True), self._deadline())
+        except Exception as e:
+            logger.warning(f"LLM segments unavailable, using rule-based insight: {type(e).__name__}")
+            return rules
+        fallback = {entry["key"]: entry for entry in rules}
+        # Segments whose LLM description failed get the rule-based one
+        return [entry if entry["description"] is not None else fallback[entry["key"]] for entry in llm]
+
+rule_insights = RuleInsightService()
@@ -0,0 +1,400 @@
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from app.core import db
+from app.core.config import settings
+from app.core.logging import logger
+from app.models.feedback import FeedbackRecord
+from app.services.prompting import normalize
+from app.services.topics import STOPWORDS
+
+# Inverted index over feedback comments, kept in a local SQLite file shared by the API workers and the
+# ingestion script. `docs` holds the fields the analytics need, keyed by a dense integer doc id; `postings`
+# holds, per term, rows of sorted doc ids encoded as varint deltas. Every write adds one row per term, and
+# a term's rows are merged into one once there are more than SEARCH_INDEX_MERGE_ROWS of them. A re-written
+# item whose day or comment terms changed gets a new doc id (AUTOINCREMENT never hands an old one out again);
+# the old one is logged in `removed` and its postings are dropped by compaction. `meta` records when a full
+# backfill last completed.
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS docs (doc INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL UNIQUE, day INTEGER NOT NULL, "
+    "nps INTEGER NOT NULL, csat INTEGER NOT NULL, ces INTEGER NOT NULL, comment TEXT, topic TEXT)",
+    "CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, last_doc INTEGER NOT NULL, count INTEGER NOT NULL, "
+    "data BLOB NOT NULL, PRIMARY KEY (term, last_doc)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS removed (seq INTEGER PRIMARY KEY, doc INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+)
+INDEX_FIELDS = ("id", "date", "nps", "csat", "ces", "comment", "topic")
+# SQLite's historical limit on bound parameters per statement
+_MAX_PARAMS = 900
+
+# Light Spanish stemmer: derivational and verb endings first (longest first), then plurals and gender vowels
+_SUFFIXES = (
+    "amientos", "imientos", "amiento", "imiento", "aciones", "iciones", "ciones", "adoras", "adores", "amente",
+    "idades", "acion", "icion", "adora", "ador", "mente", "idad", "ables", "ibles", "aron", "ieron", "cion",
+    "able", "ible", "ando", "iendo", "ados", "adas", "idos", "idas", "ado", "ada", "ido", "ida", "aba", "ar", "er", "ir",
+)
+_MIN_STEM = 4
+
+def stem(word: str) -> str:
+    """Stem of a normalized (lowercase, accent-free) Spanish word, e.g. entregas, entregado -> entreg."""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= _MIN_STEM:
+            return word[:-len(suffix)]
+    if word.endswith("ces") and len(word) > _MIN_STEM:
+        word = word[:-3] + "z"
+    elif word.endswith("es") and len(word) > _MIN_STEM and word[-3] not in "aeiou":
+        word = word[:-2]
+    elif word.endswith("s") and len(word) > _MIN_STEM:
+        word = word[:-1]
+    if word[-1] in "aeo" and len(word) > _MIN_STEM:
+        word = word[:-1]
+    return word
+
+def analyze(text: Optional[str]) -> List[str]:
+    """Distinct index terms of a text: case- and accent-folded words, without stopwords, stemmed."""
+    terms = dict.fromkeys(stem(word) for word in normalize(text or "").split() if word not in STOPWORDS and len(word) > 1)
+    return list(terms)
+
+def encode_postings(docs: np.ndarray) -> bytes:
+    """Sorted doc ids as LEB128 varints of their gaps (the first one relative to 0)."""
+    gaps = np.diff(docs.astype(np.int64), prepend=0).astype(np.uint64)
+    sizes = np.ones(len(gaps), dtype=np.int64)
+    for shift in range(7, 64, 7):
+        sizes += gaps >= (1 << shift)
+    offsets = np.cumsum(sizes) - sizes
+    out = np.empty(int(sizes.sum()), dtype=np.uint8)
+    for byte in range(int(sizes.max()) if len(sizes) else 0):
+        selected = sizes > byte
+        value = (gaps[selected] >> np.uint64(7 * byte)) & np.uint64(0x7F)
+        more = np.where(sizes[selected] - 1 > byte, 0x80, 0).astype(np.uint64)
+        out[offsets[selected] + byte] = (value | more).astype(np.uint8)
+    return out.tobytes()
+
+def decode_postings(data: bytes) -> np.ndarray:
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if not len(raw):
+        return np.zeros(0, dtype=np.int64)
+    ends = np.flatnonzero(raw < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    # Position of every byte within its varint, which gives its shift
+    position = np.arange(len(raw)) - np.repeat(starts, ends - starts + 1)
+    parts = (raw & 0x7F).astype(np.int64) << (7 * position)
+    return np.cumsum(np.add.reduceat(parts, starts))
+
+class CommentIndex:
+    """
+    Keyword search over feedback comments. Queries intersect the posting lists of their terms (smallest
+    first), then keep the docs of the date window using an in-memory day column, so neither comments nor
+    out-of-window rows are read. The file is opened on first use; with an empty path the index is disabled.
+    Until `build_search_index` has run once it only holds what was written since it was enabled, which
+    `backfilled` reports.
+    """
+
+    def __init__(self, path: str, merge_rows: int):
+        self.path = path
+        self.merge_rows = merge_rows
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # day ordinal per doc id, caught up with rows written by any process before each query
+        self._days = np.zeros(1, dtype=np.int32)
+        self._loaded = 0
+        self._removed_seq = 0
+        self._backfilled = False
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    @property
+    def backfilled(self) -> bool:
+        """Whether a full backfill completed, so the index covers every stored comment."""
+        if self._backfilled or not self.enabled:
+            return self._backfilled
+        with self._lock:
+            row = self._connection().execute("SELECT value FROM meta WHERE key = 'backfilled_at'").fetchone()
+        # Once covered it stays covered: every later write is indexed as it happens
+        self._backfilled = row is not None
+        return self._backfilled
+
+    def mark_backfilled(self):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('backfilled_at', ?)", (datetime.now().isoformat(),)
+                )
+        self._backfilled = True
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            # Readers do not block the writer, which matters with API workers and an ingestion run side by side
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def add(self, items: Iterable[Dict[str, Any]], strict: bool = False) -> int:
+        """
+        Indexes feedback items that have a comment. An item already indexed (same id) replaces its entry when
+        an indexed field changed, e.g. a re-written item or a new topic. Returns the number of docs added or
+        updated. A failure is logged and does not fail the write it follows, unless `strict`.
+        """
+        if not self.enabled:
+            return 0
+        try:
+            with self._lock:
+                return self._add(items)
+        except sqlite3.Error as e:
+            if strict:
+                raise
+            logger.error(f"Search index update failed, run `python -m app.maintenance build-search-index`: {str(e)}")
+            return 0
+
+    def _indexed(self, conn: sqlite3.Connection, ids: List[str]) -> Dict[str, tuple]:
+        """id -> (doc, day, nps, csat, ces, comment, topic) of the ids already in the index."""
+        indexed = {}
+        for chunk in range(0, len(ids), _MAX_PARAMS):
+            part = ids[chunk:chunk + _MAX_PARAMS]
+            for row in conn.execute(
+                f"SELECT id, doc, day, nps, csat, ces, comment, topic FROM docs WHERE id IN ({','.join('?' * len(part))})",
+                part,
+            ):
+                indexed[row[0]] = row[1:]
+        return indexed
+
+    def _add(self, items: Iterable[Dict[str, Any]]) -> int:
+        conn = self._connection()
+        items = list(items)
+        by_term: Dict[str, List[int]] = defaultdict(list)
+        changed = 0
+        # One transaction holds SQLite's write lock, so the doc ids of one call are contiguous and above
+        # every id written before it: appending rows per term keeps each posting list sorted
+        with conn:
+            indexed = self._indexed(conn, list({str(item["id"]) for item in items}))
+            for item in items:
+                feedback_id = str(item["id"])
+                fields = (date.fromisoformat(item["date"]).toordinal(), int(item["nps"]), int(item["csat"]),
+                          int(item["ces"]), item.get("comment"), item.get("topic"))
+                terms = analyze(item.get("comment"))
+                current = indexed.get(feedback_id)
+                if current is not None:
+                    doc = current[0]
+                    if current[1:] == fields:
+                        continue
+                    changed += 1
+                    if terms and current[1] == fields[0] and set(analyze(current[5])) == set(terms):
+                        # Same day and terms: the postings still hold, only the stored fields change
+                        conn.execute(
+                            "UPDATE docs SET nps = ?, csat = ?, ces = ?, comment = ?, topic = ? WHERE doc = ?",
+                            (*fields[1:], doc),
+                        )
+                        indexed[feedback_id] = (doc, *fields)
+                        continue
+                    conn.execute("DELETE FROM docs WHERE doc = ?", (doc,))
+                    conn.execute("INSERT INTO removed (doc) VALUES (?)", (doc,))
+                    del indexed[feedback_id]
+                if not terms:
+                    continue
+                cursor = conn.execute(
+                    "INSERT INTO docs (id, day, nps, csat, ces, comment, topic) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (feedback_id, *fields),
+                )
+                if current is None:
+                    changed += 1
+                indexed[feedback_id] = (cursor.lastrowid, *fields)
+                for term in terms:
+                    by_term[term].append(cursor.lastrowid)
+
+            conn.executemany(
+                "INSERT INTO postings (term, last_doc, count, data) VALUES (?, ?, ?, ?)",
+                [(term, docs[-1], len(docs), encode_postings(np.array(docs))) for term, docs in by_term.items()],
+            )
+            terms = list(by_term)
+            for chunk in range(0, len(terms), _MAX_PARAMS):
+                part = terms[chunk:chunk + _MAX_PARAMS]
+                crowded = conn.execute(
+                    f"SELECT term FROM postings WHERE term IN ({','.join('?' * len(part))}) GROUP BY term HAVING COUNT(*) > ?",
+                    (*part, self.merge_rows),
+                ).fetchall()
+                for (term,) in crowded:
+                    self._merge(conn, term)
+        return changed
+
+    def _merge(self, conn: sqlite3.Connection, term: str, removed: Optional[np.ndarray] = None):
+        rows = conn.execute("SELECT data FROM postings WHERE term = ? ORDER BY last_doc", (term,)).fetchall()
+        docs = np.concatenate([decode_postings(data) for (data,) in rows])
+        if removed is not None:
+            docs = docs[~np.isin(docs, removed, assume_unique=True)]
+        conn.execute("DELETE FROM postings WHERE term = ?", (term,))
+        if not len(docs):
+            return
+        conn.execute(
+            "INSERT INTO postings (term, last_doc, count, data) VALUES (?, ?, ?, ?)",
+            (term, int(docs[-1]), len(docs), encode_postings(docs)),
+        )
+
+    def compact(self) -> int:
+        """Merges every posting list into a single row without the removed docs. Returns the number of terms."""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                removed = np.fromiter((doc for (doc,) in conn.execute("SELECT doc FROM removed")), dtype=np.int64)
+                # Removed docs can sit in any list, so every term is rewritten when there are some
+                rows = 0 if len(removed) else 1
+                terms = [term for (term,) in conn.execute("SELECT term FROM postings GROUP BY term HAVING COUNT(*) > ?", (rows,))]
+                for term in terms:
+                    self._merge(conn, term, removed if len(removed) else None)
+                total = conn.execute("SELECT COUNT(DISTINCT term) FROM postings").fetchone()[0]
+            conn.execute("VACUUM")
+        return total
+
+    def _catch_up(self, conn: sqlite3.Connection):
+        rows = conn.execute("SELECT doc, day FROM docs WHERE doc > ? ORDER BY doc", (self._loaded,)).fetchall()
+        if rows:
+            docs = np.fromiter((doc for doc, _ in rows), dtype=np.int64, count=len(rows))
+            last = int(docs[-1])
+            if last >= len(self._days):
+                grown = np.zeros(max(last + 1, len(self._days) * 2), dtype=np.int32)
+                grown[:len(self._days)] = self._days
+                self._days = grown
+            self._days[docs] = np.fromiter((day for _, day in rows), dtype=np.int32, count=len(rows))
+            self._loaded = last
+        # Read after the docs, so a doc replaced in between is still dropped. Day 0 marks a doc as removed.
+        removed = conn.execute("SELECT seq, doc FROM removed WHERE seq > ? ORDER BY seq", (self._removed_seq,)).fetchall()
+        if removed:
+            docs = np.fromiter((doc for _, doc in removed), dtype=np.int64, count=len(removed))
+            self._days[docs[docs < len(self._days)]] = 0
+            self._removed_seq = removed[-1][0]
+
+    def _match(self, conn: sqlite3.Connection, terms: Sequence[str], start: Optional[date], end: Optional[date]) -> np.ndarray:
+        """Doc ids containing every term and dated inside the window, in doc order."""
+        if not terms:
+            return np.zeros(0, dtype=np.int64)
+        placeholders = ",".join("?" * len(terms))
+        sizes = dict(conn.execute(
+            f"SELECT term, SUM(count) FROM postings WHERE term IN ({placeholders}) GROUP BY term", tuple(terms)
+        ).fetchall())
+        if len(sizes) < len(set(terms)):
+            return np.zeros(0, dtype=np.int64)
+
+        matched: Optional[np.ndarray] = None
+        for term in sorted(sizes, key=sizes.get):
+            rows = conn.execute("SELECT data FROM postings WHERE term = ? ORDER BY last_doc", (term,)).fetchall()
+            docs = np.concatenate([decode_postings(data) for (data,) in rows])
+            matched = docs if matched is None else np.intersect1d(matched, docs, assume_unique=True)
+            if not len(matched):
+                return matched
+
+        self._catch_up(conn)
+        days = self._days[matched]
+        inside = days > 0
+        if start:
+            inside &= days >= start.toordinal()
+        if end:
+            inside &= days <= end.toordinal()
+        return matched[inside]
+
+    def _fetch(self, conn: sqlite3.Connection, docs: np.ndarray, comments: bool = True) -> List[tuple]:
+        rows = []
+        ids = docs.tolist()
+        text = "comment, topic" if comments else "NULL, NULL"
+        for chunk in range(0, len(ids), _MAX_PARAMS):
+            part = ids[chunk:chunk + _MAX_PARAMS]
+            rows += conn.execute(
+                f"SELECT doc, id, day, nps, csat, ces, {text} FROM docs WHERE doc IN ({','.join('?' * len(part))})",
+                part,
+            ).fetchall()
+        return rows
+
+    def records(
+        self, terms: Sequence[str], start: Optional[date] = None, end: Optional[date] = None, comments: bool = True
+    ) -> List[FeedbackRecord]:
+        """Analytics records of the matching feedback, sorted by date; without comment and topic unless `comments`."""
+        if not self.enabled:
+            return []
+        with self._lock:
+            conn = self._connection()
+            rows = self._fetch(conn, self._match(conn, terms, start, end), comments)
+        rows.sort(key=lambda row: (row[2], row[0]))
+        dates: Dict[int, date] = {}
+        records = []
+        for _, feedback_id, day, nps, csat, ces, comment, topic in rows:
+            if day not in dates:
+                dates[day] = date.fromordinal(day)
+            records.append(FeedbackRecord(id=feedback_id, date=dates[day], nps=nps, csat=csat, ces=ces, comment=comment, topic=topic))
+        return records
+
+    def search(
+        self, terms: Sequence[str], start: Optional[date], end: Optional[date], limit: int, offset: int = 0
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """Total number of matches and one page of them, newest first."""
+        if not self.enabled:
+            return 0, []
+        with self._lock:
+            conn = self._connection()
+            matched = self._match(conn, terms, start, end)
+            # Newest day first, then latest written
+            order = np.lexsort((-matched, -self._days[matched].astype(np.int64)))
+            page = matched[order[offset:offset + limit]]
+            rows = {row[0]: row for row in self._fetch(conn, page)}
+        results = []
+        for doc in page.tolist():
+            _, feedback_id, day, nps, csat, ces, comment, topic = rows[doc]
+            results.append({
+                "id": f"fb_{feedback_id}",
+                "date": date.fromordinal(day).isoformat(),
+                "nps": nps,
+                "csat": csat,
+                "ces": ces,
+                "comment": comment,
+                "topic": topic,
+            })
+        return len(matched), results
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        if not self.enabled or not os.path.exists(self.path):
+            return None
+        with self._lock:
+            conn = self._connection()
+            docs = conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+            terms, rows, size = conn.execute("SELECT COUNT(DISTINCT term), COUNT(*), SUM(LENGTH(data)) FROM postings").fetchone()
+            removed = conn.execute("SELECT COUNT(*) FROM removed").fetchone()[0]
+            backfilled = conn.execute("SELECT value FROM meta WHERE key = 'backfilled_at'").fetchone()
+        return {
+            "docs": docs, "terms": terms, "posting_rows": rows, "posting_bytes": size or 0, "removed_docs": removed,
+            "backfilled_at": backfilled[0] if backfilled else None,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+search_index = CommentIndex(settings.SEARCH_INDEX_PATH, settings.SEARCH_INDEX_MERGE_ROWS)
+
+def build_search_index(batch_size: int = 5000) -> int:
+    """
+    Indexes every stored feedback missing from the index or changed since it was indexed (e.g. written before
+    it existed, or re-topiced), compacts it and marks it as covering the table. Returns the docs added or updated.
+    """
+    if not search_index.enabled:
+        logger.warning("SEARCH_INDEX_PATH is empty; the search index was not built.")
+        return 0
+    items, _ = db.scan_table(INDEX_FIELDS)
+    changed = 0
+    for chunk in range(0, len(items), batch_size):
+        # A failure aborts the build instead of marking a partial index as complete
+        changed += search_index.add(items[chunk:chunk + batch_size], strict=True)
+    terms = search_index.compact()
+    search_index.mark_backfilled()
+    logger.info(f"Search index built - Scanned: {len(items)} | Changed: {changed} | Terms: {terms}")
+    return changed
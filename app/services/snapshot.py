@@ -0,0 +1,276 @@
+import heapq
+import json
+import mmap
+import os
+import shutil
+import threading
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Collection, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+import numpy as np
+from app.core import db
+from app.core.config import settings
+from app.core.logging import logger
+from app.models.feedback import FeedbackRecord
+from app.services.metrics import FeedbackColumns
+
+# Columnar, date-sorted copy of the feedback table that the analytics endpoints read through mmap.
+# A generation is a directory of .npy columns plus a UTF-8 comment blob; `CURRENT` names the active one:
+#   id.npy (UTF-8 bytes)  day.npy (int32 ordinal)  nps.npy / csat.npy / ces.npy (int8)
+#   topic.npy (int16 index into meta "topics", -1 none)  comment_offsets.npy (int64, rows + 1)  comments.bin  meta.json
+SNAPSHOT_FIELDS = ("id", "date", "nps", "csat", "ces", "comment", "topic", "created_at")
+POINTER = "CURRENT"
+COLUMNS = ("id", "day", "nps", "csat", "ces", "topic", "comment_offsets")
+
+def build_snapshot(path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Compacts the feedback table into a new snapshot generation and makes it current. Returns its metadata.
+
+    Items written from `SNAPSHOT_SKEW_SECONDS` before the scan started onwards are left out: readers fetch
+    them through the ingest index instead, so clock skew between writers cannot drop an item from both.
+    """
+    path = path or settings.SNAPSHOT_PATH
+    if not path:
+        raise ValueError("SNAPSHOT_PATH is not set")
+    started = datetime.now(timezone.utc)
+    watermark = (started - timedelta(seconds=settings.SNAPSHOT_SKEW_SECONDS)).isoformat(timespec="microseconds")
+
+    items, _ = db.scan_table(SNAPSHOT_FIELDS)
+    # Items stored before `created_at` existed are never in the ingest index, so they always belong here
+    items = [item for item in items if item.get("created_at", "") < watermark]
+    items.sort(key=lambda item: item["date"])
+
+    topics: Dict[str, int] = {}
+    blob = bytearray()
+    offsets = np.zeros(len(items) + 1, dtype=np.int64)
+    topic_codes = np.full(len(items), -1, dtype=np.int16)
+    for index, item in enumerate(items):
+        blob += (item.get("comment") or "").encode("utf-8")
+        offsets[index + 1] = len(blob)
+        if item.get("topic"):
+            topic_codes[index] = topics.setdefault(item["topic"], len(topics))
+
+    os.makedirs(path, exist_ok=True)
+    name = f"snapshot-{started.strftime('%Y%m%dT%H%M%S%fZ')}"
+    tmp = os.path.join(path, f"{name}.tmp")
+    os.makedirs(tmp)
+    columns = {
+        # Lets readers drop rows re-written after the snapshot, which come back through the ingest index
+        "id": np.array([str(item["id"]).encode("utf-8") for item in items], dtype=np.bytes_) if items else np.zeros(0, dtype="S1"),
+        "day": np.fromiter((date.fromisoformat(item["date"]).toordinal() for item in items), dtype=np.int32, count=len(items)),
+        "nps": np.fromiter((int(item["nps"]) for item in items), dtype=np.int8, count=len(items)),
+        "csat": np.fromiter((int(item["csat"]) for item in items), dtype=np.int8, count=len(items)),
+        "ces": np.fromiter((int(item["ces"]) for item in items), dtype=np.int8, count=len(items)),
+        "topic": topic_codes,
+        "comment_offsets": offsets,
+    }
+    for column, values in columns.items():
+        np.save(os.path.join(tmp, f"{column}.npy"), values)
+    with open(os.path.join(tmp, "comments.bin"), "wb") as f:
+        f.write(blob)
+    meta = {"rows": len(items), "watermark": watermark, "built_at": started.isoformat(timespec="seconds"), "topics": list(topics)}
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    os.rename(tmp, os.path.join(path, name))
+    pointer_tmp = os.path.join(path, f"{POINTER}.tmp")
+    with open(pointer_tmp, "w") as f:
+        f.write(name)
+    os.replace(pointer_tmp, os.path.join(path, POINTER))
+    _prune(path, name)
+
+    logger.info(f"Snapshot {name} built - Rows: {len(items)} | Comments: {len(blob)} bytes | Watermark: {watermark}")
+    return {"name": name, **meta}
+
+def _prune(path: str, current: str):
+    """Keeps the newest SNAPSHOT_KEEP generations. Workers still mapping an older one keep their open files."""
+    generations = sorted(entry for entry in os.listdir(path) if entry.startswith("snapshot-") and not entry.endswith(".tmp"))
+    for stale in generations[:-max(1, settings.SNAPSHOT_KEEP)]:
+        if stale != current:
+            shutil.rmtree(os.path.join(path, stale), ignore_errors=True)
+
+class Snapshot:
+    """One snapshot generation mapped read-only; the page cache is shared by every worker mapping it."""
+
+    def __init__(self, directory: str):
+        self.name = os.path.basename(directory)
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.watermark: str = self.meta["watermark"]
+        self.topics: List[str] = self.meta["topics"]
+        rows = self.meta["rows"]
+        # numpy cannot map zero-length arrays
+        self._columns = {
+            column: np.load(os.path.join(directory, f"{column}.npy"), mmap_mode="r" if rows else None)
+            for column in COLUMNS
+        }
+        with open(os.path.join(directory, "comments.bin"), "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._comments = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return self.meta["rows"]
+
+    def bounds(self, start: Optional[date], end: Optional[date]) -> Tuple[int, int]:
+        """Row range of an inclusive date window, by binary search over the sorted day column."""
+        days = self._columns["day"]
+        low = int(np.searchsorted(days, start.toordinal(), side="left")) if start else 0
+        high = int(np.searchsorted(days, end.toordinal(), side="right")) if end else len(days)
+        return low, max(low, high)
+
+    def excluded(self, low: int, high: int, ids: Collection[str]) -> Optional[np.ndarray]:
+        """Mask of the rows in [low, high) whose id is in `ids`, or None when there are none."""
+        if not ids or high <= low:
+            return None
+        mask = np.isin(self._columns["id"][low:high], np.array([str(i).encode("utf-8") for i in ids], dtype=np.bytes_))
+        return mask if mask.any() else None
+
+    def comment(self, row: int) -> Optional[str]:
+        offsets = self._columns["comment_offsets"]
+        begin, finish = int(offsets[row]), int(offsets[row + 1])
+        return self._comments[begin:finish].decode("utf-8") if finish > begin else None
+
+    def window(
+        self, start: Optional[date], end: Optional[date], exclude_ids: Collection[str] = (), newer: Sequence[FeedbackRecord] = ()
+    ) -> "SnapshotWindow":
+        """
+        Feedback of a date window: the mapped rows, without those whose id is in `exclude_ids` (items
+        re-written since), followed by the `newer` records read from DynamoDB.
+        """
+        low, high = self.bounds(start, end)
+        excluded = self.excluded(low, high, exclude_ids)
+        rows = slice(low, high) if excluded is None else np.flatnonzero(~excluded) + low
+        return SnapshotWindow(self, rows, list(newer))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name, "rows": len(self), "watermark": self.watermark, "built_at": self.meta["built_at"]}
+
+class _WindowComments(Sequence[Optional[str]]):
+    """Comments of a window by position, decoded one at a time (e.g. the few shown per segment)."""
+
+    def __init__(self, window: "SnapshotWindow", order: Optional[np.ndarray] = None):
+        self._window = window
+        self._order = order
+
+    def __len__(self) -> int:
+        return len(self._window)
+
+    def __getitem__(self, index: int) -> Optional[str]:
+        window = self._window
+        if self._order is not None:
+            index = int(self._order[index])
+        if index < window.mapped:
+            return window.snapshot.comment(window.row(index))
+        return window.newer[index - window.mapped].comment
+
+class SnapshotWindow(Sequence[FeedbackRecord]):
+    """
+    Feedback of a window served from a snapshot. Metrics read the mapped score columns directly
+    (`to_columns`) and decode only the comments they show, without a Python object per row;
+    FeedbackRecords, with their comments, are only built (once) when a section iterates or indexes the rows.
+    """
+
+    def __init__(self, snapshot: Snapshot, rows: Union[slice, np.ndarray], newer: List[FeedbackRecord]):
+        self.snapshot = snapshot
+        # A slice keeps every column access a view of the mapping; an index array only when rows were dropped
+        self._rows = rows
+        self.newer = newer
+        self.mapped = rows.stop - rows.start if isinstance(rows, slice) else len(rows)
+        self._records: Optional[List[FeedbackRecord]] = None
+
+    def __len__(self) -> int:
+        return self.mapped + len(self.newer)
+
+    def row(self, index: int) -> int:
+        return self._rows.start + index if isinstance(self._rows, slice) else int(self._rows[index])
+
+    def _column(self, name: str) -> np.ndarray:
+        return self.snapshot._columns[name][self._rows]
+
+    def to_columns(self) -> FeedbackColumns:
+        scores = {name: self._column(name) for name in ("nps", "csat", "ces")}
+        if not self.newer:
+            return FeedbackColumns(comments=_WindowComments(self), **scores)
+        # Same row order as records(): a stable sort by day keeps mapped rows ahead of newer ones on ties
+        count = len(self.newer)
+        days = np.concatenate([self._column("day"), np.fromiter((f.date.toordinal() for f in self.newer), dtype=np.int32, count=count)])
+        order = np.argsort(days, kind="stable")
+        for name, values in scores.items():
+            extra = np.fromiter((getattr(f, name) for f in self.newer), dtype=np.int8, count=count)
+            scores[name] = np.concatenate([values, extra])[order]
+        return FeedbackColumns(comments=_WindowComments(self, order), **scores)
+
+    def records(self) -> List[FeedbackRecord]:
+        if self._records is None:
+            # One bulk conversion per column instead of per-row numpy scalar access
+            days = self._column("day").tolist()
+            nps = self._column("nps").tolist()
+            csat = self._column("csat").tolist()
+            ces = self._column("ces").tolist()
+            topic_codes = self._column("topic").tolist()
+            offsets = self.snapshot._columns["comment_offsets"]
+            begins = offsets[self._rows].tolist()
+            ends = (offsets[self._rows.start + 1:self._rows.stop + 1] if isinstance(self._rows, slice) else offsets[self._rows + 1]).tolist()
+            blob = self.snapshot._comments
+            topics = self.snapshot.topics
+            dates: Dict[int, date] = {}
+            mapped = []
+            for index in range(self.mapped):
+                day = days[index]
+                if day not in dates:
+                    dates[day] = date.fromordinal(day)
+                begin, finish = begins[index], ends[index]
+                code = topic_codes[index]
+                mapped.append(FeedbackRecord(
+                    date=dates[day],
+                    nps=nps[index],
+                    csat=csat[index],
+                    ces=ces[index],
+                    comment=blob[begin:finish].decode("utf-8") if finish > begin else None,
+                    topic=topics[code] if code >= 0 else None,
+                ))
+            self._records = list(heapq.merge(mapped, self.newer, key=lambda x: x.date)) if self.newer else mapped
+        return self._records
+
+    def __getitem__(self, index):
+        return self.records()[index]
+
+    def __iter__(self) -> Iterator[FeedbackRecord]:
+        return iter(self.records())
+
+class SnapshotStore:
+    """Process-wide access to the current snapshot; switches to a new generation when `CURRENT` changes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._snapshot: Optional[Snapshot] = None
+        self._mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def current(self) -> Optional[Snapshot]:
+        if not self.path:
+            return None
+        pointer = os.path.join(self.path, POINTER)
+        try:
+            mtime = os.stat(pointer).st_mtime
+        except OSError:
+            return None
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    try:
+                        with open(pointer) as f:
+                            name = f.read().strip()
+                        self._snapshot = Snapshot(os.path.join(self.path, name))
+                        logger.info(f"Snapshot {name} loaded ({len(self._snapshot)} rows, watermark {self._snapshot.watermark})")
+                    except Exception as e:
+                        logger.error(f"Error loading snapshot from '{self.path}': {str(e)}")
+                        self._snapshot = None
+                    self._mtime = mtime
+        return self._snapshot
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        snapshot = self.current
+        return snapshot.stats() if snapshot else None
+
+analytics_snapshot = SnapshotStore(settings.SNAPSHOT_PATH)
@@ -0,0 +1,209 @@
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.models.feedback import FeedbackRecord
+from app.services.metrics import MetricsService, NPS_BINS, CSAT_BINS, CES_BINS
+from app.services.repository import feedback_repository
+from app.services.rollups import SEGMENT_COUNTERS, daily_deltas
+
+# Column layout of a bucket's counter vector; mirrors the daily rollup attributes
+COUNTER_COLUMNS = (
+    [f"nps_{value}" for value in range(NPS_BINS)]
+    + [f"csat_{value}" for value in range(1, CSAT_BINS)]
+    + [f"ces_{value}" for value in range(1, CES_BINS)]
+    + list(SEGMENT_COUNTERS)
+)
+_CSAT = slice(NPS_BINS, NPS_BINS + CSAT_BINS - 1)
+_CES = slice(_CSAT.stop, _CSAT.stop + CES_BINS - 1)
+
+DateRange = Tuple[date, date]
+
+def bucket_ranges(start: date, end: date, granularity: str) -> List[DateRange]:
+    """Consecutive day / ISO week / month buckets covering [start, end], clipped to the window."""
+    ranges = []
+    current = start
+    while current <= end:
+        if granularity == "day":
+            bucket_end = current
+        elif granularity == "week":
+            bucket_end = current + timedelta(days=6 - current.weekday())
+        else:
+            next_month = (current.replace(day=1) + timedelta(days=32)).replace(day=1)
+            bucket_end = next_month - timedelta(days=1)
+        bucket_end = min(bucket_end, end)
+        ranges.append((current, bucket_end))
+        current = bucket_end + timedelta(days=1)
+    return ranges
+
+class ClosedRangeCache:
+    """
+    Counter vectors of date ranges that ended before the late-arrival grace period.
+    Those ranges rarely receive feedback, so their aggregates are reused until `ttl` expires, a write of
+    this process dated inside them evicts them, or the rollups-changed stamp of another process moves.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, grace_days: int):
+        self._entries: "OrderedDict[DateRange, tuple]" = OrderedDict()
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._grace = timedelta(days=grace_days)
+        self._stamp: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def is_closed(self, bucket: DateRange) -> bool:
+        return bucket[1] < date.today() - self._grace
+
+    def get(self, bucket: DateRange) -> Optional[np.ndarray]:
+        entry = self._entries.get(bucket)
+        if entry and entry[1] > time.time():
+            self._entries.move_to_end(bucket)
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        return None
+
+    def set(self, bucket: DateRange, counts: np.ndarray):
+        if not self.is_closed(bucket):
+            return
+        self._entries[bucket] = (counts, time.time() + self._ttl)
+        self._entries.move_to_end(bucket)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def evict(self, days: Iterable[str]):
+        """Drops the ranges containing any of the ISO `days`."""
+        ordinals = sorted(date.fromisoformat(day).toordinal() for day in days)
+        if not ordinals:
+            return
+        stale = [
+            bucket for bucket in self._entries
+            if bisect_left(ordinals, bucket[0].toordinal()) < bisect_right(ordinals, bucket[1].toordinal())
+        ]
+        for bucket in stale:
+            del self._entries[bucket]
+        self.evicted += len(stale)
+
+    def sync(self, stamp: Optional[str]):
+        """Drops every range once closed ranges changed in another process (`stamp` moved)."""
+        if stamp != self._stamp:
+            self.evicted += len(self._entries)
+            self._entries.clear()
+            self._stamp = stamp
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "evicted": self.evicted}
+
+range_cache = ClosedRangeCache(
+    settings.TIMESERIES_CACHE_MAX_ENTRIES, settings.TIMESERIES_CACHE_TTL_SECONDS, settings.TIMESERIES_CLOSE_AFTER_DAYS
+)
+feedback_repository.add_write_listener(range_cache.evict)
+
+def group_rollups(rows: List[Dict[str, Any]], buckets: List[DateRange]) -> np.ndarray:
+    """
+    Sums daily rollups into their buckets in one grouped pass. `buckets` must be sorted and disjoint;
+    days outside every bucket are ignored. Returns a (buckets, COUNTER_COLUMNS) matrix.
+    """
+    totals = np.zeros((len(buckets), len(COUNTER_COLUMNS)), dtype=np.int64)
+    if not rows or not buckets:
+        return totals
+    days = np.array([date.fromisoformat(row["day"]).toordinal() for row in rows])
+    counts = np.array([[int(row.get(column, 0)) for column in COUNTER_COLUMNS] for row in rows], dtype=np.int64)
+    starts = np.array([bucket[0].toordinal() for bucket in buckets])
+    ends = np.array([bucket[1].toordinal() for bucket in buckets])
+    index = np.searchsorted(starts, days, side="right") - 1
+    inside = (index >= 0) & (days <= ends[np.clip(index, 0, None)])
+    np.add.at(totals, index[inside], counts[inside])
+    return totals
+
+async def bucket_counts(buckets: List[DateRange]) -> np.ndarray:
+    """Counter vectors of sorted, disjoint buckets: closed ones from the cache, the rest from one rollup read."""
+    range_cache.sync(await feedback_repository.rollups_changed_at())
+    totals = np.zeros((len(buckets), len(COUNTER_COLUMNS)), dtype=np.int64)
+    missing = []
+    for position, bucket in enumerate(buckets):
+        cached = range_cache.get(bucket) if range_cache.is_closed(bucket) else None
+        if cached is None:
+            missing.append(position)
+        else:
+            totals[position] = cached
+
+    if missing:
+        wanted = [buckets[position] for position in missing]
+        rows = await feedback_repository.rollup_range(wanted[0][0], wanted[-1][1])
+        grouped = group_rollups(rows, wanted)
+        for position, bucket, counts in zip(missing, wanted, grouped):
+            totals[position] = counts
+            range_cache.set(bucket, counts)
+    return totals
+
+def record_counts(records: List[FeedbackRecord], buckets: List[DateRange]) -> np.ndarray:
+    """Counter vectors of sorted, disjoint buckets computed from individual records, e.g. a keyword match."""
+    deltas = daily_deltas({"date": r.date.isoformat(), "nps": r.nps, "csat": r.csat, "ces": r.ces} for r in records)
+    return group_rollups([{"day": day, **counters} for day, counters in deltas.items()], buckets)
+
+def counts_metrics(counts: np.ndarray) -> Dict:
+    """MetricsService metrics of one counter vector."""
+    nps = counts[:NPS_BINS]
+    csat = np.concatenate(([0], counts[_CSAT]))
+    ces = np.concatenate(([0], counts[_CES]))
+    segments = dict(zip(SEGMENT_COUNTERS, (int(value) for value in counts[_CES.stop:])))
+    return MetricsService.metrics_from_histograms(nps, csat, ces, segments)
+
+def summarize(bucket: DateRange, counts: np.ndarray) -> Dict[str, Any]:
+    responses = int(counts[:NPS_BINS].sum())
+    point: Dict[str, Any] = {"start": bucket[0].isoformat(), "end": bucket[1].isoformat(), "responses": responses}
+    if not responses:
+        return {**point, "nps": None, "csat": None, "ces": None}
+    metrics = counts_metrics(counts)
+    return {**point, "nps": metrics["nps"]["score"], "csat": metrics["csat"]["percentage"], "ces": metrics["ces"]["score"]}
+
+def _delta(current: Optional[float], previous: Optional[float]) -> Optional[float]:
+    return round(current - previous, 2) if current is not None and previous is not None else None
+
+async def timeseries(
+    start: date,
+    end: date,
+    granularity: str,
+    compare: bool = False,
+    counts_of: Callable[[List[DateRange]], Awaitable[np.ndarray]] = bucket_counts,
+) -> Dict[str, Any]:
+    """
+    NPS, CSAT and CES per bucket of the window. With `compare`, also the totals of the window against the
+    previous period of the same length; both come out of the same grouped read, by default of the rollups.
+    """
+    buckets = bucket_ranges(start, end, granularity)
+    previous: Optional[DateRange] = None
+    if compare:
+        length = end - start + timedelta(days=1)
+        previous = (start - length, start - timedelta(days=1))
+
+    counts = await counts_of(([previous] if previous else []) + buckets)
+    series_counts = counts[1:] if previous else counts
+    result: Dict[str, Any] = {
+        "granularity": granularity,
+        "series": [summarize(bucket, row) for bucket, row in zip(buckets, series_counts)],
+    }
+
+    if previous:
+        current_total = summarize((start, end), series_counts.sum(axis=0))
+        previous_total = summarize(previous, counts[0])
+        result["comparison"] = {
+            "current": current_total,
+            "previous": previous_total,
+            "delta": {
+                "responses": current_total["responses"] - previous_total["responses"],
+                "nps": _delta(current_total["nps"], previous_total["nps"]),
+                "csat": _delta(current_total["csat"], previous_total["csat"]),
+                "ces": _delta(current_total["ces"], previous_total["ces"]),
+            },
+        }
+    return result
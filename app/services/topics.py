@@ -0,0 +1,313 @@
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from app.core import db
+from app.core.config import settings
+from app.core.logging import logger
+from app.services.prompting import normalize
+
+# Hashed feature space: word unigrams and bigrams folded into 2^14 buckets, so indices fit in uint16
+FEATURE_BITS = 14
+FEATURES = 1 << FEATURE_BITS
+
+SparseVector = Tuple[np.ndarray, np.ndarray]
+
+# Function words carry no topic; accents are already stripped by normalize()
+STOPWORDS = frozenset("""
+a al algo ante antes aqui asi aun con contra cual cuando de del desde donde el ella ellos en entre era es esa ese
+eso esta estaba este esto fue fueron ha habia han hay la las le les lo los mas me mi mis mucho muy nada ni no nos
+o otra otro para pero poco por porque que se sea ser si sin sobre solo son su sus tambien te todo todos tu un una
+uno unos y ya yo
+""".split())
+
+def content_words(comment: str) -> List[str]:
+    return [word for word in normalize(comment).split() if word not in STOPWORDS]
+
+def _features(comment: str) -> Counter:
+    words = content_words(comment)
+    return Counter(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+
+def vectorize(comment: Optional[str]) -> Optional[SparseVector]:
+    """Sublinear term frequencies of the hashed features of a comment, or None when it has no words."""
+    counts: Dict[int, float] = {}
+    for feature, count in _features(comment or "").items():
+        index = zlib.crc32(feature.encode("utf-8")) & (FEATURES - 1)
+        counts[index] = counts.get(index, 0.0) + 1.0 + math.log(count)
+    if not counts:
+        return None
+    indices = np.fromiter(counts.keys(), dtype=np.uint16, count=len(counts))
+    weights = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    return indices, weights
+
+def encode_vector(vector: SparseVector) -> bytes:
+    """Packs a sparse vector as uint16 indices followed by float16 weights (4 bytes per feature)."""
+    indices, weights = vector
+    return indices.astype("<u2").tobytes() + weights.astype("<f2").tobytes()
+
+def decode_vector(data: Any) -> SparseVector:
+    raw = bytes(getattr(data, "value", data))  # boto3 returns Binary wrappers
+    size = len(raw) // 4
+    indices = np.frombuffer(raw, dtype="<u2", count=size)
+    weights = np.frombuffer(raw, dtype="<f2", count=size, offset=size * 2).astype(np.float32)
+    return indices, weights
+
+def _to_rows(vectors: Sequence[SparseVector], idf: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """CSR arrays (indptr, indices, data) of L2-normalized TF-IDF rows."""
+    lengths = np.fromiter((len(indices) for indices, _ in vectors), dtype=np.int64, count=len(vectors))
+    indptr = np.zeros(len(vectors) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    indices = np.concatenate([indices for indices, _ in vectors]).astype(np.intp)
+    data = np.concatenate([weights for _, weights in vectors]) * idf[indices]
+    norms = np.sqrt(np.add.reduceat(data * data, indptr[:-1]))
+    data /= np.repeat(np.maximum(norms, 1e-12), lengths)
+    return indptr, indices, data
+
+def _scores(rows: Tuple[np.ndarray, np.ndarray, np.ndarray], centroids: np.ndarray) -> np.ndarray:
+    """Cosine similarity of every row with every centroid, shape (rows, clusters). Rows must be non-empty."""
+    indptr, indices, data = rows
+    return np.add.reduceat(centroids[:, indices] * data, indptr[:-1], axis=1).T
+
+def _dense_row(rows: Tuple[np.ndarray, np.ndarray, np.ndarray], row: int) -> np.ndarray:
+    indptr, indices, data = rows
+    dense = np.zeros((1, FEATURES), dtype=np.float32)
+    dense[0, indices[indptr[row]:indptr[row + 1]]] = data[indptr[row]:indptr[row + 1]]
+    return dense
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+class TopicModel:
+    """Spherical k-means centroids over hashed TF-IDF vectors, plus what is needed to label each cluster."""
+
+    def __init__(self, centroids: np.ndarray, idf: np.ndarray, clusters: List[Dict[str, Any]]):
+        self.centroids = centroids.astype(np.float32)
+        self.idf = idf.astype(np.float32)
+        self.clusters = clusters  # per cluster: size, top terms and representative comments
+        self.model_id = hashlib.sha256(self.centroids.tobytes()).hexdigest()[:12]
+
+    def assign(self, vectors: Sequence[SparseVector], batch_size: int = 4096) -> np.ndarray:
+        labels = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), batch_size):
+            rows = _to_rows(vectors[start:start + batch_size], self.idf)
+            labels[start:start + batch_size] = _scores(rows, self.centroids).argmax(axis=1)
+        return labels
+
+    def topic(self, cluster: int) -> str:
+        """Value stored in the `topic` attribute; the model id prefix detects assignments from older models."""
+        return f"{self.model_id}:{cluster}"
+
+    def save(self, path: str):
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, centroids=self.centroids, idf=self.idf, clusters=np.array(json.dumps(self.clusters, ensure_ascii=False)))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "TopicModel":
+        with np.load(path) as data:
+            return cls(data["centroids"], data["idf"], json.loads(str(data["clusters"])))
+
+def train(
+    comments: Sequence[str],
+    vectors: Sequence[SparseVector],
+    clusters: int,
+    batch_size: int = 1024,
+    iterations: int = 100,
+    seed: int = 42,
+) -> Tuple[TopicModel, np.ndarray]:
+    """
+    Fits MiniBatch k-means (Sculley, 2010) on unit-length TF-IDF vectors: k-means++ seeding on a sample,
+    then per-cluster learning rates that decay with the points each centroid has absorbed.
+    Returns the model and the cluster of every input vector.
+    """
+    rng = np.random.default_rng(seed)
+    total = len(vectors)
+    clusters = min(clusters, total)
+
+    document_frequency = np.zeros(FEATURES, dtype=np.float64)
+    for indices, _ in vectors:
+        document_frequency[indices] += 1
+    idf = (np.log((1 + total) / (1 + document_frequency)) + 1).astype(np.float32)
+
+    # k-means++ seeding on a sample, kept sparse: only the chosen rows are expanded to dense vectors
+    sample = rng.choice(total, size=min(total, 2000), replace=False)
+    seeding = _to_rows([vectors[i] for i in sample], idf)
+    chosen = [_dense_row(seeding, int(rng.integers(len(sample))))]
+    distance = 1.0 - _scores(seeding, chosen[0])[:, 0]
+    for _ in range(1, clusters):
+        weights = np.maximum(distance, 0) ** 2
+        pick = int(rng.choice(len(sample), p=weights / weights.sum())) if weights.sum() > 0 else int(rng.integers(len(sample)))
+        chosen.append(_dense_row(seeding, pick))
+        distance = np.minimum(distance, 1.0 - _scores(seeding, chosen[-1])[:, 0])
+    centroids = np.concatenate(chosen)
+
+    absorbed = np.zeros(clusters, dtype=np.float64)
+    for _ in range(iterations):
+        batch = rng.choice(total, size=min(batch_size, total), replace=False)
+        indptr, indices, data = rows = _to_rows([vectors[i] for i in batch], idf)
+        labels = _scores(rows, centroids).argmax(axis=1)
+
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, (np.repeat(labels, np.diff(indptr)), indices), data)
+        counts = np.bincount(labels, minlength=clusters).astype(np.float64)
+        absorbed += counts
+        touched = counts > 0
+        rate = (counts[touched] / absorbed[touched])[:, None]
+        centroids[touched] = (1 - rate) * centroids[touched] + rate * (sums[touched] / counts[touched][:, None])
+        centroids = _normalize_rows(centroids)
+
+    model = TopicModel(centroids, idf, [])
+    labels = model.assign(vectors)
+    model.clusters = _describe(model, comments, vectors, labels)
+    return model, labels
+
+def _describe(model: TopicModel, comments: Sequence[str], vectors: Sequence[SparseVector], labels: np.ndarray, terms: int = 8, examples: int = 5) -> List[Dict[str, Any]]:
+    """Distinctive terms (frequency in the cluster weighted by rarity overall) and the comments closest to each centroid."""
+    overall: Counter = Counter()
+    per_cluster = [Counter() for _ in range(len(model.centroids))]
+    for comment, label in zip(comments, labels):
+        words = set(content_words(comment))
+        overall.update(words)
+        per_cluster[label].update(words)
+
+    described = []
+    for cluster, counter in enumerate(per_cluster):
+        members = np.flatnonzero(labels == cluster)
+        ranked = sorted(counter, key=lambda word: counter[word] * math.log(len(comments) / overall[word]), reverse=True)
+        closest = []
+        if len(members):
+            rows = _to_rows([vectors[i] for i in members], model.idf)
+            similarity = _scores(rows, model.centroids[cluster:cluster + 1])[:, 0]
+            closest = [comments[members[i]][:settings.PROMPT_MAX_COMMENT_CHARS] for i in np.argsort(-similarity)[:examples]]
+        described.append({"size": int(len(members)), "terms": ranked[:terms], "examples": closest})
+    return described
+
+class TopicEngine:
+    """
+    Process-wide access to the trained model file; reloads it when a rebuild replaces the file. The file
+    is stat'ed at most every `recheck_seconds` (and right after `reload()`), not on every write.
+    """
+
+    def __init__(self, path: str, recheck_seconds: float):
+        self.path = path
+        self.recheck_seconds = recheck_seconds
+        self._model: Optional[TopicModel] = None
+        self._mtime: Optional[float] = None
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def reload(self):
+        """Checks the model file on the next access, e.g. after this process saved a new model."""
+        self._checked_at = None
+
+    @property
+    def model(self) -> Optional[TopicModel]:
+        checked_at = self._checked_at
+        if checked_at is not None and time.monotonic() - checked_at < self.recheck_seconds:
+            return self._model
+        with self._lock:
+            if self._checked_at == checked_at:
+                self._refresh()
+                self._checked_at = time.monotonic()
+        return self._model
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            self._model, self._mtime = None, None
+            return
+        if mtime != self._mtime:
+            try:
+                self._model = TopicModel.load(self.path)
+                logger.info(f"Topic model {self._model.model_id} loaded ({len(self._model.centroids)} clusters)")
+            except Exception as e:
+                logger.error(f"Error loading topic model '{self.path}': {str(e)}")
+                self._model = None
+            self._mtime = mtime
+
+    def annotate(self, comment: Optional[str]) -> Dict[str, Any]:
+        """Item attributes computed at write time: the packed vector and, once a model exists, the topic."""
+        vector = vectorize(comment)
+        if vector is None:
+            return {}
+        attributes: Dict[str, Any] = {"topic_vec": encode_vector(vector)}
+        model = self.model
+        if model is not None:
+            attributes["topic"] = model.topic(int(model.assign([vector])[0]))
+        return attributes
+
+    def clusters(self, feedbacks: Iterable[Any]) -> Optional[Tuple[TopicModel, np.ndarray]]:
+        """
+        Cluster of every given feedback (-1 without words). Stored assignments of the current model are
+        reused as-is; comments assigned by an older model (or never assigned) are vectorized here.
+        """
+        model = self.model
+        if model is None:
+            return None
+        prefix = f"{model.model_id}:"
+        labels: List[int] = []
+        unassigned: List[int] = []
+        vectors: List[SparseVector] = []
+        for position, feedback in enumerate(feedbacks):
+            topic = getattr(feedback, "topic", None)
+            label = -1
+            if topic and topic.startswith(prefix):
+                label = int(topic[len(prefix):])
+            elif feedback.comment:
+                vector = vectorize(feedback.comment)
+                if vector is not None:
+                    unassigned.append(position)
+                    vectors.append(vector)
+            labels.append(label)
+        labels = np.asarray(labels, dtype=np.int64)
+        if vectors:
+            labels[unassigned] = model.assign(vectors)
+        return model, labels
+
+    def count(self, feedbacks: Iterable[Any]) -> Optional[Tuple[TopicModel, np.ndarray]]:
+        """Exact mentions per cluster over the given feedback."""
+        assigned = self.clusters(feedbacks)
+        if assigned is None:
+            return None
+        model, labels = assigned
+        return model, np.bincount(labels[labels >= 0], minlength=len(model.centroids))
+
+topic_engine = TopicEngine(settings.TOPIC_MODEL_PATH, settings.TOPIC_MODEL_RECHECK_SECONDS)
+
+def rebuild_topics(clusters: Optional[int] = None) -> int:
+    """
+    Trains a new topic model on every stored comment, saves it to TOPIC_MODEL_PATH and writes the new
+    `topic` of each item (vectorizing items stored before vectors existed). Returns the number of clusters.
+    Only `topic` and `topic_vec` are updated, per key, so concurrent writes to other attributes are kept;
+    items whose comment changed since the scan already got their topic when they were rewritten.
+    """
+    items, _ = db.scan_table(("id", "comment", "topic_vec"))
+    items = [item for item in items if item.get("comment")]
+    vectors: List[Optional[SparseVector]] = [
+        decode_vector(item["topic_vec"]) if item.get("topic_vec") else vectorize(item["comment"]) for item in items
+    ]
+    items = [item for item, vector in zip(items, vectors) if vector is not None]
+    vectors = [vector for vector in vectors if vector is not None]
+    if not vectors:
+        logger.warning("No comments to cluster; the topic model was not rebuilt.")
+        return 0
+
+    model, labels = train([item["comment"] for item in items], vectors, clusters or settings.TOPIC_CLUSTERS)
+    model.save(topic_engine.path)
+    topic_engine.reload()
+
+    for item, vector, label in zip(items, vectors, labels):
+        item["topic_vec"] = encode_vector(vector)
+        item["topic"] = model.topic(int(label))
+    updated = db.update_attributes(items, ("topic", "topic_vec"), unchanged=("comment",))
+
+    logger.info(f"Topic model {model.model_id} rebuilt - Comments: {len(items)} | Updated: {updated} | Clusters: {len(model.centroids)}")
+    return len(model.centroids)
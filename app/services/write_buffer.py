@@ -0,0 +1,81 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.db import BatchWriteError
+from app.core.logging import logger
+from app.services.repository import FeedbackRepository, feedback_repository
+
+class WriteBuffer:
+    """
+    Write-behind buffer that coalesces single feedback writes into BatchWriteItem calls.
+    A batch is flushed as soon as it holds `max_items` items or `max_delay` seconds after its first item.
+    Every submitted item gets a future resolved when its batch is stored, so callers choose whether to
+    acknowledge after buffering or after the flush.
+    """
+
+    def __init__(self, repository: FeedbackRepository, max_items: int = 25, max_delay: float = 0.05):
+        self._repository = repository
+        self._max_items = max_items
+        self._max_delay = max_delay
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: set = set()
+
+    def submit(self, item: Dict[str, Any]) -> asyncio.Future:
+        """Buffers an item and returns the future of its write."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self._max_items:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._max_delay, self._flush)
+        return future
+
+    async def put(self, item: Dict[str, Any], wait_for_flush: bool = True):
+        future = self.submit(item)
+        if wait_for_flush:
+            await future
+        else:
+            future.add_done_callback(_log_failure)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch, self._pending = self._pending[:self._max_items], self._pending[self._max_items:]
+            task = asyncio.get_running_loop().create_task(self._write(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _write(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        try:
+            await self._repository.batch_put([item for item, _ in batch])
+        except Exception as e:
+            logger.error(f"Buffered write of {len(batch)} items failed: {str(e)}")
+            stored = {item["id"] for item in e.written} if isinstance(e, BatchWriteError) else set()
+            for item, future in batch:
+                if not future.done():
+                    if item["id"] in stored:
+                        future.set_result(True)
+                    else:
+                        future.set_exception(e)
+            return
+        for _, future in batch:
+            if not future.done():
+                future.set_result(True)
+
+    async def close(self):
+        """Flushes everything still buffered and waits for in-flight batches."""
+        self._flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+def _log_failure(future: asyncio.Future):
+    # Items acknowledged at buffer time have no caller left to report to
+    if not future.cancelled() and future.exception():
+        logger.error(f"Acknowledged feedback was not stored: {str(future.exception())}")
+
+write_buffer = WriteBuffer(feedback_repository, max_delay=settings.WRITE_BUFFER_MAX_DELAY_MS / 1000)
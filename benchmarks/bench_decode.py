@@ -0,0 +1,83 @@
+"""
+Compares decoding a window of DynamoDB items into analytics records: the previous resource-client path
+(Decimal deserialization + validated Feedback models + sort) against parse_item + to_records.
+
+    python -m benchmarks.bench_decode --sizes 10000 100000 1000000
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List
+from boto3.dynamodb.types import TypeDeserializer
+from app.core.db import parse_item
+from app.models.feedback import Feedback
+from app.services.repository import to_records
+
+COMMENTS = ["", "Buen servicio", "Demora en la entrega", "El helado llegó derretido", "Excelente sabor y atención"]
+
+def make_wire_items(count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """Items as the low-level client returns them, projected to the analytics fields."""
+    rng = random.Random(seed)
+    days = [(date(2024, 1, 1) + timedelta(days=offset)).isoformat() for offset in range(730)]
+    items = []
+    for _ in range(count):
+        item = {
+            "date": {"S": rng.choice(days)},
+            "nps": {"N": str(rng.randint(0, 10))},
+            "csat": {"N": str(rng.randint(1, 5))},
+            "ces": {"N": str(rng.randint(1, 5))},
+        }
+        comment = rng.choice(COMMENTS)
+        if comment:
+            item["comment"] = {"S": comment}
+        items.append(item)
+    return items
+
+def legacy_decode(raw_items: List[Dict[str, Any]]) -> List[Feedback]:
+    """What the resource client and the previous get_filtered_feedbacks did per item."""
+    deserializer = TypeDeserializer()
+    items = [{name: deserializer.deserialize(value) for name, value in raw.items()} for raw in raw_items]
+    feedbacks = [
+        Feedback(
+            id=item.get("id", ""),
+            date=date.fromisoformat(item["date"]),
+            nps=int(item["nps"]),
+            csat=int(item["csat"]),
+            ces=int(item["ces"]),
+            comment=item.get("comment"),
+            topic=item.get("topic"),
+        )
+        for item in items
+    ]
+    feedbacks.sort(key=lambda x: x.date)
+    return feedbacks
+
+def fast_decode(raw_items: List[Dict[str, Any]]) -> list:
+    return to_records([parse_item(raw) for raw in raw_items])
+
+def best_of(func, items, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(items)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'legacy (rows/s)':>16} {'fast (rows/s)':>14} {'speedup':>8}")
+    for size in args.sizes:
+        items = make_wire_items(size)
+        legacy, fast = legacy_decode(items), fast_decode(items)
+        assert [(f.date, f.nps, f.csat, f.ces, f.comment) for f in legacy] == [(r.date, r.nps, r.csat, r.ces, r.comment) for r in fast], "results differ"
+        legacy_time = best_of(legacy_decode, items, args.repeat)
+        fast_time = best_of(fast_decode, items, args.repeat)
+        print(f"{size:>10} {size / legacy_time:>16,.0f} {size / fast_time:>14,.0f} {legacy_time / fast_time:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
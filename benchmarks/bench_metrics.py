@@ -0,0 +1,106 @@
+"""
+Compares the columnar MetricsService kernel against the previous list-comprehension implementation.
+
+    python -m benchmarks.bench_metrics --sizes 10000 100000 1000000
+"""
+import argparse
+import random
+import time
+from typing import Dict, List
+from app.services.metrics import FeedbackColumns, MetricsService
+
+class Row:
+    """Minimal stand-in for Feedback: the metrics only read attributes, and 1M Pydantic models would dominate memory."""
+    __slots__ = ("nps", "csat", "ces", "comment")
+
+    def __init__(self, nps: int, csat: int, ces: int, comment: str):
+        self.nps = nps
+        self.csat = csat
+        self.ces = ces
+        self.comment = comment
+
+class LegacyMetricsService:
+    """The multi-pass implementation MetricsService replaced, kept as the benchmark baseline."""
+
+    @staticmethod
+    def calculate_nps(feedbacks) -> Dict:
+        total = len(feedbacks)
+        promoters = len([f for f in feedbacks if f.nps >= 9])
+        neutral = len([f for f in feedbacks if 7 <= f.nps <= 8])
+        detractors = len([f for f in feedbacks if f.nps <= 6])
+        score = int(((promoters - detractors) / total) * 100)
+        return {"score": score, "promoters": promoters, "neutrals": neutral, "detractors": detractors, "total": total}
+
+    @staticmethod
+    def calculate_csat(feedbacks) -> Dict:
+        total = len(feedbacks)
+        satisfied = len([f for f in feedbacks if f.csat >= 4])
+        neutral = len([f for f in feedbacks if f.csat == 3])
+        unsatisfied = len([f for f in feedbacks if f.csat <= 2])
+        avg_score = sum([f.csat for f in feedbacks]) / total
+        csat_pct = (satisfied / total) * 100
+        return {"score": round(avg_score, 2), "percentage": round(csat_pct, 2), "satisfied": satisfied,
+                "neutral": neutral, "unsatisfied": unsatisfied, "total": total}
+
+    @staticmethod
+    def calculate_ces(feedbacks) -> Dict:
+        total = len(feedbacks)
+        low = len([f for f in feedbacks if f.ces <= 2])
+        medium = len([f for f in feedbacks if f.ces == 3])
+        high = len([f for f in feedbacks if f.ces >= 4])
+        avg_score = sum([f.ces for f in feedbacks]) / total
+        return {"score": round(avg_score, 2), "low_effort": low, "medium_effort": medium, "high_effort": high, "total": total}
+
+    @staticmethod
+    def get_critical_segments(feedbacks) -> Dict:
+        high_effort_detractors = [f for f in feedbacks if f.ces >= 4 and f.nps <= 6]
+        low_effort_promoters = [f for f in feedbacks if f.ces <= 2 and f.nps >= 9]
+        return {
+            "high_effort_detractors": {"count": len(high_effort_detractors), "label": "Detractores con alto esfuerzo",
+                                       "comments": [f.comment for f in high_effort_detractors if f.comment][:5]},
+            "low_effort_promoters": {"count": len(low_effort_promoters), "label": "Promotores con bajo esfuerzo",
+                                     "comments": [f.comment for f in low_effort_promoters if f.comment][:5]},
+        }
+
+    @classmethod
+    def get_all_metrics(cls, feedbacks) -> Dict:
+        return {
+            "nps": cls.calculate_nps(feedbacks),
+            "csat": cls.calculate_csat(feedbacks),
+            "ces": cls.calculate_ces(feedbacks),
+            "segments": cls.get_critical_segments(feedbacks),
+        }
+
+def make_rows(count: int, seed: int = 42) -> List[Row]:
+    rng = random.Random(seed)
+    return [
+        Row(rng.randint(0, 10), rng.randint(1, 5), rng.randint(1, 5), rng.choice(["", "Buen servicio", "Demora en la entrega"]))
+        for _ in range(count)
+    ]
+
+def best_of(func, rows, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(rows)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # "kernel" excludes loading the columns from row objects, which callers holding columns already skip
+    print(f"{'rows':>10} {'legacy (ms)':>12} {'columnar (ms)':>14} {'kernel (ms)':>12} {'speedup':>8}")
+    for size in args.sizes:
+        rows = make_rows(size)
+        assert MetricsService.get_all_metrics(rows) == LegacyMetricsService.get_all_metrics(rows), "results differ"
+        legacy = best_of(LegacyMetricsService.get_all_metrics, rows, args.repeat)
+        columnar = best_of(MetricsService.get_all_metrics, rows, args.repeat)
+        kernel = best_of(MetricsService.metrics_from_columns, FeedbackColumns.from_feedbacks(rows), args.repeat)
+        print(f"{size:>10} {legacy * 1000:>12.1f} {columnar * 1000:>14.1f} {kernel * 1000:>12.1f} {legacy / columnar:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
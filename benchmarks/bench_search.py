@@ -0,0 +1,85 @@
+"""
+Keyword filter over feedback comments: the inverted comment index against analyzing every comment of the
+window. Also reports indexing throughput and the size of the compressed posting lists.
+
+    python -m benchmarks.bench_search --sizes 10000 100000 1000000 --query entrega
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, List
+from app.services.search import CommentIndex, analyze
+
+WORDS = [
+    "entrega", "entregas", "demora", "helado", "derretido", "sabor", "excelente", "atención", "servicio", "precio",
+    "caro", "rápido", "tarde", "frío", "vainilla", "chocolate", "repartidor", "amable", "pedido", "incompleto",
+    "cucharita", "envase", "app", "pago", "tarjeta", "promoción", "cupón", "sucursal", "limpia", "fila",
+]
+
+def make_items(count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    days = [(date(2024, 1, 1) + timedelta(days=offset)).isoformat() for offset in range(730)]
+    return [
+        {
+            "id": str(index),
+            "date": rng.choice(days),
+            "nps": rng.randint(0, 10),
+            "csat": rng.randint(1, 5),
+            "ces": rng.randint(1, 5),
+            "comment": " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 12))),
+        }
+        for index in range(count)
+    ]
+
+def brute_force(items: List[Dict[str, Any]], terms: List[str], start: str, end: str) -> int:
+    """What a keyword filter costs without the index: every comment of the window is analyzed."""
+    wanted = set(terms)
+    return sum(1 for item in items if start <= item["date"] <= end and wanted <= set(analyze(item["comment"])))
+
+def best_of(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--query", default="entrega")
+    parser.add_argument("--start", type=date.fromisoformat, default=date(2024, 7, 1))
+    parser.add_argument("--end", type=date.fromisoformat, default=date(2024, 9, 30))
+    parser.add_argument("--batch-size", type=int, default=5000, help="Items per index write (as in ingestion chunks)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    terms = analyze(args.query)
+
+    print(f"{'rows':>10} {'index (rows/s)':>15} {'bytes/posting':>14} {'matches':>8} {'scan (ms)':>10} {'index (ms)':>11} {'speedup':>8}")
+    for size in args.sizes:
+        items = make_items(size)
+        with tempfile.TemporaryDirectory() as directory:
+            index = CommentIndex(os.path.join(directory, "search.db"), merge_rows=32)
+            started = time.perf_counter()
+            for chunk in range(0, size, args.batch_size):
+                index.add(items[chunk:chunk + args.batch_size])
+            index.compact()
+            indexing = time.perf_counter() - started
+            postings = sum(len(analyze(item["comment"])) for item in items)
+            stats = index.stats()
+
+            matches = len(index.records(terms, args.start, args.end))
+            assert matches == brute_force(items, terms, args.start.isoformat(), args.end.isoformat()), "results differ"
+            scan_time = best_of(lambda: brute_force(items, terms, args.start.isoformat(), args.end.isoformat()), args.repeat)
+            index_time = best_of(lambda: index.records(terms, args.start, args.end), args.repeat)
+            index.close()
+        print(
+            f"{size:>10} {size / indexing:>15,.0f} {stats['posting_bytes'] / postings:>14.2f} {matches:>8} "
+            f"{scan_time * 1000:>10.1f} {index_time * 1000:>11.1f} {scan_time / index_time:>7.1f}x"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+Offline load test of every /api/v1 endpoint against in-process DynamoDB and OpenAI stand-ins (see benchmarks.stubs).
+
+Each dataset size runs in its own process, so peak RSS is comparable between sizes. The result is one JSON
+document with throughput, p50/p95/p99 latency and peak RSS per endpoint, meant to be diffed between commits:
+
+    python -m benchmarks.load_test --rows 10000 100000 1000000 --concurrency 16 --requests 200 --output before.json
+    python -m benchmarks.load_test --rows 100000 --endpoints overview dashboard --llm-latency 0.8 --llm-error-rate 0.05
+
+`--refresh` adds `refresh=true` to the insight endpoints, so every request pays the full read + LLM cost instead of
+being served by the response and LLM caches.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Tuple
+from urllib.parse import parse_qsl
+import numpy as np
+
+COMMENTS = [
+    "", "", "",
+    "Excelente sabor y atención muy amable",
+    "El helado llegó derretido y tarde",
+    "La app se cierra al pagar con tarjeta",
+    "Buen servicio pero los precios subieron mucho",
+    "Demora en la entrega, más de una hora",
+    "Me encantó el nuevo sabor de temporada",
+    "El pedido llegó incompleto, faltó un producto",
+    "Atención lenta en la tienda del centro",
+    "Promociones muy buenas, volveré a comprar",
+    "Difícil encontrar el botón para aplicar el cupón",
+]
+
+# name -> (method, path, takes the date window, is an LLM-backed insight)
+ENDPOINTS: Dict[str, Tuple[str, str, bool, bool]] = {
+    "overview": ("GET", "/insights/overview", True, True),
+    "metrics": ("GET", "/insights/metrics", True, False),
+    "timeseries": ("GET", "/insights/timeseries", True, False),
+    "nps": ("GET", "/insights/nps", True, True),
+    "csat": ("GET", "/insights/csat", True, True),
+    "ces": ("GET", "/insights/ces", True, True),
+    "drivers": ("GET", "/insights/drivers", True, True),
+    "topics": ("GET", "/insights/topics", True, True),
+    "segments": ("GET", "/insights/segments", True, True),
+    "action_plans": ("GET", "/insights/action-plans", True, True),
+    "dashboard": ("GET", "/insights/dashboard", True, True),
+    "search": ("GET", "/feedback/search?q=entrega", True, False),
+    "metrics_q": ("GET", "/insights/metrics?q=entrega", True, False),
+    "cache_stats": ("GET", "/insights/cache", False, False),
+    "llm_status": ("GET", "/insights/llm", False, False),
+    # Writes last: they bump the data version and would otherwise turn later reads into cache misses
+    "feedback": ("POST", "/feedback", False, False),
+    "feedback_batch": ("POST", "/feedback/batch", False, False),
+}
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return round(peak / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+def random_record(rng: random.Random, days: List[str]) -> Dict[str, Any]:
+    return {"date": rng.choice(days), "nps": rng.randint(0, 10), "csat": rng.randint(1, 5), "ces": rng.randint(1, 5), "comment": rng.choice(COMMENTS)}
+
+def seed(stub, rows: int, days: List[str], seed_value: int) -> int:
+    """Loads `rows` synthetic feedback items and their daily rollups straight into the stub tables, and indexes their comments."""
+    from app.core import db
+    from app.core.config import settings
+    from app.services import rollups
+    from app.services.search import search_index
+    from app.services.topics import topic_engine
+
+    rng = random.Random(seed_value)
+    scores = [Decimal(value) for value in range(11)]
+    annotations = {comment: topic_engine.annotate(comment) for comment in COMMENTS}
+    items = []
+    for _ in range(rows):
+        record = random_record(rng, days)
+        items.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "date": record["date"],
+            "date_bucket": db.date_bucket(record["date"]),
+            "nps": scores[record["nps"]],
+            "csat": scores[record["csat"]],
+            "ces": scores[record["ces"]],
+            "comment": record["comment"],
+            **annotations[record["comment"]],
+        })
+    stub.load(settings.DYNAMODB_TABLE_NAME, items)
+    for chunk in range(0, len(items), settings.INGEST_CHUNK_SIZE):
+        search_index.add(items[chunk:chunk + settings.INGEST_CHUNK_SIZE])
+    # Every stored item is indexed, as after `build-search-index`
+    search_index.mark_backfilled()
+
+    deltas = rollups.daily_deltas(items)
+    stub.load(settings.DYNAMODB_ROLLUP_TABLE_NAME, [
+        {"month": db.date_bucket(day), "day": day, **counters} for day, counters in deltas.items()
+    ])
+    return len(deltas)
+
+def request_factory(name: str, args: argparse.Namespace, days: List[str]) -> Callable[[random.Random], Dict[str, Any]]:
+    """Builds the httpx request arguments of one call to endpoint `name`."""
+    method, path, windowed, insight = ENDPOINTS[name]
+    # Fixed query parameters are written in the path (e.g. the keyword of the search endpoints)
+    path, _, query = path.partition("?")
+    params: Dict[str, Any] = dict(parse_qsl(query))
+    if windowed:
+        params["start_date"], params["end_date"] = days[-args.window_days], days[-1]
+    if insight:
+        params["mode"] = args.mode
+        if args.refresh:
+            params["refresh"] = "true"
+
+    def build(rng: random.Random) -> Dict[str, Any]:
+        request: Dict[str, Any] = {"method": method, "url": f"/api/v1{path}", "params": params}
+        if name == "feedback":
+            request["json"] = random_record(rng, days)
+        elif name == "feedback_batch":
+            request["json"] = [random_record(rng, days) for _ in range(args.batch_size)]
+        return request
+    return build
+
+def summarize(latencies: List[float], statuses: List[int], elapsed: float) -> Dict[str, Any]:
+    values = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    status_counts: Dict[str, int] = {}
+    for status in statuses:
+        status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+    return {
+        "requests": len(latencies),
+        "errors": sum(1 for status in statuses if status >= 400),
+        "statuses": status_counts,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "latency_ms": {
+            "mean": round(float(values.mean()), 2),
+            "p50": round(float(p50), 2),
+            "p95": round(float(p95), 2),
+            "p99": round(float(p99), 2),
+            "max": round(float(values.max()), 2),
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+async def drive(client, build: Callable[[random.Random], Dict[str, Any]], total: int, concurrency: int, seed_value: int) -> Dict[str, Any]:
+    """Sends `total` requests from `concurrency` workers, each starting its next request as soon as one returns."""
+    latencies: List[float] = []
+    statuses: List[int] = []
+    remaining = total
+
+    async def worker(index: int):
+        nonlocal remaining
+        rng = random.Random(seed_value + index)
+        while remaining > 0:
+            remaining -= 1
+            request = build(rng)
+            started = time.perf_counter()
+            response = await client.request(**request)
+            await response.aread()
+            latencies.append(time.perf_counter() - started)
+            statuses.append(response.status_code)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    return summarize(latencies, statuses, time.perf_counter() - started)
+
+async def run_size(args: argparse.Namespace, rows: int) -> Dict[str, Any]:
+    # Settings are read at import time, so the stand-ins' environment must be in place before the app is imported
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    os.environ.setdefault("OPENAI_MAX_REQUESTS_PER_SECOND", "1000")
+    os.environ["LLM_CACHE_PATH"] = ""
+    os.environ["SEARCH_INDEX_PATH"] = os.path.join(tempfile.mkdtemp(prefix="search-"), "search_index.db")
+    import httpx
+    from app.api import endpoints
+    from app.core import db
+    from app.main import app
+    from benchmarks.stubs import FakeAsyncOpenAI, StubDynamoDB
+
+    stub = StubDynamoDB(latency=args.db_latency)
+    db._resource = stub
+    db._raw_client = stub.raw_client
+    fake_openai = FakeAsyncOpenAI(latency=args.llm_latency, error_rate=args.llm_error_rate, seed=args.seed)
+    endpoints.ai_service.client = fake_openai
+
+    today = date.today()
+    days = [(today - timedelta(days=offset)).isoformat() for offset in range(args.days - 1, -1, -1)]
+    result: Dict[str, Any] = {"rows": rows, "endpoints": {}}
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter()
+        result["rollup_days"] = seed(stub, rows, days, args.seed)
+        result["seed_seconds"] = round(time.perf_counter() - started, 2)
+        if args.snapshot:
+            from app.services.snapshot import analytics_snapshot, build_snapshot
+            analytics_snapshot.path = tempfile.mkdtemp(prefix="snapshot-")
+            started = time.perf_counter()
+            build_snapshot(analytics_snapshot.path)
+            result["snapshot_seconds"] = round(time.perf_counter() - started, 2)
+        result["rss_after_seed_mb"] = peak_rss_mb()
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            for name in args.endpoints:
+                build = request_factory(name, args, days)
+                if args.warmup:
+                    await drive(client, build, args.warmup, 1, args.seed)
+                result["endpoints"][name] = await drive(client, build, args.requests, args.concurrency, args.seed)
+                print(f"{rows:>9} rows | {name:<15} {json.dumps(result['endpoints'][name]['latency_ms'])}", file=sys.stderr)
+
+    result["dynamodb_calls"] = dict(stub.meta.client.calls)
+    result["openai"] = {"calls": fake_openai.calls, "errors": fake_openai.errors}
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+# Options passed unchanged to every per-size run
+RUN_OPTIONS = ("concurrency", "requests", "warmup", "days", "window_days", "mode", "batch_size", "db_latency", "llm_latency", "llm_error_rate", "seed")
+
+def child_arguments(args: argparse.Namespace) -> List[str]:
+    arguments = ["--endpoints", *args.endpoints]
+    for option in RUN_OPTIONS:
+        arguments += [f"--{option.replace('_', '-')}", str(getattr(args, option))]
+    if args.refresh:
+        arguments.append("--refresh")
+    if args.snapshot:
+        arguments.append("--snapshot")
+    return arguments
+
+def run_in_subprocess(args: argparse.Namespace, rows: int) -> Dict[str, Any]:
+    """Runs one dataset size in a fresh interpreter; the app logs to stdout, so the result comes back in a file."""
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "result.json")
+        command = [sys.executable, "-m", "benchmarks.load_test", "--single-run", str(rows), "--output", output, *child_arguments(args)]
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        with open(output) as file:
+            return json.load(file)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=5, help="sequential requests per endpoint before measuring")
+    parser.add_argument("--days", type=int, default=365, help="the seeded feedback spans this many days up to today")
+    parser.add_argument("--window-days", type=int, default=90, help="date window of the insight endpoints")
+    parser.add_argument("--mode", choices=["fast", "llm", "auto"], default="llm")
+    parser.add_argument("--refresh", action="store_true", help="bypass the response and LLM caches")
+    parser.add_argument("--snapshot", action="store_true", help="serve the insight reads from an analytics snapshot built after seeding")
+    parser.add_argument("--batch-size", type=int, default=100, help="records per /feedback/batch request")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="seconds added to every DynamoDB call")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds per OpenAI call")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="share of OpenAI calls failing with a 500")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    parser.add_argument("--single-run", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single_run is not None:
+        result = asyncio.run(run_size(args, args.single_run))
+        with open(args.output, "w") as file:
+            json.dump(result, file)
+        return
+
+    report = {
+        "commit": subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None,
+        "python": platform.python_version(),
+        "settings": {option: getattr(args, option) for option in ("endpoints", "refresh", "snapshot", *RUN_OPTIONS)},
+        "runs": [run_in_subprocess(args, rows) for rows in args.rows],
+    }
+    document = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(document + "\n")
+    else:
+        print(document)
+
+if __name__ == "__main__":
+    main()
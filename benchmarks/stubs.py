@@ -0,0 +1,402 @@
+"""
+In-process stand-ins for DynamoDB and OpenAI, so benchmarks run offline and measure this service rather than the network.
+
+`StubDynamoDB` replaces the boto3 resource returned by `db.get_dynamodb_resource()`. It implements the subset of the
+low-level client the app uses (Scan with segments, Query on the table and the date index, PutItem, TransactWriteItems,
+BatchWriteItem, BatchGetItem, UpdateItem, GetItem) over in-memory dicts. Values come back deserialized like the
+resource client's (numbers as Decimal, binary as Binary); `raw_client` serves the same reads in wire format, like the
+plain low-level client. botocore's HTTP and JSON parsing cost itself is not simulated.
+
+`FakeAsyncOpenAI` answers chat completions after a configurable latency and fails a configurable share of them
+with a retryable 500, with a body that satisfies every JSON prompt of AIService.
+"""
+import asyncio
+import bisect
+import json
+import random
+import re
+import threading
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+import httpx
+import openai
+from boto3.dynamodb.types import Binary, TypeDeserializer, TypeSerializer
+
+# Rough DynamoDB item size, for consumed capacity (0.5 RCU per 4 KB read with eventual consistency)
+ITEM_SIZE_ESTIMATE = 200
+
+_CLAUSE = re.compile(
+    r"(?P<between>#\w+) BETWEEN (?P<low>:\w+) AND (?P<high>:\w+)"
+    r"|(?P<attr>#\w+) (?P<op><=|>=|=|<|>) (?P<value>:\w+)"
+    r"|attribute_not_exists\((?P<missing>#\w+)\)"
+)
+_OPERATORS = {
+    "=": lambda a, b: a == b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+
+def _normalize(value: Any) -> Any:
+    """What a value looks like after a round trip through the resource client."""
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return Decimal(str(value))
+    if isinstance(value, (bytes, bytearray)):
+        return Binary(bytes(value))
+    return value
+
+def compile_condition(expression: Optional[str], names: Dict[str, str], values: Dict[str, Any]):
+    """Predicate for the AND-joined comparisons, BETWEEN and attribute_not_exists clauses the app emits."""
+    if not expression:
+        return lambda item: True
+    checks = []
+    position = 0
+    for match in _CLAUSE.finditer(expression):
+        separator = expression[position:match.start()].strip()
+        if separator not in ("", "AND"):
+            raise NotImplementedError(f"Unsupported condition: {expression}")
+        position = match.end()
+        if match["between"]:
+            attribute, low, high = names[match["between"]], values[match["low"]], values[match["high"]]
+            checks.append(lambda item, a=attribute, l=low, h=high: a in item and l <= item[a] <= h)
+        elif match["attr"]:
+            attribute, compare, operand = names[match["attr"]], _OPERATORS[match["op"]], values[match["value"]]
+            checks.append(lambda item, a=attribute, c=compare, o=operand: a in item and c(item[a], o))
+        else:
+            attribute = names[match["missing"]]
+            checks.append(lambda item, a=attribute: a not in item)
+    if expression[position:].strip():
+        raise NotImplementedError(f"Unsupported condition: {expression}")
+    return lambda item: all(check(item) for check in checks)
+
+class StubTable:
+    def __init__(self, key_schema: List[Dict[str, str]], indexes: List[Dict[str, Any]]):
+        self.hash_key = next(key["AttributeName"] for key in key_schema if key["KeyType"] == "HASH")
+        self.range_key = next((key["AttributeName"] for key in key_schema if key["KeyType"] == "RANGE"), None)
+        self.items: Dict[Tuple, Dict[str, Any]] = {}
+        self._ordered: Optional[List[Dict[str, Any]]] = None
+        # Index name -> (hash attribute, range attribute, {hash value: sorted [(range value, key)]})
+        self.indexes: Dict[str, Tuple[str, str, Dict[Any, List[Tuple[Any, Tuple]]]]] = {}
+        for index in indexes:
+            schema = {key["KeyType"]: key["AttributeName"] for key in index["KeySchema"]}
+            self.indexes[index["IndexName"]] = (schema["HASH"], schema["RANGE"], {})
+
+    def key_of(self, item: Dict[str, Any]) -> Tuple:
+        return (item[self.hash_key], item[self.range_key]) if self.range_key else (item[self.hash_key],)
+
+    def ordered(self) -> List[Dict[str, Any]]:
+        if self._ordered is None:
+            self._ordered = list(self.items.values())
+        return self._ordered
+
+    def _unindex(self, key: Tuple):
+        old = self.items.get(key)
+        if old is None:
+            return
+        for hash_attr, range_attr, partitions in self.indexes.values():
+            if hash_attr in old and range_attr in old:
+                partition = partitions[old[hash_attr]]
+                partition.pop(bisect.bisect_left(partition, (old[range_attr], key)))
+
+    def put(self, item: Dict[str, Any]):
+        item = {name: _normalize(value) for name, value in item.items()}
+        key = self.key_of(item)
+        self._unindex(key)
+        self.items[key] = item
+        self._ordered = None
+        for hash_attr, range_attr, partitions in self.indexes.values():
+            if hash_attr in item and range_attr in item:
+                bisect.insort(partitions.setdefault(item[hash_attr], []), (item[range_attr], key))
+
+    def delete(self, key_item: Dict[str, Any]):
+        key = self.key_of(key_item)
+        self._unindex(key)
+        if self.items.pop(key, None) is not None:
+            self._ordered = None
+
+class StubClient:
+    """Low-level client subset used by app.core.db and app.services.rollups. Thread-safe through one lock."""
+
+    class exceptions:
+        class ResourceInUseException(Exception):
+            pass
+
+        class TransactionCanceledException(Exception):
+            pass
+
+        class ConditionalCheckFailedException(Exception):
+            pass
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.tables: Dict[str, StubTable] = {}
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _call(self, operation: str):
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _page(self, table: StubTable, candidates: List[Dict[str, Any]], params: Dict[str, Any]) -> Dict[str, Any]:
+        """Applies ExclusiveStartKey/Limit, the filter and the projection to a read's candidates."""
+        names = params.get("ExpressionAttributeNames", {})
+        values = params.get("ExpressionAttributeValues", {})
+        start = (params.get("ExclusiveStartKey") or {}).get("__position", 0)
+        limit = params.get("Limit") or len(candidates)
+        page = candidates[start:start + limit]
+        matches = compile_condition(params.get("FilterExpression"), names, values)
+        projection = [names.get(name.strip(), name.strip()) for name in params["ProjectionExpression"].split(",")] \
+            if params.get("ProjectionExpression") else None
+
+        items = []
+        for item in page:
+            if matches(item):
+                items.append({name: item[name] for name in projection if name in item} if projection else dict(item))
+        response: Dict[str, Any] = {"Items": items, "Count": len(items), "ScannedCount": len(page)}
+        if start + limit < len(candidates):
+            # Opaque to callers, which only pass it back
+            response["LastEvaluatedKey"] = {"__position": start + limit}
+        if params.get("ReturnConsumedCapacity"):
+            units = max(0.5, len(page) * ITEM_SIZE_ESTIMATE / 4096 * 0.5)
+            response["ConsumedCapacity"] = {"TableName": params["TableName"], "CapacityUnits": units}
+        return response
+
+    def scan(self, **params) -> Dict[str, Any]:
+        self._call("scan")
+        with self._lock:
+            table = self.tables[params["TableName"]]
+            candidates = table.ordered()[params.get("Segment", 0)::params.get("TotalSegments", 1)]
+        return self._page(table, candidates, params)
+
+    def query(self, **params) -> Dict[str, Any]:
+        self._call("query")
+        names = params.get("ExpressionAttributeNames", {})
+        values = params.get("ExpressionAttributeValues", {})
+        with self._lock:
+            table = self.tables[params["TableName"]]
+            if "IndexName" in params:
+                hash_attr, range_attr, partitions = table.indexes[params["IndexName"]]
+            else:
+                hash_attr, range_attr, partitions = table.hash_key, table.range_key, None
+            condition = params["KeyConditionExpression"]
+            hash_value = next(values[match["value"]] for match in _CLAUSE.finditer(condition) if match["attr"] and names[match["attr"]] == hash_attr)
+            matches = compile_condition(condition, names, values)
+            if partitions is not None:
+                candidates = [table.items[key] for _, key in partitions.get(hash_value, [])]
+            else:
+                candidates = sorted((item for item in table.items.values() if item[hash_attr] == hash_value), key=lambda item: item[range_attr])
+            candidates = [item for item in candidates if matches(item)]
+        return self._page(table, candidates, dict(params, FilterExpression=None))
+
+    def _write_capacity(self, params: Dict[str, Any], units: float) -> Dict[str, Any]:
+        if not params.get("ReturnConsumedCapacity"):
+            return {}
+        return {"ConsumedCapacity": [{"CapacityUnits": units}]}
+
+    def put_item(self, **params) -> Dict[str, Any]:
+        self._call("put_item")
+        with self._lock:
+            self.tables[params["TableName"]].put(params["Item"])
+        response = self._write_capacity(params, 1.0)
+        if response:
+            response["ConsumedCapacity"] = response["ConsumedCapacity"][0]
+        return response
+
+    def get_item(self, **params) -> Dict[str, Any]:
+        self._call("get_item")
+        with self._lock:
+            table = self.tables[params["TableName"]]
+            item = table.items.get(table.key_of(params["Key"]))
+        return {"Item": dict(item)} if item is not None else {}
+
+    def batch_get_item(self, RequestItems: Dict[str, Dict[str, Any]], **params) -> Dict[str, Any]:
+        self._call("batch_get_item")
+        responses: Dict[str, List[Dict[str, Any]]] = {}
+        with self._lock:
+            for table_name, request in RequestItems.items():
+                table = self.tables[table_name]
+                names = request.get("ExpressionAttributeNames", {})
+                projection = [names.get(name.strip(), name.strip()) for name in request["ProjectionExpression"].split(",")] \
+                    if request.get("ProjectionExpression") else None
+                found = (table.items.get(table.key_of(key)) for key in request["Keys"])
+                responses[table_name] = [
+                    {name: item[name] for name in projection if name in item} if projection else dict(item)
+                    for item in found if item is not None
+                ]
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+    def _update(self, params: Dict[str, Any]):
+        table = self.tables[params["TableName"]]
+        key = table.key_of(params["Key"])
+        item = dict(table.items.get(key, params["Key"]))
+        names = params.get("ExpressionAttributeNames", {})
+        values = params.get("ExpressionAttributeValues", {})
+        action, _, assignments = params["UpdateExpression"].partition(" ")
+        for assignment in assignments.split(","):
+            if action == "ADD":
+                name, placeholder = assignment.split()
+                item[names[name]] = item.get(names[name], 0) + values[placeholder]
+            elif action == "SET":
+                name, _, placeholder = (part.strip() for part in assignment.partition("="))
+                item[names[name]] = values[placeholder]
+            else:
+                raise NotImplementedError(f"Unsupported update: {params['UpdateExpression']}")
+        table.put(item)
+
+    def update_item(self, **params) -> Dict[str, Any]:
+        self._call("update_item")
+        with self._lock:
+            if params.get("ConditionExpression"):
+                table = self.tables[params["TableName"]]
+                current = table.items.get(table.key_of(params["Key"]), {})
+                condition = compile_condition(params["ConditionExpression"], params.get("ExpressionAttributeNames", {}), params.get("ExpressionAttributeValues", {}))
+                if not condition(current):
+                    raise self.exceptions.ConditionalCheckFailedException("ConditionalCheckFailed")
+            self._update(params)
+        return self._write_capacity(params, 1.0)
+
+    def transact_write_items(self, TransactItems: List[Dict[str, Any]], **params) -> Dict[str, Any]:
+        self._call("transact_write_items")
+        with self._lock:
+            for request in TransactItems:
+                put = request.get("Put")
+                if put and put.get("ConditionExpression"):
+                    table = self.tables[put["TableName"]]
+                    current = table.items.get(table.key_of(put["Item"]), {})
+                    if not compile_condition(put["ConditionExpression"], put.get("ExpressionAttributeNames", {}), {})(current):
+                        raise self.exceptions.TransactionCanceledException("ConditionalCheckFailed")
+            for request in TransactItems:
+                if "Put" in request:
+                    self.tables[request["Put"]["TableName"]].put(request["Put"]["Item"])
+                else:
+                    self._update(request["Update"])
+        return self._write_capacity(params, 2.0 * len(TransactItems))
+
+    def batch_write_item(self, RequestItems: Dict[str, List[Dict[str, Any]]], **params) -> Dict[str, Any]:
+        self._call("batch_write_item")
+        written = 0
+        with self._lock:
+            for table_name, requests in RequestItems.items():
+                table = self.tables[table_name]
+                for request in requests:
+                    if "PutRequest" in request:
+                        table.put(request["PutRequest"]["Item"])
+                    else:
+                        table.delete(request["DeleteRequest"]["Key"])
+                    written += 1
+        return {"UnprocessedItems": {}, **self._write_capacity(params, float(written))}
+
+    def describe_table(self, TableName: str) -> Dict[str, Any]:
+        table = self.tables[TableName]
+        indexes = [{"IndexName": name, "IndexStatus": "ACTIVE"} for name in table.indexes]
+        return {"Table": {"TableName": TableName, "GlobalSecondaryIndexes": indexes}}
+
+    def close(self):
+        pass
+
+def _to_wire(value: Any) -> Dict[str, Any]:
+    if isinstance(value, str):
+        return {"S": value}
+    if isinstance(value, Decimal):
+        return {"N": str(value)}
+    if isinstance(value, Binary):
+        return {"B": value.value}
+    return _serializer.serialize(value)
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+class StubRawClient:
+    """Wire-format view of a StubClient, standing in for the plain low-level client (`db.get_raw_client()`)."""
+
+    def __init__(self, client: StubClient):
+        self._client = client
+
+    def _read(self, operation, params: Dict[str, Any]) -> Dict[str, Any]:
+        if "ExpressionAttributeValues" in params:
+            values = {name: _deserializer.deserialize(value) for name, value in params["ExpressionAttributeValues"].items()}
+            params = dict(params, ExpressionAttributeValues=values)
+        response = operation(**params)
+        response["Items"] = [{name: _to_wire(value) for name, value in item.items()} for item in response["Items"]]
+        return response
+
+    def scan(self, **params) -> Dict[str, Any]:
+        return self._read(self._client.scan, params)
+
+    def query(self, **params) -> Dict[str, Any]:
+        return self._read(self._client.query, params)
+
+    def close(self):
+        pass
+
+class StubDynamoDB:
+    """Drop-in for the boto3 DynamoDB resource (`create_table`, `Table`, `meta.client`) plus `raw_client`."""
+
+    def __init__(self, latency: float = 0.0):
+        self.meta = SimpleNamespace(client=StubClient(latency))
+        self.raw_client = StubRawClient(self.meta.client)
+
+    def create_table(self, TableName: str, KeySchema: List[Dict[str, str]], GlobalSecondaryIndexes: Optional[List[Dict[str, Any]]] = None, **_):
+        client = self.meta.client
+        if TableName in client.tables:
+            raise client.exceptions.ResourceInUseException(TableName)
+        client.tables[TableName] = StubTable(KeySchema, GlobalSecondaryIndexes or [])
+        return SimpleNamespace(wait_until_exists=lambda: None)
+
+    def Table(self, name: str) -> StubTable:
+        return self.meta.client.tables[name]
+
+    def load(self, table_name: str, items: List[Dict[str, Any]]):
+        """Bulk seeding without per-call latency or accounting."""
+        table = self.meta.client.tables[table_name]
+        for item in items:
+            table.put(item)
+
+# One JSON body that satisfies every structured prompt (summary, drivers, topics, labels, plans, segments)
+FAKE_JSON = {
+    "description": "Clientes con alto esfuerzo y baja recomendación.",
+    "positive_drivers": ["Atención amable", "Calidad del producto"],
+    "negative_drivers": ["Demoras en la entrega", "Pedidos incompletos"],
+    "topics": [{"topic": "Entrega", "mentions": 12}, {"topic": "Sabor", "mentions": 8}],
+    "labels": [],
+    "groups": [],
+    "action_plans": [
+        {"priority": "Alta", "issue": "Demoras en la entrega", "recommendation": "Reforzar la logística en horas pico", "expected_impact": "Menos detractores"}
+    ],
+}
+
+class _FakeCompletions:
+    def __init__(self, owner: "FakeAsyncOpenAI"):
+        self._owner = owner
+
+    async def create(self, model: str, messages: List[Dict[str, str]], **options) -> Any:
+        owner = self._owner
+        owner.calls += 1
+        await asyncio.sleep(owner.latency)
+        if owner.error_rate and owner._random.random() < owner.error_rate:
+            owner.errors += 1
+            request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+            raise openai.InternalServerError("Fake upstream error", response=httpx.Response(500, request=request), body=None)
+
+        structured = (options.get("response_format") or {}).get("type") == "json_object"
+        content = json.dumps(FAKE_JSON, ensure_ascii=False) if structured else "Resumen generado para la prueba de carga."
+        prompt_chars = sum(len(message["content"]) for message in messages)
+        usage = SimpleNamespace(prompt_tokens=prompt_chars // 4, completion_tokens=len(content) // 4)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+class FakeAsyncOpenAI:
+    """Stands in for `AsyncOpenAI`: `latency` seconds per call, a retryable 500 on `error_rate` of the calls."""
+
+    def __init__(self, latency: float = 0.5, error_rate: float = 0.0, seed: int = 42):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
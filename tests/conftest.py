@@ -0,0 +1,27 @@
+import pytest
+from app.core import db
+from app.core.config import settings
+from benchmarks.stubs import StubDynamoDB
+
+@pytest.fixture
+def stub_db(monkeypatch):
+    """In-memory DynamoDB with an empty feedback table, installed as the process-wide resource and raw client."""
+    stub = StubDynamoDB()
+    monkeypatch.setattr(db, "_resource", stub)
+    monkeypatch.setattr(db, "_raw_client", stub.raw_client)
+    stub.create_table(TableName=settings.DYNAMODB_TABLE_NAME, KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}])
+    return stub
+
+@pytest.fixture
+def initialized_db(monkeypatch):
+    """In-memory DynamoDB with every table created by init_db; completion markers and index flags start fresh."""
+    stub = StubDynamoDB()
+    monkeypatch.setattr(db, "_resource", stub)
+    monkeypatch.setattr(db, "_raw_client", stub.raw_client)
+    for name in ("date_buckets_backfilled", "rollups_backfilled"):
+        monkeypatch.setattr(db, name, db.Marker(name))
+    monkeypatch.setattr(db, "rollups_changed", db.Stamp("rollups_changed"))
+    monkeypatch.setattr(db, "_date_index_active", False)
+    monkeypatch.setattr(db, "_ingest_index_active", False)
+    db.init_db()
+    return stub
@@ -0,0 +1,35 @@
+import asyncio
+from datetime import date
+from benchmarks.stubs import FAKE_JSON, FakeAsyncOpenAI
+from app.models.feedback import FeedbackRecord
+from app.services.ai import AIService
+from app.services.rule_insights import AutoInsightService, RuleInsightService
+
+def make_auto() -> AutoInsightService:
+    llm = AIService()
+    llm.client = FakeAsyncOpenAI(latency=0)
+    llm.model = "gpt-4o-mini"
+    return AutoInsightService(llm, RuleInsightService(), timeout=5, full_timeout=5)
+
+def make_feedbacks():
+    return [
+        FeedbackRecord(date(2024, 5, 1), nps, 4, 2, comment)
+        for nps, comment in [(10, "helado delicioso y atención amable"), (2, "entrega tarde y helado derretido")] * 5
+    ]
+
+def test_auto_returns_llm_drivers_when_the_llm_succeeds():
+    drivers = asyncio.run(make_auto().get_drivers(make_feedbacks()))
+    assert drivers["positive_drivers"] == FAKE_JSON["positive_drivers"]
+    assert drivers["negative_drivers"] == FAKE_JSON["negative_drivers"]
+
+def test_auto_returns_llm_topics_and_action_plans_when_the_llm_succeeds():
+    auto = make_auto()
+    feedbacks = make_feedbacks()
+    assert asyncio.run(auto.get_topics(feedbacks)) == FAKE_JSON["topics"]
+    assert asyncio.run(auto.get_action_plans({}, feedbacks)) == FAKE_JSON["action_plans"]
+
+def test_auto_falls_back_to_rules_when_the_llm_is_not_configured():
+    auto = make_auto()
+    auto._llm.client = None
+    feedbacks = make_feedbacks()
+    assert asyncio.run(auto.get_drivers(feedbacks)) == RuleInsightService().drivers(feedbacks)
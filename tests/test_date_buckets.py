@@ -0,0 +1,16 @@
+from app.core.db import date_bucket, month_buckets
+
+def test_date_bucket_is_the_month():
+    assert date_bucket("2024-05-31") == "2024-05"
+
+def test_single_month_window():
+    assert month_buckets("2024-05-01", "2024-05-31") == ["2024-05"]
+
+def test_window_spanning_a_year_end():
+    assert month_buckets("2023-11-15", "2024-02-01") == ["2023-11", "2023-12", "2024-01", "2024-02"]
+
+def test_every_month_overlapping_the_window_is_included():
+    assert month_buckets("2024-01-31", "2024-03-01") == ["2024-01", "2024-02", "2024-03"]
+
+def test_reversed_window_has_no_buckets():
+    assert month_buckets("2024-05-01", "2024-04-30") == []
@@ -0,0 +1,96 @@
+import io
+import json
+import pytest
+from app import ingest_data
+from app.ingest_data import Checkpoint, _iter_json_array, ingest_data as ingest, iter_records
+
+RECORDS = [{"id": index, "comment": "x" * (index % 7), "nested": {"values": [index, "a]b"]}} for index in range(50)]
+
+@pytest.mark.parametrize("read_size", [1, 7, 64, 1 << 20])
+def test_json_array_is_streamed_across_read_boundaries(read_size):
+    text = json.dumps(RECORDS, indent=1)
+    assert list(_iter_json_array(io.StringIO(text), read_size)) == RECORDS
+
+def test_empty_array_and_surrounding_whitespace():
+    assert list(_iter_json_array(io.StringIO("  [ \n ]  "), 2)) == []
+
+def test_truncated_array_raises():
+    with pytest.raises(json.JSONDecodeError):
+        list(_iter_json_array(io.StringIO('[{"id": 1}, {"id": '), 4))
+
+def test_non_array_is_rejected():
+    with pytest.raises(ValueError):
+        list(_iter_json_array(io.StringIO('{"id": 1}')))
+
+def test_format_is_detected_from_the_first_character():
+    assert list(iter_records(io.StringIO(json.dumps(RECORDS[:3])))) == RECORDS[:3]
+    lines = "\n".join(json.dumps(record) for record in RECORDS[:3]) + "\n\n"
+    assert list(iter_records(io.StringIO(lines))) == RECORDS[:3]
+    assert list(iter_records(io.StringIO("   "))) == []
+
+def test_checkpoint_advances_over_the_contiguous_prefix(tmp_path):
+    path = str(tmp_path / "data.json.checkpoint")
+    checkpoint = Checkpoint(path, resume=True)
+    checkpoint.finish(10, 10)
+    assert checkpoint.records == 0
+    checkpoint.finish(0, 10)
+    assert checkpoint.records == 20
+    checkpoint.finish(30, 5)
+
+    resumed = Checkpoint(path, resume=True)
+    assert resumed.records == 20
+    assert resumed.finished_at(30) == 5 and resumed.finished_at(20) == 0
+    assert Checkpoint(path, resume=False).records == 0
+    resumed.clear()
+    assert Checkpoint(path, resume=True).records == 0
+
+def write_dataset(path, count: int):
+    with open(path, "w", encoding="utf-8") as f:
+        for index in range(count):
+            f.write(json.dumps({"id": index, "date": "2024-05-01", "nps": 9, "csat": 4, "ces": 2, "comment": "Bien"}) + "\n")
+
+def test_failed_run_resumes_without_rewriting_finished_chunks(tmp_path, monkeypatch):
+    path = str(tmp_path / "data.jsonl")
+    write_dataset(path, 100)
+    monkeypatch.setattr(ingest_data, "init_db", lambda: None)
+    written = []
+
+    def failing_write(chunk, may_exist=False):
+        first = int(chunk[0]["id"])
+        if first == 20:
+            raise RuntimeError("throttled")
+        written.append(first)
+        return len(chunk)
+
+    monkeypatch.setattr(ingest_data, "write_batch", failing_write)
+    with pytest.raises(RuntimeError):
+        ingest(path, workers=1, chunk_size=10)
+    # One worker writes chunks in order: the ones queued behind the failure were never sent
+    assert written == [0, 10]
+    assert Checkpoint(f"{path}.checkpoint", resume=True).records == 20
+
+    def write(chunk, may_exist=False):
+        written.append(int(chunk[0]["id"]))
+        return len(chunk)
+
+    written.clear()
+    monkeypatch.setattr(ingest_data, "write_batch", write)
+    assert ingest(path, workers=2, chunk_size=10) == 80
+    assert sorted(written) == list(range(20, 100, 10))
+    assert not (tmp_path / "data.jsonl.checkpoint").exists()
+
+def test_chunks_finished_after_a_failure_are_skipped_on_resume(tmp_path, monkeypatch):
+    path = str(tmp_path / "data.jsonl")
+    write_dataset(path, 60)
+    with open(f"{path}.checkpoint", "w", encoding="utf-8") as f:
+        json.dump({"records": 10, "finished": [[20, 10], [40, 10]]}, f)
+    monkeypatch.setattr(ingest_data, "init_db", lambda: None)
+    written = []
+
+    def write(chunk, may_exist=False):
+        written.append([int(item["id"]) for item in chunk])
+        return len(chunk)
+
+    monkeypatch.setattr(ingest_data, "write_batch", write)
+    assert ingest(path, workers=1, chunk_size=10) == 30
+    assert sorted(written) == [list(range(10, 20)), list(range(30, 40)), list(range(50, 60))]
@@ -0,0 +1,116 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from app.services import llm_client
+from app.services.llm_client import CircuitBreaker, DeadlineExceededError, TokenBucket, parse_duration
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_client, "time", SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+@pytest.mark.parametrize("value, seconds", [("20ms", 0.02), ("1s", 1.0), ("6m0s", 360.0), ("1h2m", 3720.0), ("2.5", 2.5)])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == pytest.approx(seconds)
+
+@pytest.mark.parametrize("value", [None, "", "soon"])
+def test_unparseable_duration(value):
+    assert parse_duration(value) is None
+
+def test_bucket_refills_up_to_its_burst(clock):
+    bucket = TokenBucket(max_rate=2, burst=4)
+    bucket._tokens = 0
+    clock.now += 1
+    bucket._refill()
+    assert bucket._tokens == 2
+    clock.now += 10
+    bucket._refill()
+    assert bucket._tokens == 4
+
+def test_acquire_spends_tokens_and_respects_the_deadline(clock):
+    bucket = TokenBucket(max_rate=1, burst=2)
+
+    async def run():
+        await bucket.acquire(deadline=clock.now + 1)
+        await bucket.acquire(deadline=clock.now + 1)
+        # The bucket is empty and the next token is a second away
+        with pytest.raises(DeadlineExceededError):
+            await bucket.acquire(deadline=clock.now + 0.5)
+
+    asyncio.run(run())
+
+def test_throttling_halves_the_rate_down_to_the_floor():
+    bucket = TokenBucket(max_rate=8, burst=8, min_rate=1)
+    bucket.on_throttled()
+    assert bucket.rate == 4 and bucket._tokens == 0
+    for _ in range(5):
+        bucket.on_throttled()
+    assert bucket.rate == 1
+
+def test_success_raises_the_rate_additively_up_to_the_maximum():
+    bucket = TokenBucket(max_rate=10, burst=10, min_rate=1)
+    bucket.rate = 2
+    bucket.on_success()
+    assert bucket.rate == pytest.approx(3)
+    for _ in range(20):
+        bucket.on_success()
+    assert bucket.rate == 10
+
+def test_rate_limit_headers_cap_the_rate():
+    bucket = TokenBucket(max_rate=10, burst=10, min_rate=0.2)
+    bucket.on_success({"x-ratelimit-remaining-requests": "30", "x-ratelimit-reset-requests": "1m"})
+    assert bucket.rate == pytest.approx(0.5)
+    bucket.on_success({"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "10s"})
+    assert bucket.rate == pytest.approx(0.2)
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+def test_half_open_breaker_lets_one_probe_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+def test_failed_probe_reopens_the_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+def test_probe_that_never_reports_back_stops_blocking(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    clock.now += 10
+    assert not breaker.allow()
+    clock.now += 20
+    assert breaker.allow()
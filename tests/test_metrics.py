@@ -0,0 +1,36 @@
+import pytest
+from benchmarks.bench_metrics import LegacyMetricsService, Row, make_rows
+from app.services.metrics import FeedbackColumns, MetricsService
+
+@pytest.mark.parametrize("count, seed", [(1, 0), (7, 1), (500, 2), (5000, 3)])
+def test_columnar_kernel_matches_the_legacy_service(count, seed):
+    rows = make_rows(count, seed)
+    assert MetricsService.get_all_metrics(rows) == LegacyMetricsService.get_all_metrics(rows)
+
+def test_extreme_scores_match_the_legacy_service():
+    rows = [Row(10, 5, 1, "Perfecto")] * 3 + [Row(0, 1, 5, "Pésimo")] * 3 + [Row(7, 3, 3, "")]
+    assert MetricsService.get_all_metrics(rows) == LegacyMetricsService.get_all_metrics(rows)
+
+def test_segment_comments_keep_row_order_and_skip_blanks():
+    rows = [Row(2, 1, 5, comment) for comment in ["", "uno", None, "dos", "tres", "cuatro", "cinco", "seis"]]
+    segment = MetricsService.get_all_metrics(rows)["segments"]["high_effort_detractors"]
+    assert segment["count"] == 8
+    assert segment["comments"] == ["uno", "dos", "tres", "cuatro", "cinco"]
+
+def test_single_metric_helpers_match_the_legacy_service():
+    rows = make_rows(300, 5)
+    for name in ("calculate_nps", "calculate_csat", "calculate_ces", "get_critical_segments"):
+        assert getattr(MetricsService, name)(rows) == getattr(LegacyMetricsService, name)(rows)
+
+def test_marginal_histograms_give_the_metrics_of_the_rows():
+    rows = make_rows(1000, 4)
+    columns = FeedbackColumns.from_feedbacks(rows)
+    joint = columns.histogram()
+    from_histograms = MetricsService.metrics_from_histograms(
+        joint.sum(axis=(1, 2)), joint.sum(axis=(0, 1)), joint.sum(axis=(0, 2)), MetricsService.segment_counts(joint)
+    )
+    from_rows = MetricsService.metrics_from_columns(columns)
+    for name in ("nps", "csat", "ces"):
+        assert from_histograms[name] == from_rows[name]
+    counts = lambda metrics: {key: segment["count"] for key, segment in metrics["segments"].items()}
+    assert counts(from_histograms) == counts(from_rows)
@@ -0,0 +1,27 @@
+from decimal import Decimal
+from app.core.db import parse_item
+
+def test_scalars_decode_with_integers_as_int():
+    item = parse_item({
+        "id": {"S": "42"},
+        "nps": {"N": "9"},
+        "score": {"N": "4.5"},
+        "topic_vec": {"B": b"\x01\x02"},
+        "flag": {"BOOL": True},
+    })
+    assert item == {"id": "42", "nps": 9, "score": Decimal("4.5"), "topic_vec": b"\x01\x02", "flag": True}
+    assert type(item["nps"]) is int
+
+def test_nested_values_go_through_the_boto3_deserializer():
+    item = parse_item({
+        "tags": {"L": [{"S": "a"}, {"N": "1"}]},
+        "meta": {"M": {"source": {"S": "web"}}},
+        "missing": {"NULL": True},
+    })
+    assert item == {"tags": ["a", Decimal("1")], "meta": {"source": "web"}, "missing": None}
+
+def test_matches_the_resource_client_for_feedback_items():
+    from boto3.dynamodb.types import TypeDeserializer
+    raw = {"id": {"S": "7"}, "date": {"S": "2024-05-01"}, "nps": {"N": "3"}, "csat": {"N": "2"}, "ces": {"N": "5"}, "comment": {"S": "Demora"}}
+    deserializer = TypeDeserializer()
+    assert parse_item(raw) == {name: deserializer.deserialize(value) for name, value in raw.items()}
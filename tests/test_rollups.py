@@ -0,0 +1,92 @@
+import random
+from collections import Counter
+import numpy as np
+from app.core import db
+from app.core.config import settings
+from app.models.feedback import FeedbackRecord
+from app.services.metrics import CES_BINS, CSAT_BINS, NPS_BINS, MetricsService
+from app.services.repository import to_records, write_batch
+from app.services.rollups import daily_deltas, merge_rollups, read_rollups, rebuild_rollups, rollup_metrics
+
+def make_items(count: int, seed: int = 7, days: int = 40) -> list:
+    rng = random.Random(seed)
+    return [
+        {
+            "id": str(index),
+            "date": f"2024-{4 + day // 30:02d}-{1 + day % 30:02d}",
+            "nps": rng.randint(0, 10),
+            "csat": rng.randint(1, 5),
+            "ces": rng.randint(1, 5),
+        }
+        for index, day in ((index, rng.randrange(days)) for index in range(count))
+    ]
+
+def rows_of(deltas: dict) -> list:
+    return [{"day": day, **counters} for day, counters in deltas.items()]
+
+def direct_count(items: list):
+    nps = np.bincount([int(item["nps"]) for item in items], minlength=NPS_BINS)
+    csat = np.bincount([int(item["csat"]) for item in items], minlength=CSAT_BINS)
+    ces = np.bincount([int(item["ces"]) for item in items], minlength=CES_BINS)
+    segments = {
+        "high_effort_detractors": sum(1 for item in items if int(item["ces"]) >= 4 and int(item["nps"]) <= 6),
+        "low_effort_promoters": sum(1 for item in items if int(item["ces"]) <= 2 and int(item["nps"]) >= 9),
+    }
+    return nps, csat, ces, segments
+
+def assert_totals(rows: list, items: list):
+    merged, expected = merge_rollups(rows), direct_count(items)
+    for name, got, want in zip(("nps", "csat", "ces"), merged[:3], expected[:3]):
+        assert got.tolist() == want.tolist(), name
+    assert merged[3] == expected[3]
+
+def test_merged_rollups_match_a_direct_count():
+    items = make_items(2000)
+    assert_totals(rows_of(daily_deltas(items)), items)
+
+def test_rollup_metrics_match_the_metrics_of_the_records():
+    items = make_items(500)
+    from_rollups = rollup_metrics(rows_of(daily_deltas(items)))
+    from_records = MetricsService.get_all_metrics(to_records(items))
+    for name in ("nps", "csat", "ces"):
+        assert from_rollups[name] == from_records[name]
+    assert {key: segment["count"] for key, segment in from_rollups["segments"].items()} == \
+        {key: segment["count"] for key, segment in from_records["segments"].items()}
+
+def test_replaced_versions_are_taken_back():
+    old = make_items(300, seed=1)
+    new = [dict(item, nps=(int(item["nps"]) + 3) % 11, date="2024-05-09" if index % 3 == 0 else item["date"]) for index, item in enumerate(old)]
+    total: dict = {}
+    for deltas in (daily_deltas(old), daily_deltas(new, {item["id"]: item for item in old})):
+        for day, counters in deltas.items():
+            total.setdefault(day, Counter()).update(counters)
+    assert_totals(rows_of(total), new)
+    # Identical re-writes net out to nothing
+    assert daily_deltas(old, {item["id"]: item for item in old}) == {}
+
+def stored_items(stub) -> list:
+    return list(stub.Table(settings.DYNAMODB_TABLE_NAME).items.values())
+
+def test_reingesting_and_rewriting_keeps_rollups_exact(initialized_db):
+    items = make_items(120)
+    write_batch(items, may_exist=True)
+    write_batch(items, may_exist=True)
+    assert_totals(read_rollups(None, None), items)
+
+    rewritten = [dict(item, nps=10, ces=1, date="2024-04-02") for item in items[:30]]
+    write_batch(rewritten, may_exist=True)
+    assert_totals(read_rollups(None, None), stored_items(initialized_db))
+
+def test_rebuild_matches_the_stored_feedback_and_drops_empty_days(initialized_db):
+    items = make_items(80)
+    initialized_db.load(settings.DYNAMODB_TABLE_NAME, items)
+    # A stale row of a day without feedback and a wrong count for a real one
+    initialized_db.load(settings.DYNAMODB_ROLLUP_TABLE_NAME, [
+        {"month": "2023-01", "day": "2023-01-15", "nps_9": 4},
+        {"month": db.date_bucket(items[0]["date"]), "day": items[0]["date"], "nps_0": 99},
+    ])
+    rebuild_rollups()
+    rows = read_rollups(None, None)
+    assert "2023-01-15" not in {row["day"] for row in rows}
+    assert_totals(rows, items)
+    assert db.rollups_backfilled.is_set()
@@ -0,0 +1,82 @@
+from datetime import date
+import numpy as np
+import pytest
+from app.services.search import CommentIndex, analyze, decode_postings, encode_postings, stem
+
+@pytest.mark.parametrize("docs", [
+    [1],
+    [0, 1, 2, 3],
+    [5, 127, 128, 300, 16_384, 2_097_152, 2_097_153],
+    list(range(1, 20_000, 7)),
+])
+def test_postings_round_trip(docs):
+    encoded = encode_postings(np.array(docs))
+    assert decode_postings(encoded).tolist() == docs
+
+def test_postings_store_gaps_as_varints():
+    # Gaps 1 and 127 fit in one byte each, the gap of 128 needs two
+    assert encode_postings(np.array([1, 128, 256])) == bytes([0x01, 0x7F, 0x80, 0x01])
+
+def test_empty_postings():
+    assert encode_postings(np.zeros(0, dtype=np.int64)) == b""
+    assert decode_postings(b"").tolist() == []
+
+@pytest.mark.parametrize("words, expected", [
+    (["entrega", "entregas", "entregado", "entregaron"], "entreg"),
+    (["atencion", "atenciones"], "aten"),
+    (["luz", "luces"], "luz"),
+    (["rapido", "rapidos", "rapida", "rapidas"], "rapid"),
+])
+def test_stem_conflates_inflections(words, expected):
+    assert {stem(word) for word in words} == {expected}
+
+def test_stem_keeps_short_words():
+    assert stem("mes") == "mes"
+    assert stem("sol") == "sol"
+
+def test_analyze_folds_case_accents_and_stopwords():
+    assert analyze("La ENTREGA llegó tarde, muy tarde") == ["entreg", "lleg", "tard"]
+    assert analyze(None) == []
+
+def item(feedback_id: str, comment: str, day: str = "2024-05-01") -> dict:
+    return {"id": feedback_id, "date": day, "nps": 3, "csat": 2, "ces": 4, "comment": comment, "topic": None}
+
+def test_index_matches_every_term_within_the_window(tmp_path):
+    index = CommentIndex(str(tmp_path / "search.db"), merge_rows=2)
+    try:
+        index.add([
+            item("1", "Entrega tarde"),
+            item("2", "Entregaron el pedido tarde", "2024-05-20"),
+            item("3", "Helado delicioso"),
+        ])
+        assert [r.id for r in index.records(analyze("entregas tardes"))] == ["1", "2"]
+        assert [r.id for r in index.records(analyze("entrega"), start=date(2024, 5, 10))] == ["2"]
+        assert index.records(analyze("entrega delicioso")) == []
+    finally:
+        index.close()
+
+def test_rewritten_comment_leaves_its_old_terms(tmp_path):
+    index = CommentIndex(str(tmp_path / "search.db"), merge_rows=2)
+    try:
+        index.add([item("1", "Entrega tarde")])
+        assert index.add([item("1", "Entrega tarde")]) == 0
+        assert index.add([item("1", "Helado delicioso")]) == 1
+        assert index.records(analyze("tarde")) == []
+        assert [r.comment for r in index.records(analyze("helado"))] == ["Helado delicioso"]
+        # Merged and compacted posting lists still drop the removed doc
+        for number in range(2, 8):
+            index.add([item(str(number), "Entrega tarde")])
+        index.compact()
+        assert sorted(r.id for r in index.records(analyze("tarde"))) == [str(n) for n in range(2, 8)]
+    finally:
+        index.close()
+
+def test_backfilled_is_persisted(tmp_path):
+    path = str(tmp_path / "search.db")
+    index = CommentIndex(path, merge_rows=2)
+    assert not index.backfilled
+    index.mark_backfilled()
+    index.close()
+    reopened = CommentIndex(path, merge_rows=2)
+    assert reopened.backfilled
+    reopened.close()
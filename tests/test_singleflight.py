@@ -0,0 +1,136 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from app.core import singleflight
+from app.core.singleflight import SingleFlight
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(singleflight, "time", SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+def counting_factory(calls: list, value=None, delay: float = 0):
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return value if value is not None else len(calls)
+    return factory
+
+def test_concurrent_callers_share_one_computation():
+    async def run():
+        flights, calls = SingleFlight(), []
+        factory = counting_factory(calls, "result", delay=0.01)
+        results = await asyncio.gather(*(flights.do("key", factory) for _ in range(5)))
+        return results, calls, flights.stats()
+
+    results, calls, stats = asyncio.run(run())
+    assert results == ["result"] * 5
+    assert len(calls) == 1
+    assert stats["coalesced"] == 4 and stats["in_flight"] == 0
+
+def test_different_versions_do_not_share_a_flight():
+    async def run():
+        flights, calls = SingleFlight(), []
+        factory = counting_factory(calls, delay=0.01)
+        await asyncio.gather(flights.do("key", factory, version=1), flights.do("key", factory, version=2))
+        return calls
+
+    assert len(asyncio.run(run())) == 2
+
+def test_errors_reach_every_caller_and_are_not_stored():
+    async def run():
+        flights, calls = SingleFlight(), []
+
+        async def failing():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(*(flights.do("key", failing, fresh_for=60) for _ in range(3)), return_exceptions=True)
+        again = await asyncio.gather(flights.do("key", failing, fresh_for=60), return_exceptions=True)
+        return results + again, calls, flights.stats()
+
+    results, calls, stats = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert len(calls) == 2
+    assert stats["stored"] == 0
+
+def test_fresh_result_is_reused(clock):
+    async def run():
+        flights, calls = SingleFlight(), []
+        factory = counting_factory(calls)
+        first = await flights.do("key", factory, fresh_for=10, stale_for=30)
+        clock.now += 5
+        second = await flights.do("key", factory, fresh_for=10, stale_for=30)
+        return first, second, calls
+
+    first, second, calls = asyncio.run(run())
+    assert first == second == 1
+    assert len(calls) == 1
+
+def test_stale_result_is_served_while_one_refresh_runs(clock):
+    async def run():
+        flights, calls = SingleFlight(), []
+        factory = counting_factory(calls, delay=0.01)
+        await flights.do("key", factory, fresh_for=10, stale_for=30)
+        clock.now += 15
+        stale = await asyncio.gather(*(flights.do("key", factory, fresh_for=10, stale_for=30) for _ in range(3)))
+        refreshes_started = len(calls) - 1
+        await asyncio.sleep(0.05)
+        refreshed = await flights.do("key", factory, fresh_for=10, stale_for=30)
+        return stale, refreshes_started, refreshed, flights.stats()
+
+    stale, refreshes_started, refreshed, stats = asyncio.run(run())
+    assert stale == [1, 1, 1]
+    assert refreshes_started == 1
+    assert refreshed == 2
+    assert stats["stale_served"] == 3
+
+def test_new_version_is_stale_not_fresh(clock):
+    async def run():
+        flights, calls = SingleFlight(), []
+        factory = counting_factory(calls, delay=0.01)
+        await flights.do("key", factory, version=1, fresh_for=10, stale_for=30)
+        served = await flights.do("key", factory, version=2, fresh_for=10, stale_for=30)
+        await asyncio.sleep(0.05)
+        return served, await flights.do("key", factory, version=2, fresh_for=10, stale_for=30)
+
+    assert asyncio.run(run()) == (1, 2)
+
+def test_expired_result_is_recomputed(clock):
+    async def run():
+        flights, calls = SingleFlight(), []
+        factory = counting_factory(calls)
+        await flights.do("key", factory, fresh_for=10, stale_for=30)
+        clock.now += 41
+        return await flights.do("key", factory, fresh_for=10, stale_for=30)
+
+    assert asyncio.run(run()) == 2
+
+def test_refresh_skips_stored_results_and_invalidate_drops_them(clock):
+    async def run():
+        flights, calls = SingleFlight(), []
+        factory = counting_factory(calls)
+        await flights.do("key", factory, fresh_for=10)
+        refreshed = await flights.do("key", factory, fresh_for=10, refresh=True)
+        flights.invalidate()
+        return refreshed, await flights.do("key", factory, fresh_for=10)
+
+    assert asyncio.run(run()) == (2, 3)
+
+def test_stored_results_are_bounded():
+    async def run():
+        flights = SingleFlight(max_entries=2)
+        for key in ("a", "b", "c"):
+            await flights.do(key, counting_factory([], key), fresh_for=60)
+        return flights.stats()["stored"]
+
+    assert asyncio.run(run()) == 2
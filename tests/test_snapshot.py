@@ -0,0 +1,65 @@
+from datetime import date
+import pytest
+from app.core.config import settings
+from app.models.feedback import FeedbackRecord
+from app.services.metrics import MetricsService
+from app.services.snapshot import Snapshot, SnapshotStore, build_snapshot
+
+OLD = "2024-01-01T00:00:00.000000+00:00"
+
+def stored(feedback_id: str, day: str, nps: int, comment=None, topic=None, created_at=OLD) -> dict:
+    item = {"id": feedback_id, "date": day, "nps": nps, "csat": 3, "ces": 2, "created_at": created_at}
+    if comment:
+        item["comment"] = comment
+    if topic:
+        item["topic"] = topic
+    return item
+
+@pytest.fixture
+def snapshot(stub_db, tmp_path) -> Snapshot:
+    stub_db.load(settings.DYNAMODB_TABLE_NAME, [
+        stored("1", "2024-05-03", 10, "Excelente", "m:0"),
+        stored("2", "2024-05-01", 2, "Entrega tarde", "m:1"),
+        stored("3", "2024-05-02", 8),
+        stored("4", "2024-05-05", 6, "Caro"),
+        stored("5", "2024-05-04", 9, "Escrito durante el build", created_at="2999-01-01T00:00:00.000000+00:00"),
+    ])
+    build_snapshot(str(tmp_path))
+    return SnapshotStore(str(tmp_path)).current
+
+def ids(window) -> list:
+    return [(record.date.day, record.nps) for record in window]
+
+def test_rows_are_sorted_by_date_and_recent_writes_left_out(snapshot):
+    assert len(snapshot) == 4
+    window = snapshot.window(None, None)
+    assert ids(window) == [(1, 2), (2, 8), (3, 10), (5, 6)]
+    assert [record.comment for record in window] == ["Entrega tarde", None, "Excelente", "Caro"]
+    assert [record.topic for record in window] == ["m:1", None, "m:0", None]
+
+def test_window_bounds_are_inclusive(snapshot):
+    assert ids(snapshot.window(date(2024, 5, 2), date(2024, 5, 3))) == [(2, 8), (3, 10)]
+    assert ids(snapshot.window(date(2024, 5, 6), None)) == []
+
+def test_excluded_ids_are_replaced_by_newer_records_in_date_order(snapshot):
+    newer = [
+        FeedbackRecord(date(2024, 5, 2), 0, 1, 5, "Re-escrito", id="1"),
+        FeedbackRecord(date(2024, 5, 4), 9, 5, 1, "Nuevo", id="9"),
+    ]
+    window = snapshot.window(None, None, exclude_ids={"1", "7"}, newer=newer)
+    assert len(window) == 5
+    assert ids(window) == [(1, 2), (2, 8), (2, 0), (4, 9), (5, 6)]
+    assert [record.comment for record in window] == ["Entrega tarde", None, "Re-escrito", "Nuevo", "Caro"]
+
+def test_ids_outside_the_window_exclude_nothing(snapshot):
+    window = snapshot.window(date(2024, 5, 1), date(2024, 5, 2), exclude_ids={"1", "4"})
+    assert ids(window) == [(1, 2), (2, 8)]
+
+def test_columns_follow_the_record_order(snapshot):
+    newer = [FeedbackRecord(date(2024, 5, 2), 0, 1, 5, "Re-escrito", id="1")]
+    window = snapshot.window(None, None, exclude_ids={"1"}, newer=newer)
+    columns = window.to_columns()
+    records = list(window)
+    assert columns.nps.tolist() == [record.nps for record in records]
+    assert [columns.comments[index] for index in range(len(records))] == [record.comment for record in records]
+    assert MetricsService.get_all_metrics(window) == MetricsService.get_all_metrics(records)
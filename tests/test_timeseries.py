@@ -0,0 +1,82 @@
+from datetime import date, timedelta
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from app.services import timeseries
+from app.services.timeseries import ClosedRangeCache, bucket_ranges
+
+MAY = (date(2024, 5, 1), date(2024, 5, 31))
+JUNE = (date(2024, 6, 1), date(2024, 6, 30))
+WEEK = (date(2024, 5, 27), date(2024, 6, 2))
+
+@pytest.fixture
+def cache() -> ClosedRangeCache:
+    return ClosedRangeCache(max_entries=3, ttl=60, grace_days=2)
+
+def counts(value: int) -> np.ndarray:
+    return np.full(4, value)
+
+def test_ranges_are_keyed_by_their_exact_bounds(cache):
+    cache.set(MAY, counts(1))
+    cache.set(JUNE, counts(2))
+    assert cache.get(MAY).tolist() == [1] * 4
+    assert cache.get(JUNE).tolist() == [2] * 4
+    # An overlapping range with other bounds is a different key
+    assert cache.get(WEEK) is None
+    assert cache.get((date(2024, 5, 1), date(2024, 5, 30))) is None
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 2
+
+def test_ranges_within_the_grace_period_are_not_cached(cache):
+    today = date.today()
+    recent = (today - timedelta(days=7), today - timedelta(days=1))
+    cache.set(recent, counts(1))
+    assert cache.get(recent) is None
+    closed = (today - timedelta(days=7), today - timedelta(days=3))
+    cache.set(closed, counts(1))
+    assert cache.get(closed) is not None
+
+def test_entries_expire_after_the_ttl(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(timeseries, "time", SimpleNamespace(time=lambda: now[0]))
+    cache.set(MAY, counts(1))
+    now[0] += 59
+    assert cache.get(MAY) is not None
+    now[0] += 2
+    assert cache.get(MAY) is None
+
+def test_least_recently_used_range_is_dropped(cache):
+    april = (date(2024, 4, 1), date(2024, 4, 30))
+    for bucket in (april, MAY, JUNE):
+        cache.set(bucket, counts(1))
+    cache.get(april)
+    cache.set(WEEK, counts(1))
+    assert cache.get(MAY) is None
+    assert cache.get(april) is not None
+
+def test_written_days_evict_only_the_ranges_containing_them(cache):
+    for bucket in (MAY, JUNE, WEEK):
+        cache.set(bucket, counts(1))
+    cache.evict(["2024-06-15"])
+    assert cache.get(JUNE) is None
+    assert cache.get(MAY) is not None and cache.get(WEEK) is not None
+    cache.evict(["2024-06-02", "2023-01-01"])
+    assert cache.get(WEEK) is None and cache.get(MAY) is not None
+    cache.evict([])
+    assert cache.stats()["evicted"] == 2
+
+def test_moved_stamp_clears_every_range(cache):
+    cache.sync("2024-07-01T00:00:00")
+    cache.set(MAY, counts(1))
+    cache.sync("2024-07-01T00:00:00")
+    assert cache.get(MAY) is not None
+    cache.sync("2024-07-02T00:00:00")
+    assert cache.get(MAY) is None
+    assert cache.stats()["entries"] == 0
+
+@pytest.mark.parametrize("granularity, expected", [
+    ("day", [(date(2024, 5, 30), date(2024, 5, 30)), (date(2024, 5, 31), date(2024, 5, 31)), (date(2024, 6, 1), date(2024, 6, 1))]),
+    ("week", [(date(2024, 5, 30), date(2024, 6, 1))]),
+    ("month", [(date(2024, 5, 30), date(2024, 5, 31)), (date(2024, 6, 1), date(2024, 6, 1))]),
+])
+def test_buckets_are_clipped_to_the_window(granularity, expected):
+    assert bucket_ranges(date(2024, 5, 30), date(2024, 6, 1), granularity) == expected